@@ -9,6 +9,8 @@ from datetime import datetime
 from flask import render_template, Response
 
 # these imports are required by Flask - DO NOT remove them although they look unused
+# (the routes have to be registered before the first request, so they cannot
+# be imported lazily - but importing them does not contact PuppetDB)
 # noinspection PyUnresolvedReferences
 import puppetboard.views.catalogs  # noqa: F401
 # noinspection PyUnresolvedReferences
@@ -26,6 +28,8 @@ import puppetboard.views.metrics  # noqa: F401
 # noinspection PyUnresolvedReferences
 import puppetboard.views.nodes  # noqa: F401
 # noinspection PyUnresolvedReferences
+import puppetboard.views.prometheus  # noqa: F401
+# noinspection PyUnresolvedReferences
 import puppetboard.views.query  # noqa: F401
 # noinspection PyUnresolvedReferences
 import puppetboard.views.radiator  # noqa: F401
@@ -35,17 +39,28 @@ import puppetboard.views.reports  # noqa: F401
 import puppetboard.views.failures  # noqa: F401
 import puppetboard.errors  # noqa: F401
 
-from puppetboard.core import get_app, get_puppetdb, get_scheduler
+from puppetboard.core import (get_app, get_puppetdb, get_scheduler,
+                              require_supported_db_version, start_db_version_check)
 from puppetboard.version import __version__
-from puppetboard.utils import is_a_test, check_db_version, check_secret_key
+from puppetboard.views.prometheus import observe_scheduler
+from puppetboard.utils import (is_a_test, check_db_version, check_replica_path,
+                               check_secret_key)
 
 app = get_app()
 puppetdb = get_puppetdb()
-get_scheduler()
+scheduler = get_scheduler()
+if scheduler is not None:
+    observe_scheduler(scheduler)
 running_as = os.path.basename(sys.argv[0])
 if not is_a_test():
-    check_db_version(puppetdb)
     check_secret_key(app.config.get('SECRET_KEY'))
+    check_replica_path(app.config['REPLICA_ENABLED'], app.config['REPLICA_PATH'])
+    if app.config['PUPPETDB_VERSION_CHECK'] == 'startup':
+        check_db_version(puppetdb)
+    else:
+        app.before_request(require_supported_db_version)
+        if app.config['PUPPETDB_VERSION_CHECK'] == 'background':
+            start_db_version_check()
 
 logging.basicConfig(level=app.config['LOGLEVEL'].upper())
 log = logging.getLogger(__name__)
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request to PuppetDB while the circuit
+    is open. It is a ConnectionError so that it is handled exactly like
+    an unreachable PuppetDB, only without waiting for the timeout."""
+
+
+class CircuitBreaker(object):
+    """Tracks the outcome of the recent PuppetDB requests and opens the
+    circuit when too many of them failed (or were too slow), so that the
+    next requests fail in milliseconds instead of tying up the workers.
+
+    After `reset_timeout` seconds a single probe request is let through
+    (half-open state): if it succeeds the circuit is closed again,
+    otherwise it stays open for another `reset_timeout` seconds.
+
+    :param window: Length in seconds of the rolling window of requests
+        used to compute the error and slow call rates
+    :param min_calls: Minimal number of requests in the window before
+        the circuit can open
+    :param threshold: Rate (0.0 - 1.0) of failed or slow requests
+        in the window that opens the circuit
+    :param slow_call: Requests taking longer than that many seconds
+        count as slow, `None` to only consider the errors
+    :param reset_timeout: How many seconds the circuit stays open before
+        sending a probe request
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, window: float = 60, min_calls: int = 10, threshold: float = 0.5,
+                 slow_call: Optional[float] = None, reset_timeout: float = 30):
+        self.window = window
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        # (timestamp, failed, slow) of the requests in the window
+        self.calls: deque = deque()
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the request should not be sent."""
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError('PuppetDB circuit breaker is open')
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    raise CircuitOpenError('PuppetDB circuit breaker is half-open')
+                self.probing = True
+
+    def after_call(self, failed: bool, duration: float):
+        """Record the outcome of a request sent after before_call()."""
+        now = time.monotonic()
+        slow = self.slow_call is not None and duration > self.slow_call
+
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                if failed or slow:
+                    self._open(now, 'the probe request failed')
+                else:
+                    log.info('PuppetDB is healthy again, closing the circuit breaker')
+                    self.state = self.CLOSED
+                    self.calls.clear()
+                return
+
+            self.calls.append((now, failed, slow))
+            while self.calls and self.calls[0][0] < now - self.window:
+                self.calls.popleft()
+
+            if self.state == self.CLOSED and len(self.calls) >= self.min_calls:
+                errors = sum(1 for _, f, _ in self.calls if f)
+                slows = sum(1 for _, _, s in self.calls if s)
+                if errors / len(self.calls) >= self.threshold:
+                    self._open(now, f'{errors} of the last {len(self.calls)} requests failed')
+                elif slows / len(self.calls) >= self.threshold:
+                    self._open(now, f'{slows} of the last {len(self.calls)} requests were slow')
+
+    def _open(self, now: float, reason: str):
+        log.error(f'Opening the PuppetDB circuit breaker for {self.reset_timeout}s: {reason}')
+        self.state = self.OPEN
+        self.opened_at = now
+        self.calls.clear()
+
+
+class PuppetDBAdapter(HTTPAdapter):
+    """Transport adapter for the PuppetDB session that sends the requests
+    through an (optional) circuit breaker. Server errors (5xx), timeouts
+    and connection errors count as failures."""
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, **kwargs):
+        self.breaker = breaker
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.breaker is None:
+            return super().send(request, **kwargs)
+
+        self.breaker.before_call()
+        start = time.monotonic()
+        failed = True
+        try:
+            response = super().send(request, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.breaker.after_call(failed, time.monotonic() - start)
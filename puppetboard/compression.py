@@ -0,0 +1,141 @@
+import time
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+    'image/svg+xml',
+}
+
+
+# a streamed response is flushed when this many bytes were compressed, or
+# this many seconds passed, since the previous flush, see compress_stream()
+STREAM_FLUSH_SIZE = 16384
+STREAM_FLUSH_INTERVAL = 0.2
+
+
+def available_encodings() -> list:
+    """The supported encodings, the preferred one first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+class _GzipCompressor(object):
+    def __init__(self, level):
+        # wbits=31 gives a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor(object):
+    def __init__(self, level):
+        # brotli qualities go from 0 to 11, keep it fast for dynamic content
+        self.compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+def get_compressor(encoding: str, level: int):
+    if encoding == 'br':
+        return _BrotliCompressor(level)
+    return _GzipCompressor(level)
+
+
+def compress_stream(chunks, compressor, flush_size=STREAM_FLUSH_SIZE,
+                    flush_interval=STREAM_FLUSH_INTERVAL):
+    """Compress a streamed response chunk by chunk, flushing the compressor
+    once flush_size bytes were given to it, or flush_interval seconds passed,
+    since the previous flush, so that the client gets the beginning of the
+    page while it is rendered instead of when the whole body is done.
+
+    The chunks of the templates are small, flushing after each of them
+    would make the compressed body bigger than the original one."""
+    try:
+        pending = 0
+        flushed_at = time.monotonic()
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size or time.monotonic() - flushed_at >= flush_interval:
+                data += compressor.flush()
+                pending = 0
+                flushed_at = time.monotonic()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """Compress the response with gzip or brotli, if the client accepts it.
+
+    The small bodies are left as they are, as well as the static files and
+    the responses that are already encoded. The streamed responses (see
+    stream_template()) are compressed on the fly."""
+    config = current_app.config
+    if not config['COMPRESSION_ENABLED']:
+        return response
+
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSED_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    compressor = get_compressor(encoding, config['COMPRESSION_LEVEL'])
+    if response.is_streamed:
+        response.response = compress_stream(response.response, compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # the representation has changed, a strong ETag would not be valid anymore
+    if 'ETag' in response.headers:
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    return response
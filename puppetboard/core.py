@@ -1,15 +1,29 @@
+import contextvars
+import json
 import logging
+import os
 import re
 import socket
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from importlib.metadata import version
 
-from flask import Flask
+from flask import Flask, Response, abort, g, request, stream_with_context
 from flask_caching import Cache
 from flask_apscheduler import APScheduler
 from werkzeug.middleware.proxy_fix import ProxyFix
 from pypuppetdb import connect
-
-from puppetboard.utils import (get_or_abort, jsonprint,
+from pypuppetdb.errors import EmptyResponseError
+from urllib3.util.retry import Retry
+
+from puppetboard import compression, tracing
+from puppetboard.signals import cache_accessed
+from puppetboard.singleflight import SingleFlight, coalesce_calls
+from puppetboard.circuitbreaker import CircuitBreaker, PuppetDBAdapter
+from puppetboard.replica import Replica
+from puppetboard.utils import (db_version_error, get_or_abort, jsonprint,
                                url_for_field, quote_columns_data)
 from puppetboard.version import __version__ as own_version
 
@@ -34,6 +48,22 @@ APP = None
 PUPPETDB = None
 CACHE = None
 SCHEDULER = None
+EXECUTOR = None
+REPLICA = None
+
+# per-worker cache of the environment names, see environment_names()
+ENVIRONMENTS: dict = {'names': None, 'fetched_at': 0.0, 'refreshing': False}
+ENVIRONMENTS_LOCK = threading.Lock()
+
+# per-worker result of the PuppetDB version check, see check_db_version_once()
+DB_VERSION: dict = {'checked': False, 'error': None, 'checking_pid': None}
+DB_VERSION_LOCK = threading.Lock()
+
+# the endpoints that do not need PuppetDB, so they are served even if its
+# version is not supported
+DB_VERSION_EXEMPT_ENDPOINTS = ('static', 'offline_static', 'health_status')
+
+log = logging.getLogger(__name__)
 
 
 def get_app():
@@ -52,10 +82,14 @@ def get_app():
         app.jinja_env.filters['jsonprint'] = jsonprint
         app.jinja_env.globals['url_for_field'] = url_for_field
         app.jinja_env.globals['quote_columns_data'] = quote_columns_data
+        app.jinja_env.globals['puppetdb_calls'] = tracing.puppetdb_calls
         app.jinja_env.add_extension('jinja2.ext.do')
         # Trust one level of proxy headers (e.g. X-Forwarded-Proto from Traefik)
         # so Flask generates correct https:// URLs and doesn't issue http:// redirects
         app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
+        # registered first to run last, once the body is final
+        app.after_request(compression.compress_response)
+        app.after_request(tracing.add_server_timing)
         APP = app
 
     return APP
@@ -80,17 +114,58 @@ def get_puppetdb():
         }
         puppetdb.session.headers = {**puppetdb.session.headers, **user_agent_header}
 
+        breaker = None
+        if app.config['PUPPETDB_CIRCUIT_BREAKER']:
+            breaker = CircuitBreaker(
+                window=app.config['PUPPETDB_CIRCUIT_BREAKER_WINDOW'],
+                min_calls=app.config['PUPPETDB_CIRCUIT_BREAKER_MIN_CALLS'],
+                threshold=app.config['PUPPETDB_CIRCUIT_BREAKER_THRESHOLD'],
+                slow_call=app.config['PUPPETDB_CIRCUIT_BREAKER_SLOW_CALL'],
+                reset_timeout=app.config['PUPPETDB_CIRCUIT_BREAKER_RESET'],
+            )
+        # retry only the idempotent requests, and only when they could not
+        # connect or got a gateway error - not when they timed out reading,
+        # as that would multiply the time spent waiting for a slow PuppetDB
+        retries = Retry(
+            total=app.config['PUPPETDB_RETRIES'],
+            read=0,
+            backoff_factor=app.config['PUPPETDB_RETRY_BACKOFF'],
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        adapter = PuppetDBAdapter(
+            breaker=breaker,
+            pool_connections=app.config['PUPPETDB_POOL_CONNECTIONS'],
+            pool_maxsize=app.config['PUPPETDB_POOL_MAXSIZE'],
+            max_retries=retries,
+        )
+        puppetdb.session.mount('http://', adapter)
+        puppetdb.session.mount('https://', adapter)
+        if app.config['PUPPETDB_COALESCE_QUERIES']:
+            coalesce_calls(puppetdb, SingleFlight())
+        tracing.trace_calls(puppetdb)
+
         PUPPETDB = puppetdb
 
     return PUPPETDB
 
 
+class InstrumentedCache(Cache):
+    """Cache that sends the cache_accessed signal on each lookup."""
+
+    def get(self, *args, **kwargs):
+        value = super().get(*args, **kwargs)
+        cache_accessed.send(self, hit=value is not None)
+        return value
+
+
 def get_cache():
     global CACHE
 
     if CACHE is None:
         app = get_app()
-        cache = Cache()
+        cache = InstrumentedCache()
         cache.init_app(app)
 
         CACHE = cache
@@ -123,14 +198,237 @@ def get_scheduler():
     return SCHEDULER
 
 
-def environments() -> dict:
-    envs = {}
+def get_replica():
+    global REPLICA
+
+    if REPLICA is None:
+        app = get_app()
+        # REPLICA_PATH is checked at startup, see check_replica_path()
+        if app.config['REPLICA_ENABLED'] and app.config['REPLICA_PATH']:
+            REPLICA = Replica(app.config['REPLICA_PATH'])
+
+    return REPLICA
+
+
+def fresh_replica():
+    """The local replica of PuppetDB (see puppetboard.replica) if it is
+    enabled and was synced less than REPLICA_MAX_AGE seconds ago, else None
+    to query PuppetDB instead."""
+    replica = get_replica()
+    if replica is None:
+        return None
+
+    synced_at = replica.synced_at()
+    if synced_at is None or time.time() - synced_at > get_app().config['REPLICA_MAX_AGE']:
+        return None
+    return replica
+
+
+def get_executor():
+    global EXECUTOR
+
+    if EXECUTOR is None:
+        app = get_app()
+        EXECUTOR = ThreadPoolExecutor(
+            max_workers=app.config['PUPPETDB_QUERY_WORKERS'],
+            thread_name_prefix='puppetdb-query')
+
+    return EXECUTOR
+
+
+def _consume(call):
+    result = call()
+    # pypuppetdb returns lazy generators, so make sure that the HTTP
+    # requests are done in the worker thread and not by the caller
+    if isinstance(result, Iterator):
+        result = list(result)
+    return result
+
+
+def query_all(*calls) -> list:
+    """Run independent PuppetDB calls in parallel and return their results
+    in the same order as the calls.
+
+    Each call has to be a callable without arguments, f.e. a
+    `functools.partial` of a `puppetdb` method. Generators returned by
+    the calls are consumed in the worker threads, so the results are lists.
+
+    The whole batch has to finish within `PUPPETDB_QUERY_DEADLINE` seconds.
+    The first error raised by any of the calls is re-raised here, so wrap
+    this function with `get_or_abort` like any other backend request.
+    """
+    executor = get_executor()
+    futures = [
+        # copy the context so that the calls can still use the Flask app
+        # and request contexts from the worker threads
+        executor.submit(contextvars.copy_context().run, _consume, call)
+        for call in calls
+    ]
+
+    done, not_done = wait(futures,
+                          timeout=get_app().config['PUPPETDB_QUERY_DEADLINE'],
+                          return_when=FIRST_EXCEPTION)
+    for future in not_done:
+        future.cancel()
+    for future in futures:
+        if future in done and future.exception() is not None:
+            raise future.exception()
+    if not_done:
+        raise TimeoutError(f"{len(not_done)} of {len(futures)} PuppetDB queries "
+                           f"did not finish in time")
+
+    return [future.result() for future in futures]
+
+
+def query_page(page_call, count_call, total_call=None) -> tuple:
+    """Fetch the page of a server-side DataTables table with the number of
+    rows that match its search and, if there is a search, of all the rows,
+    for `recordsFiltered` and `recordsTotal`. The counts are calls of
+    count_query() and are sent in parallel with the page.
+
+    The totals are not read from the `puppetdb` object after the request,
+    as the concurrent requests share it.
+
+    Return the page, the filtered count and the total count.
+    """
+    calls = [page_call, count_call] if total_call is None \
+        else [page_call, count_call, total_call]
+    page, *counts = query_all(*calls)
+    counts = [rows[0]['count'] if rows else 0 for rows in counts]
+    return page, counts[0], counts[-1]
+
+
+def check_db_version_once():
+    """Check the version of PuppetDB, unless it has already been done by
+    this process, and return the error message if it is not supported.
+
+    Failing to reach PuppetDB is logged but not remembered, so that the
+    check is done again later instead of failing the worker forever.
+    """
+    with DB_VERSION_LOCK:
+        if DB_VERSION['checked']:
+            return DB_VERSION['error']
+
+    try:
+        error = db_version_error(get_puppetdb())
+    # the requests errors and the CircuitOpenError are all OSErrors
+    except (OSError, EmptyResponseError) as e:
+        log.warning(f"Failed to check the version of PuppetDB: {e}")
+        return None
+
+    if error:
+        log.error(error)
+    with DB_VERSION_LOCK:
+        DB_VERSION.update(checked=True, error=error)
+    return error
+
+
+def _check_db_version_in_background():
+    try:
+        check_db_version_once()
+    finally:
+        with DB_VERSION_LOCK:
+            DB_VERSION['checking_pid'] = None
+
+
+def start_db_version_check():
+    """Check the version of PuppetDB in a background thread, if it has not
+    been done yet and is not already running in this process.
+
+    The process id is remembered instead of a flag, as the thread started
+    by a preloading master (f.e. gunicorn --preload) does not exist in the
+    workers forked from it.
+    """
+    with DB_VERSION_LOCK:
+        if DB_VERSION['checked'] or DB_VERSION['checking_pid'] == os.getpid():
+            return
+        DB_VERSION['checking_pid'] = os.getpid()
+
+    threading.Thread(target=_check_db_version_in_background,
+                     name='puppetdb-version-check', daemon=True).start()
+
+
+def require_supported_db_version():
+    """Refuse to serve the pages when the version of PuppetDB is not
+    supported, to be registered as a `before_request` function when the
+    version is not checked at startup (see PUPPETDB_VERSION_CHECK).
+
+    With the 'first_request' mode the first request waits for the check,
+    with 'background' the requests are served until it is done."""
+    if request.endpoint in DB_VERSION_EXEMPT_ENDPOINTS:
+        return
+
+    if get_app().config['PUPPETDB_VERSION_CHECK'] == 'first_request':
+        error = check_db_version_once()
+    else:
+        start_db_version_check()
+        error = DB_VERSION['error']
+
+    if error:
+        abort(500, error)
+
+
+def _fetch_environment_names() -> list:
     puppetdb = get_puppetdb()
-    envs_from_db = sorted(
+    return sorted(
         env['name']
         for env in get_or_abort(puppetdb.environments)
     )
 
+
+def _refresh_environment_names():
+    try:
+        names = _fetch_environment_names()
+    except Exception as e:
+        # keep serving the stale list, we will retry after the next request
+        log.warning(f"Failed to refresh the environments list: {e}")
+        with ENVIRONMENTS_LOCK:
+            ENVIRONMENTS['refreshing'] = False
+    else:
+        with ENVIRONMENTS_LOCK:
+            ENVIRONMENTS.update(names=names, fetched_at=time.monotonic(), refreshing=False)
+
+
+def environment_names() -> list:
+    """Return the sorted names of the environments known to PuppetDB.
+
+    The list is cached in the worker for `ENVIRONMENTS_CACHE_TTL` seconds.
+    After that the stale list is still returned while a background thread
+    fetches a fresh one, so only the very first call waits for PuppetDB.
+    """
+    ttl = get_app().config['ENVIRONMENTS_CACHE_TTL']
+    if not ttl:
+        return _fetch_environment_names()
+
+    refresh = False
+    with ENVIRONMENTS_LOCK:
+        names = ENVIRONMENTS['names']
+        expired = time.monotonic() - ENVIRONMENTS['fetched_at'] > ttl
+        if names is not None and expired and not ENVIRONMENTS['refreshing']:
+            ENVIRONMENTS['refreshing'] = True
+            refresh = True
+
+    if names is None:
+        names = _fetch_environment_names()
+        with ENVIRONMENTS_LOCK:
+            ENVIRONMENTS.update(names=names, fetched_at=time.monotonic())
+    elif refresh:
+        get_executor().submit(_refresh_environment_names)
+
+    return names
+
+
+def environments() -> dict:
+    # the menu is built at most once per request, as the error handlers
+    # call this again after the view did
+    if 'environments' not in g:
+        g.environments = _build_environments(environment_names())
+    return g.environments
+
+
+def _build_environments(envs_from_db: list) -> dict:
+    envs = {}
+
     # Adding all environments
     envs['All Environments'] = {
         'url': url_for_field('env', '*'),
@@ -183,6 +481,46 @@ def stream_template(template_name, **context):
     return rv
 
 
+def stream_json_table(draw: int, rows, total=None, filtered=None, chunk_size=16384,
+                      **extra) -> Response:
+    """Stream a DataTables JSON response, serializing the rows (lists of
+    values) one by one as they come from the given iterable, so that the
+    whole table never has to be held in memory.
+
+    The rows are sent in chunks of about chunk_size characters, not one
+    by one, as each chunk is compressed and flushed separately.
+
+    `recordsTotal` and `recordsFiltered` are sent at the end, set to the
+    given total and filtered counts or, if None, to the number of rows sent.
+    The filtered count defaults to the total. The extra keyword
+    arguments are added to the response, f.e. the data of a chart.
+    """
+    def generate():
+        count = 0
+        chunk = ['{"draw": %d, "data": [' % draw]
+        size = 0
+        for row in rows:
+            line = json.dumps(row)
+            chunk.append(line if count == 0 else ',' + line)
+            count += 1
+            size += len(line)
+            if size >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+
+        records = count if total is None else total
+        records_filtered = records if filtered is None else filtered
+        chunk.append('], "recordsTotal": %d, "recordsFiltered": %d'
+                     % (records, records_filtered))
+        for key, value in extra.items():
+            chunk.append(', %s: %s' % (json.dumps(key), json.dumps(value)))
+        chunk.append('}')
+        yield ''.join(chunk)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 def get_raw_error(source: str, message: str) -> str:
     # prefix with source, if it's not trivial
     if source != 'Puppet':
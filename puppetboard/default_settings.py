@@ -7,6 +7,30 @@ PUPPETDB_SSL_VERIFY = True
 PUPPETDB_KEY = None
 PUPPETDB_CERT = None
 PUPPETDB_TIMEOUT = 20
+# Number of threads per worker used to run independent PuppetDB queries
+# in parallel, and how long (in seconds) a view waits for such a batch
+PUPPETDB_QUERY_WORKERS = 8
+PUPPETDB_QUERY_DEADLINE = 60
+# Size of the HTTP connection pool to PuppetDB (per worker), keep
+# PUPPETDB_POOL_MAXSIZE at least as big as PUPPETDB_QUERY_WORKERS
+PUPPETDB_POOL_CONNECTIONS = 10
+PUPPETDB_POOL_MAXSIZE = 10
+# Retries with exponential backoff of GET requests that could not connect
+# or got a 502/503/504 response
+PUPPETDB_RETRIES = 2
+PUPPETDB_RETRY_BACKOFF = 0.3
+# Fail fast when too many of the recent PuppetDB requests failed
+PUPPETDB_CIRCUIT_BREAKER = True
+PUPPETDB_CIRCUIT_BREAKER_WINDOW = 60
+PUPPETDB_CIRCUIT_BREAKER_MIN_CALLS = 10
+PUPPETDB_CIRCUIT_BREAKER_THRESHOLD = 0.5
+PUPPETDB_CIRCUIT_BREAKER_SLOW_CALL = None
+PUPPETDB_CIRCUIT_BREAKER_RESET = 30
+# Send only once the identical queries made at the same time
+PUPPETDB_COALESCE_QUERIES = True
+# When to check that the version of PuppetDB is supported: 'startup' (the app
+# exits if not), 'first_request' or 'background' (the pages show an error if not)
+PUPPETDB_VERSION_CHECK = 'background'
 DEFAULT_ENVIRONMENT = 'production'
 # this empty string has to be changed, we validate it with check_secret_key()
 SECRET_KEY = ''  # nosec
@@ -43,6 +67,10 @@ GRAPH_FACTS = ['architecture',
                'osfamily',
                'puppetversion',
                'processorcount']
+# The charts of the GRAPH_FACTS show the most common values, the other ones
+# are counted together, and are cached for GRAPH_FACTS_CACHE_TTL seconds
+GRAPH_FACTS_TOP = 15
+GRAPH_FACTS_CACHE_TTL = 300
 INVENTORY_FACTS = [('Hostname', 'trusted'),
                    ('IP Address', 'networking.ip'),
                    ('OS', 'os.name'),
@@ -52,18 +80,47 @@ INVENTORY_FACTS = [('Hostname', 'trusted'),
 
 INVENTORY_FACT_TEMPLATES = {
     'trusted': (
-        """<a href="{{url_for('node', env=current_env, node_name=value.certname)}}">"""
+        """<a href="{{node_url(node_name=value.certname)}}">"""
         """{{value.hostname}}"""
         """</a>"""
     ),
     'os': "{{ fact_os_detection(value) }}",
 }
+INVENTORY_EXPORT_PAGE_SIZE = 1000
+# How long (in seconds) each worker keeps the rendered rows of the inventory, 0 disables it
+INVENTORY_CACHE_TTL = 3600
+# How many seconds before the latest facts timestamp seen the inventory rows are refreshed from
+INVENTORY_CACHE_OVERLAP = 300
 REFRESH_RATE = 30
 DAILY_REPORTS_CHART_ENABLED = True
 DAILY_REPORTS_CHART_DAYS = 8
 WITH_EVENT_NUMBERS = True
 SHOW_ERROR_AS = 'friendly'  # or 'raw'
 CODE_PREFIX_TO_REMOVE = '/etc/puppetlabs/code/environments(/.*?/modules)?'
+# How long (in seconds) each worker caches the list of environments, 0 disables it
+ENVIRONMENTS_CACHE_TTL = 60
+# How long (in seconds) the structure of the facts shown on the facts page is cached
+FACT_INDEX_TTL = 300
+# Answer the overview, radiator, nodes, inventory and facts pages from a local
+# SQLite copy of PuppetDB, synced by the puppetboard.schedulers.replica:sync_replica
+# job, as long as it was synced less than REPLICA_MAX_AGE seconds ago
+REPLICA_ENABLED = False
+# required if REPLICA_ENABLED, f.e. '/var/lib/puppetboard/replica.sqlite3'
+REPLICA_PATH = None
+REPLICA_MAX_AGE = 600
+# How many seconds before the latest timestamps seen each sync of the replica looks back
+REPLICA_SYNC_OVERLAP = 300
+# Show the PuppetDB calls made to render each page at its bottom
+DEBUG_PANEL = False
+# Compress the responses with gzip (or brotli, if installed) when the
+# browser accepts it, unless they are smaller than COMPRESSION_MIN_SIZE bytes
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 500
+COMPRESSION_LEVEL = 6
+# Expose metrics in the Prometheus format, requires the prometheus_client
+# package
+PROMETHEUS_METRICS = False
+PROMETHEUS_METRICS_PATH = '/prometheus/metrics'
 FAVORITE_ENVS = [
     'production',
     'staging',
@@ -86,6 +143,15 @@ CLASS_EVENTS_STATUS_COLUMNS = [
 CACHE_TYPE = 'SimpleCache'
 # Cache litefime in second
 CACHE_DEFAULT_TIMEOUT = 3600
+# Cache the JSON responses of these tables, for the given number of seconds
+RESPONSE_CACHE = False
+RESPONSE_CACHE_TIMEOUTS = {
+    'reports_ajax': 30,
+    'catalogs_ajax': 60,
+    'inventory_ajax': 300,
+    'fact_ajax': 300,
+    'classes_ajax': 300,
+}
 
 # List of scheduled jobs to trigger
 #   * `id`: job's ID
@@ -60,6 +60,21 @@ PUPPETDB_KEY = cert_to_file(os.getenv('PUPPETDB_KEY', None))
 PUPPETDB_CERT = cert_to_file(os.getenv('PUPPETDB_CERT', None))
 PUPPETDB_PROTO = os.getenv('PUPPETDB_PROTO', None)
 PUPPETDB_TIMEOUT = int(os.getenv('PUPPETDB_TIMEOUT', '20'))
+PUPPETDB_QUERY_WORKERS = int(os.getenv('PUPPETDB_QUERY_WORKERS', '8'))
+PUPPETDB_QUERY_DEADLINE = int(os.getenv('PUPPETDB_QUERY_DEADLINE', '60'))
+PUPPETDB_POOL_CONNECTIONS = int(os.getenv('PUPPETDB_POOL_CONNECTIONS', '10'))
+PUPPETDB_POOL_MAXSIZE = int(os.getenv('PUPPETDB_POOL_MAXSIZE', '10'))
+PUPPETDB_RETRIES = int(os.getenv('PUPPETDB_RETRIES', '2'))
+PUPPETDB_RETRY_BACKOFF = float(os.getenv('PUPPETDB_RETRY_BACKOFF', '0.3'))
+PUPPETDB_CIRCUIT_BREAKER = coerce_bool(os.getenv('PUPPETDB_CIRCUIT_BREAKER'), True)
+PUPPETDB_CIRCUIT_BREAKER_WINDOW = int(os.getenv('PUPPETDB_CIRCUIT_BREAKER_WINDOW', '60'))
+PUPPETDB_CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv('PUPPETDB_CIRCUIT_BREAKER_MIN_CALLS', '10'))
+PUPPETDB_CIRCUIT_BREAKER_THRESHOLD = float(os.getenv('PUPPETDB_CIRCUIT_BREAKER_THRESHOLD', '0.5'))
+_slow_call = os.getenv('PUPPETDB_CIRCUIT_BREAKER_SLOW_CALL')
+PUPPETDB_CIRCUIT_BREAKER_SLOW_CALL = float(_slow_call) if _slow_call else None
+PUPPETDB_CIRCUIT_BREAKER_RESET = int(os.getenv('PUPPETDB_CIRCUIT_BREAKER_RESET', '30'))
+PUPPETDB_COALESCE_QUERIES = coerce_bool(os.getenv('PUPPETDB_COALESCE_QUERIES'), True)
+PUPPETDB_VERSION_CHECK = os.getenv('PUPPETDB_VERSION_CHECK', 'background')
 DEFAULT_ENVIRONMENT = os.getenv('DEFAULT_ENVIRONMENT', 'production')
 # this empty string has to be changed, we validate it with check_secret_key()
 SECRET_KEY = os.getenv('SECRET_KEY', '')  # nosec
@@ -99,6 +114,8 @@ GRAPH_FACTS = [x.strip() for x in os.getenv('GRAPH_FACTS',
                                             GRAPH_FACTS_DEFAULT).split(',')]
 
 GRAPH_TYPE = os.getenv('GRAPH_TYPE', 'pie')
+GRAPH_FACTS_TOP = int(os.getenv('GRAPH_FACTS_TOP', '15'))
+GRAPH_FACTS_CACHE_TTL = int(os.getenv('GRAPH_FACTS_CACHE_TTL', '300'))
 
 # Tuples are hard to express as an environment variable, so here
 # the tuple can be listed as a list of items
@@ -119,7 +136,7 @@ INV_STR = os.getenv('INVENTORY_FACTS', INVENTORY_FACTS_DEFAULT).split(',')
 # To render jinja template we expect env var to be JSON
 INVENTORY_FACT_TEMPLATES = {
     'trusted': (
-        """<a href="{{url_for('node', env=current_env, node_name=value.certname)}}">"""
+        """<a href="{{node_url(node_name=value.certname)}}">"""
         """{{value.hostname}}"""
         """</a>"""
     ),
@@ -135,6 +152,9 @@ if INV_TPL_STR:
 # Take the Array and convert it to a tuple
 INVENTORY_FACTS = [(INV_STR[i].strip(),
                     INV_STR[i + 1].strip()) for i in range(0, len(INV_STR), 2)]
+INVENTORY_EXPORT_PAGE_SIZE = int(os.getenv('INVENTORY_EXPORT_PAGE_SIZE', '1000'))
+INVENTORY_CACHE_TTL = int(os.getenv('INVENTORY_CACHE_TTL', '3600'))
+INVENTORY_CACHE_OVERLAP = int(os.getenv('INVENTORY_CACHE_OVERLAP', '300'))
 
 REFRESH_RATE = int(os.getenv('REFRESH_RATE', '30'))
 
@@ -145,6 +165,18 @@ WITH_EVENT_NUMBERS = coerce_bool(os.getenv('WITH_EVENT_NUMBERS'), True)
 
 SHOW_ERROR_AS = os.getenv('SHOW_ERROR_AS', 'friendly')
 CODE_PREFIX_TO_REMOVE = os.getenv('CODE_PREFIX_TO_REMOVE', '/etc/puppetlabs/code/environments')
+ENVIRONMENTS_CACHE_TTL = int(os.getenv('ENVIRONMENTS_CACHE_TTL', '60'))
+FACT_INDEX_TTL = int(os.getenv('FACT_INDEX_TTL', '300'))
+REPLICA_ENABLED = coerce_bool(os.getenv('REPLICA_ENABLED'), False)
+REPLICA_PATH = os.getenv('REPLICA_PATH')
+REPLICA_MAX_AGE = int(os.getenv('REPLICA_MAX_AGE', '600'))
+REPLICA_SYNC_OVERLAP = int(os.getenv('REPLICA_SYNC_OVERLAP', '300'))
+DEBUG_PANEL = coerce_bool(os.getenv('DEBUG_PANEL'), False)
+COMPRESSION_ENABLED = coerce_bool(os.getenv('COMPRESSION_ENABLED'), True)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '500'))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+PROMETHEUS_METRICS = coerce_bool(os.getenv('PROMETHEUS_METRICS'), False)
+PROMETHEUS_METRICS_PATH = os.getenv('PROMETHEUS_METRICS_PATH', '/prometheus/metrics')
 FAVORITE_ENVS_DEF = ','.join([
     'production',
     'staging',
@@ -165,6 +197,19 @@ CACHE_MEMCACHED_SERVERS_DEFAULT = ','.join(['memcached:11211'])
 if CACHE_TYPE == 'MemcachedCache':
     CACHE_MEMCACHED_SERVERS = os.getenv('CACHE_MEMCACHED_SERVERS', CACHE_MEMCACHED_SERVERS_DEFAULT).split(',')
 
+RESPONSE_CACHE = coerce_bool(os.getenv('RESPONSE_CACHE'), False)
+RESPONSE_CACHE_TIMEOUTS = {
+    'reports_ajax': 30,
+    'catalogs_ajax': 60,
+    'inventory_ajax': 300,
+    'fact_ajax': 300,
+    'classes_ajax': 300,
+}
+# To override the timeouts we expect env var to be JSON
+RESPONSE_CACHE_TIMEOUTS_STR = os.getenv('RESPONSE_CACHE_TIMEOUTS')
+if RESPONSE_CACHE_TIMEOUTS_STR:
+    RESPONSE_CACHE_TIMEOUTS.update(json.loads(RESPONSE_CACHE_TIMEOUTS_STR))
+
 # A mapping between the status of the resource events
 # and the name of the columns of the table to display.
 CLASS_EVENTS_STATUS_COLUMNS_DEFAULT = ','.join(['failure', 'Failure',
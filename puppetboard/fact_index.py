@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+from functools import partial
+
+from pypuppetdb.QueryBuilder import (EqualsOperator, ExtractOperator,
+                                     OrOperator, RegexArrayOperator)
+
+from puppetboard.core import get_app, get_cache, get_puppetdb, fresh_replica, query_all
+from puppetboard.utils import get_or_abort
+
+app = get_app()
+cache = get_cache()
+puppetdb = get_puppetdb()
+
+# per-worker prefix trie of the fact paths, see fact_children(),
+# its 'root' node is added when the first fact is expanded
+FACT_TRIE: dict = {}
+FACT_TRIE_LOCK = threading.Lock()
+
+
+def _paths_query() -> OrOperator:
+    # the base facts and their direct children only, the paths of
+    # the deeper levels are loaded when the facts are expanded
+    query = OrOperator()
+    query.add(RegexArrayOperator('path', ['.*']))
+    query.add(RegexArrayOperator('path', ['.*', '.*']))
+    return query
+
+
+def _names_query(env: str) -> ExtractOperator:
+    query = ExtractOperator()
+    query.add_field('name')
+    query.add_query(EqualsOperator('environment', env))
+    query.add_group_by('name')
+    return query
+
+
+def build_fact_index(env: str) -> dict:
+    """Build the structure of the facts known to PuppetDB: the type of each
+    base fact and the keys of the structured ones, f.e.
+    `{'os': {'type': 'map', 'children': ['family', 'name']}, ...}`.
+
+    It is built from the fact-paths endpoint, which returns each path only
+    once instead of the values of every node. As this endpoint cannot be
+    filtered by environment, the names of the facts of the environment
+    (if not '*') are fetched from the facts endpoint, grouped by name.
+
+    It is built from the facts of the local replica instead, if enabled
+    (see puppetboard.replica).
+    """
+    replica = fresh_replica()
+    if replica is not None:
+        return replica.fact_index(env)
+
+    calls = [partial(puppetdb.fact_paths, query=_paths_query())]
+    if env != '*':
+        calls.append(partial(puppetdb._query, 'facts', query=_names_query(env)))
+    results = get_or_abort(query_all, *calls)
+
+    index: dict = {}
+    for fact_path in sorted(results[0] or [], key=lambda fact_path: len(fact_path['path'])):
+        name = str(fact_path['path'][0])
+        if len(fact_path['path']) == 1:
+            index[name] = {'type': fact_path['type'], 'children': []}
+        elif name in index:
+            index[name]['children'].append(str(fact_path['path'][1]))
+
+    if env != '*':
+        names = {row['name'] for row in results[1] or []}
+        index = {name: entry for name, entry in index.items() if name in names}
+
+    for entry in index.values():
+        entry['children'].sort()
+    return index
+
+
+def get_fact_index(env: str) -> dict:
+    """Return the fact structure of the environment (see build_fact_index()),
+    cached for FACT_INDEX_TTL seconds or refreshed by the scheduled job
+    puppetboard.schedulers.facts:build_fact_index_cache."""
+    key = f'fact_index_{env}'
+    index = cache.get(key)
+    if index is None:
+        index = build_fact_index(env)
+        cache.set(key, index, timeout=app.config['FACT_INDEX_TTL'])
+    return index
+
+
+def _trie_node(type_=None) -> dict:
+    # 'fetched_at' is None until the children of the node are loaded
+    return {'type': type_, 'has_children': False, 'children': {}, 'fetched_at': None}
+
+
+def _valid_key(key) -> bool:
+    # keys with dots are ambiguous in the dotted paths and slashes break the
+    # routing (see flatten_fact()), the integers are the indexes of arrays
+    return isinstance(key, str) and '.' not in key and '/' not in key
+
+
+def _find(path: list):
+    node = FACT_TRIE.get('root')
+    for key in path:
+        if node is None:
+            break
+        node = node['children'].get(key)
+    return node
+
+
+def _walk(path: list) -> dict:
+    node = FACT_TRIE.setdefault('root', _trie_node('map'))
+    for key in path:
+        node = node['children'].setdefault(key, _trie_node())
+    return node
+
+
+def _load_children(path: list) -> dict:
+    """Fetch the paths of the two levels below the given fact path: its
+    children, and their own children to know if they can be expanded."""
+    prefix = ['^' + re.escape(key) + '$' for key in path]
+    query = OrOperator()
+    query.add(RegexArrayOperator('path', prefix + ['.*']))
+    query.add(RegexArrayOperator('path', prefix + ['.*', '.*']))
+
+    children: dict = {}
+    for fact_path in get_or_abort(puppetdb.fact_paths, query=query) or []:
+        keys = fact_path['path'][len(path):]
+        if not all(_valid_key(key) for key in keys):
+            continue
+        child = children.setdefault(keys[0], _trie_node())
+        if len(keys) == 1:
+            child['type'] = fact_path['type']
+        else:
+            child['has_children'] = True
+    return children
+
+
+def fact_children(path: list) -> list:
+    """Return the keys of the children of a structured fact, given as the
+    list of the keys of its path (f.e. `['networking', 'interfaces']`),
+    and whether they have children too, sorted by key.
+
+    The paths come from the fact-paths endpoint and are kept in a prefix
+    trie, so expanding a fact is a lookup once its children are loaded.
+    They are loaded on the first expand and reloaded after FACT_INDEX_TTL
+    seconds, keeping the already loaded levels below them.
+
+    As fact-paths cannot be filtered by environment, the trie holds the
+    paths of all the environments.
+    """
+    ttl = app.config['FACT_INDEX_TTL']
+    with FACT_TRIE_LOCK:
+        node = _find(path)
+        if (node is not None and node['fetched_at'] is not None
+                and time.monotonic() - node['fetched_at'] < ttl):
+            return sorted((key, child['has_children'])
+                          for key, child in node['children'].items())
+
+    children = _load_children(path)
+    if not children:
+        # not a structured fact, do not grow the trie with unknown paths
+        return []
+
+    with FACT_TRIE_LOCK:
+        node = _walk(path)
+        for key, child in children.items():
+            loaded = node['children'].get(key)
+            if loaded is not None:
+                child.update(children=loaded['children'], fetched_at=loaded['fetched_at'])
+        node.update(children=children, fetched_at=time.monotonic())
+        return sorted((key, child['has_children']) for key, child in children.items())
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from pypuppetdb.QueryBuilder import (AndOperator, EqualsOperator, ExtractOperator,
+                                     GreaterOperator, InOperator, NullOperator,
+                                     OrOperator)
+from pypuppetdb.types import Fact, Node
+
+from puppetboard.utils import look_back
+
+log = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS nodes (
+    certname TEXT PRIMARY KEY,
+    catalog_environment TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_catalog_environment ON nodes (catalog_environment);
+
+CREATE TABLE IF NOT EXISTS facts (
+    certname TEXT NOT NULL,
+    environment TEXT,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (certname, name)
+);
+CREATE INDEX IF NOT EXISTS facts_name ON facts (name, environment);
+
+CREATE TABLE IF NOT EXISTS reports (
+    certname TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS watermarks (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+# the timestamps of the nodes telling which of their data has changed
+TIMESTAMPS = ('facts_timestamp', 'report_timestamp', 'catalog_timestamp')
+
+# the number of certnames per `in` query
+BATCH_SIZE = 500
+
+# the types of the fact values in PuppetDB, by SQLite JSON type
+FACT_TYPES = {
+    'object': 'map',
+    'array': 'array',
+    'text': 'string',
+    'integer': 'integer',
+    'real': 'float',
+    'true': 'boolean',
+    'false': 'boolean',
+    'null': 'null',
+}
+
+
+def _batches(items: list):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def _report_events(report: dict) -> dict:
+    """The counts of the events of a report, like the event-counts endpoint
+    gives them, from its metrics."""
+    metrics = report.get('metrics') or {}
+    if isinstance(metrics, dict):
+        metrics = metrics.get('data') or []
+    values = {(metric['category'], metric['name']): metric['value'] for metric in metrics}
+    return {
+        'successes': values.get(('events', 'success'), 0),
+        'failures': values.get(('events', 'failure'), 0),
+        'noops': values.get(('events', 'noop'), 0),
+        'skips': values.get(('resources', 'skipped'), 0),
+    }
+
+
+class Replica(object):
+    """A local SQLite copy of the nodes, their latest facts and the summary
+    of their latest reports, kept up to date by sync() (see the scheduled job
+    puppetboard.schedulers.replica:sync_replica) and read by the views
+    instead of scanning PuppetDB.
+
+    Only the nodes whose facts, report or catalog timestamp moved past the
+    latest one seen by the previous sync, minus an overlap, are fetched
+    again. The file can be shared by the workers: one of them syncs it while
+    the others read it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # it holds the facts of every node, only the user of Puppetboard can read it
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        with self.connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        # a connection per thread, as they cannot be shared
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+        return connection
+
+    def watermarks(self) -> dict:
+        return dict(self.connection().execute('SELECT name, value FROM watermarks'))
+
+    def synced_at(self):
+        """When the replica was last synced, as a timestamp, or None."""
+        synced_at = self.watermarks().get('synced_at')
+        return float(synced_at) if synced_at is not None else None
+
+    def sync(self, puppetdb, overlap=300) -> dict:
+        """Fetch from PuppetDB the nodes that changed since the last sync,
+        with their facts and latest report if these changed too, and remove
+        the nodes that are not active anymore. Returns the number of nodes,
+        factsets and reports fetched, and of nodes removed.
+
+        The nodes are fetched from `overlap` seconds before the latest
+        timestamps seen, as PuppetDB stores the commands asynchronously: the
+        facts or report of a node can be stored after the sync with an older
+        timestamp than the latest one it saw. Their facts and report are
+        only fetched again if their timestamps differ from the stored ones."""
+        with self.lock, self.connection() as connection:
+            watermarks = self.watermarks()
+
+            query = None
+            if 'synced_at' in watermarks:
+                query = OrOperator()
+                for field in TIMESTAMPS:
+                    if field in watermarks:
+                        query.add(GreaterOperator(field, look_back(watermarks[field], overlap)))
+                    else:
+                        query.add(NullOperator(field, False))
+            nodes = puppetdb._query('nodes', query=query) or []
+
+            stored = {certname: json.loads(data) for certname, data in connection.execute(
+                'SELECT certname, data FROM nodes '
+                'WHERE certname IN (SELECT value FROM json_each(?))',
+                (json.dumps([node['certname'] for node in nodes]),))}
+
+            def moved(node, field):
+                return (node[field] is not None
+                        and node[field] != stored.get(node['certname'], {}).get(field))
+
+            connection.executemany(
+                'INSERT OR REPLACE INTO nodes (certname, catalog_environment, data) '
+                'VALUES (?, ?, ?)',
+                [(node['certname'], node['catalog_environment'], json.dumps(node))
+                 for node in nodes])
+
+            facts_changed = [node['certname'] for node in nodes if moved(node, 'facts_timestamp')]
+            factsets = 0
+            for batch in _batches(facts_changed):
+                in_batch = InOperator('certname')
+                in_batch.add_array(batch)
+                for factset in puppetdb._query('factsets', query=in_batch) or []:
+                    factsets += 1
+                    connection.execute('DELETE FROM facts WHERE certname = ?',
+                                       (factset['certname'],))
+                    connection.executemany(
+                        'INSERT INTO facts (certname, environment, name, value) '
+                        'VALUES (?, ?, ?, ?)',
+                        [(factset['certname'], factset['environment'],
+                          fact['name'], json.dumps(fact['value']))
+                         for fact in factset['facts']['data']])
+
+            reports_changed = [node['certname'] for node in nodes if moved(node, 'report_timestamp')]
+            reports = 0
+            for batch in _batches(reports_changed):
+                in_batch = InOperator('certname')
+                in_batch.add_array(batch)
+                query = AndOperator()
+                query.add(EqualsOperator('latest_report?', True))
+                query.add(in_batch)
+                # the summary only, not the logs and events
+                extract = ExtractOperator()
+                extract.add_field(['certname', 'hash', 'environment', 'status',
+                                   'noop', 'end_time', 'metrics'])
+                extract.add_query(query)
+                for report in puppetdb._query('reports', query=extract) or []:
+                    reports += 1
+                    summary = {
+                        'hash': report['hash'],
+                        'environment': report['environment'],
+                        'status': report['status'],
+                        'noop': report['noop'],
+                        'end_time': report['end_time'],
+                        'events': _report_events(report),
+                    }
+                    connection.execute(
+                        'INSERT OR REPLACE INTO reports (certname, data) VALUES (?, ?)',
+                        (report['certname'], json.dumps(summary)))
+
+            # the deactivated and expired nodes are not returned anymore
+            extract = ExtractOperator()
+            extract.add_field('certname')
+            active = {node['certname'] for node in puppetdb._query('nodes', query=extract) or []}
+            removed = [(certname,) for (certname,)
+                       in connection.execute('SELECT certname FROM nodes')
+                       if certname not in active]
+            connection.executemany('DELETE FROM nodes WHERE certname = ?', removed)
+            connection.executemany('DELETE FROM facts WHERE certname = ?', removed)
+            connection.executemany('DELETE FROM reports WHERE certname = ?', removed)
+
+            for field in TIMESTAMPS:
+                timestamps = [node[field] for node in nodes if node[field] is not None]
+                if field in watermarks:
+                    timestamps.append(watermarks[field])
+                if timestamps:
+                    watermarks[field] = max(timestamps)
+            watermarks['synced_at'] = str(time.time())
+            connection.executemany(
+                'INSERT OR REPLACE INTO watermarks (name, value) VALUES (?, ?)',
+                watermarks.items())
+
+        result = {'nodes': len(nodes), 'factsets': factsets,
+                  'reports': reports, 'removed': len(removed)}
+        log.info('Replica synced: %s', result)
+        return result
+
+    def nodes(self, puppetdb, env: str, unreported=2, with_status=False,
+              with_event_numbers=True):
+        """The nodes of the (catalog) environment, or of all of them if '*',
+        like the nodes() method of the pypuppetdb API object gives them. The
+        event numbers come from the metrics of the latest reports."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = self.connection().execute(
+            'SELECT nodes.certname, nodes.data, reports.data FROM nodes '
+            'LEFT JOIN reports USING (certname) '
+            'WHERE ? = \'*\' OR catalog_environment = ? ORDER BY nodes.certname',
+            (env, env)).fetchall()
+        for certname, node_data, report_data in rows:
+            node = json.loads(node_data)
+            latest_events = []
+            if report_data is not None:
+                report = json.loads(report_data)
+                if report['hash'] == node.get('latest_report_hash'):
+                    latest_events.append({'subject': {'title': certname}, **report['events']})
+            yield Node.create_from_dict(puppetdb, node, with_status, with_event_numbers,
+                                        latest_events, now, unreported)
+
+    def facts(self, env: str, names):
+        """The facts with the given names of the nodes of the environment, or
+        of all of them if '*', sorted by node."""
+        rows = self.connection().execute(
+            'SELECT certname, name, value, environment FROM facts '
+            'WHERE name IN (SELECT value FROM json_each(?)) AND (? = \'*\' OR environment = ?) '
+            'ORDER BY certname, name',
+            (json.dumps(sorted(names)), env, env))
+        for certname, name, value, environment in rows:
+            yield Fact(certname, name, json.loads(value), environment)
+
+    def fact_index(self, env: str) -> dict:
+        """The structure of the facts of the environment, or of all of them
+        if '*', like puppetboard.fact_index.build_fact_index() builds it."""
+        connection = self.connection()
+        index: dict = {}
+        for name, types in connection.execute(
+                'SELECT name, group_concat(DISTINCT json_type(value)) FROM facts '
+                'WHERE ? = \'*\' OR environment = ? GROUP BY name', (env, env)):
+            types = types.split(',')
+            json_type = 'object' if 'object' in types else types[0]
+            index[name] = {'type': FACT_TYPES.get(json_type, json_type), 'children': []}
+
+        for name, key in connection.execute(
+                'SELECT DISTINCT facts.name, children.key '
+                'FROM facts, json_each(facts.value) AS children '
+                'WHERE json_type(facts.value) = \'object\' '
+                'AND (? = \'*\' OR facts.environment = ?) '
+                'ORDER BY facts.name, children.key', (env, env)):
+            index[name]['children'].append(key)
+        return index
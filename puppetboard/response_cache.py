@@ -0,0 +1,70 @@
+import functools
+import hashlib
+import json
+import re
+
+from flask import Response, make_response, request
+
+from puppetboard.core import get_app, get_cache
+
+app = get_app()
+cache = get_cache()
+
+DRAW_RE = re.compile(rb'"draw"\s*:\s*\d+')
+
+# request arguments that change on every request of a same table:
+# the DataTables draw counter and the jQuery cache buster
+VOLATILE_ARGS = ('draw', '_')
+
+
+def cache_key() -> str:
+    args = sorted((name, value) for name, value in request.args.items(multi=True)
+                  if name not in VOLATILE_ARGS)
+    data = json.dumps([request.endpoint, request.view_args, args],
+                      sort_keys=True, default=str)
+    return 'response_' + hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def cached_response(view):
+    """Cache the successful responses of a DataTables JSON view, for
+    RESPONSE_CACHE_TIMEOUTS[endpoint] seconds if RESPONSE_CACHE is enabled.
+
+    The responses are cached per endpoint, view arguments (environment,
+    node, fact...) and request arguments, except the `draw` counter, which
+    is replaced in the cached body by the one of the current request.
+
+    The responses get a strong ETag, so that the unchanged tables are
+    answered with a 304 Not Modified when the browser revalidates them. It
+    is the hash of the cached body, before the `draw` counter is replaced,
+    so that it does not change on every draw of a same table.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        timeout = app.config['RESPONSE_CACHE_TIMEOUTS'].get(request.endpoint)
+        if not app.config['RESPONSE_CACHE'] or not timeout:
+            return view(*args, **kwargs)
+
+        key = cache_key()
+        entry = cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # get_data() buffers the streamed tables (see stream_json_table())
+            body = response.get_data()
+            entry = {'body': body, 'mimetype': response.mimetype,
+                     'etag': hashlib.sha256(body).hexdigest()}
+            cache.set(key, entry, timeout=timeout)
+
+        body = entry['body']
+        draw = request.args.get('draw')
+        if draw is not None and draw.isdigit():
+            body = DRAW_RE.sub(f'"draw": {draw}'.encode(), body, count=1)
+
+        response = Response(body, mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
@@ -0,0 +1,15 @@
+from puppetboard.core import environment_names, get_app, get_cache
+from puppetboard.fact_index import build_fact_index
+
+app = get_app()
+cache = get_cache()
+
+
+def build_fact_index_cache():
+    """Scheduled job triggered at regular interval in order to refresh the
+    structure of the facts displayed by the facts view, for each environment
+    and for all of them, so that no request has to wait for it.
+    """
+    for env in ['*'] + environment_names():
+        cache.set(f'fact_index_{env}', build_fact_index(env),
+                  timeout=app.config['FACT_INDEX_TTL'])
@@ -0,0 +1,13 @@
+from puppetboard.core import get_app, get_puppetdb, get_replica
+
+app = get_app()
+puppetdb = get_puppetdb()
+
+
+def sync_replica():
+    """Scheduled job triggered at regular interval in order to sync the local
+    replica of PuppetDB read by the views, see puppetboard.replica.
+    """
+    replica = get_replica()
+    if replica is not None:
+        replica.sync(puppetdb, overlap=app.config['REPLICA_SYNC_OVERLAP'])
@@ -0,0 +1,10 @@
+from blinker import Namespace
+
+_signals = Namespace()
+
+# sent by the pypuppetdb API object after each HTTP request to PuppetDB,
+# with the `endpoint` (URL path), `duration` (seconds) and `failed` arguments
+puppetdb_called = _signals.signal('puppetdb-called')
+
+# sent by get_cache() on each lookup, with the `hit` argument
+cache_accessed = _signals.signal('cache-accessed')
@@ -0,0 +1,77 @@
+import copy
+import functools
+import json
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Merges the identical calls made at the same time by several threads:
+    the first one runs, the others wait for it and get its result (or its
+    exception).
+
+    As pypuppetdb modifies the dicts it gets from PuppetDB when it builds
+    its objects, a deep copy of the result is taken before the waiters are
+    released, and each of them gets its own copy of it. The leader keeps
+    the original.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: dict = {}
+
+    def do(self, key, func):
+        """Run func() unless a call with the same key is already running,
+        in which case wait for its result instead."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+            # taken before the leader's caller can modify the result
+            call.result = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+def coalesce_calls(puppetdb, single_flight: SingleFlight):
+    """Send only once the identical GET requests that the given pypuppetdb
+    API object makes concurrently to PuppetDB, f.e. when many dashboards
+    refresh the overview at the same time. The requests are identical when
+    they have the same URL (endpoint) and parameters (query, order, paging).
+
+    The requests with `include_total` are not merged, as the total is read
+    from the API object after the request."""
+    make_request = puppetdb._make_request
+
+    @functools.wraps(make_request)
+    def coalesced_make_request(url, request_method, payload):
+        if request_method.upper() != 'GET' or 'include_total' in (payload or {}):
+            return make_request(url, request_method, payload)
+
+        key = (url, json.dumps(payload, sort_keys=True, default=str))
+        return single_flight.do(
+            key, functools.partial(make_request, url, request_method, payload))
+
+    puppetdb._make_request = coalesced_make_request
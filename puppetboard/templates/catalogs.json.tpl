@@ -9,16 +9,16 @@
         {%- for column in columns -%}
           {%- if not loop.first %},{%- endif -%}
           {%- if column.attr == 'catalog_timestamp' -%}
-            "<a rel=\"utctimestamp\" href=\"{{url_for('catalog_node', env=current_env, node_name=catalog.certname)}}\">{{ catalog.catalog_timestamp }}</a>"
+            "<a rel=\"utctimestamp\" href=\"{{catalog_url(node_name=catalog.certname)}}\">{{ catalog.catalog_timestamp }}</a>"
           {%- elif column.type == 'node' -%}
-            {% filter jsonprint %}<a href="{{url_for('node', env=current_env, node_name=catalog.certname)}}">{{ catalog.certname }}</a>{% endfilter %}
+            {% filter jsonprint %}<a href="{{node_url(node_name=catalog.certname)}}">{{ catalog.certname }}</a>{% endfilter %}
           {%- elif column.attr == 'form' -%}
             {% filter jsonprint -%}
               <div class="ui action input">
                 {%- if catalog.form -%}
-                <form method="GET" action="{{url_for('catalog_compare', env=current_env, compare=catalog.form, against=catalog.certname)}}">
+                <form method="GET" action="{{compare_url(compare=catalog.form, against=catalog.certname)}}">
                 {%- else -%}
-                <form method="GET" action="{{url_for('catalogs', env=current_env, compare=catalog.certname)}}">
+                <form method="GET" action="{{catalogs_url(compare=catalog.certname)}}">
                 {%- endif -%}
                   <div class="field inline">
                     {%- if catalog.form -%}
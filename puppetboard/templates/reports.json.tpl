@@ -15,10 +15,10 @@
             "<span data-localise=\"{{ config.LOCALISE_TIMESTAMP|lower }}\">{{ report[column.attr] }}</span>"
           {%- elif column.type == 'status' -%}
             {% filter jsonprint -%}
-              {{ macros.report_status(status=report.status, node_name=report.node, metrics=metrics[report.hash_], report_hash=report.hash_, current_env=current_env) }}
+              {{ macros.report_status(status=report.status, node_name=report.node, metrics=metrics[report.hash_], report_hash=report.hash_, current_env=current_env, report_url=report_url) }}
             {%- endfilter %}
           {%- elif column.type == 'node' -%}
-            {% filter jsonprint %}<a href="{{url_for('node', env=current_env, node_name=report.node)}}">{{ report.node }}</a>{% endfilter %}
+            {% filter jsonprint %}<a href="{{node_url(node_name=report.node)}}">{{ report.node }}</a>{% endfilter %}
           {%- else -%}
             {{ report[column.attr] | jsonprint }}
           {%- endif -%}
@@ -0,0 +1,89 @@
+import functools
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import g, has_request_context
+
+from puppetboard.signals import puppetdb_called
+
+# the calls of a request are recorded from the threads of query_all() too
+CALLS_LOCK = threading.Lock()
+
+
+def trace_calls(puppetdb):
+    """Time and count every HTTP request the given pypuppetdb API object
+    makes to PuppetDB. All the queries (plain, PQL, metrics...) go through
+    `_make_request`, so this is wrapped on the instance.
+
+    The calls are recorded in the current Flask request, see
+    puppetdb_calls(). Calls made outside of a request (scheduler jobs,
+    startup checks) are not recorded there, but all of them are sent
+    with the puppetdb_called signal."""
+    make_request = puppetdb._make_request
+
+    @functools.wraps(make_request)
+    def traced_make_request(url, request_method, payload):
+        start = time.perf_counter()
+        result = None
+        failed = True
+        try:
+            result = make_request(url, request_method, payload)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            endpoint = urlsplit(url).path
+            record_call(endpoint, payload, duration, None if failed else result)
+            puppetdb_called.send(puppetdb, endpoint=endpoint,
+                                 duration=duration, failed=failed)
+
+    puppetdb._make_request = traced_make_request
+
+
+def record_call(endpoint: str, payload: dict, duration: float, result):
+    if not has_request_context():
+        return
+
+    if isinstance(result, list):
+        rows = len(result)
+    elif result is None:
+        # the request has failed
+        rows = None
+    else:
+        rows = 1
+
+    calls = puppetdb_calls()
+    with CALLS_LOCK:
+        calls.append({
+            'endpoint': endpoint,
+            'query': (payload or {}).get('query'),
+            'duration': duration,
+            'rows': rows,
+        })
+
+
+def puppetdb_calls() -> list:
+    """The PuppetDB calls made so far in the current request."""
+    # the list is created under the lock, so that the first calls made in
+    # parallel by query_all() do not each create their own
+    with CALLS_LOCK:
+        if 'puppetdb_calls' not in g:
+            g.puppetdb_calls = []
+        return g.puppetdb_calls
+
+
+def add_server_timing(response):
+    """Report the number and total time of the PuppetDB calls made by the
+    view in the Server-Timing header.
+
+    The calls made while a streamed response is sent (lazily evaluated
+    query results) happen after the headers and are not counted there,
+    but they are shown in the debug panel as it is rendered last."""
+    calls = puppetdb_calls()
+    total = sum(call['duration'] for call in calls) * 1000
+    response.headers.add(
+        'Server-Timing',
+        f'puppetdb;desc="{len(calls)} calls";dur={total:.1f}',
+    )
+    return response
@@ -1,11 +1,18 @@
 import ast
 import json
 import logging
+import re
 import sys
-from typing import Any, Union
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from itertools import chain
+from typing import Any, Optional, Union
+from urllib.parse import quote, quote_plus
 
 from flask import abort, request, url_for
 from packaging.version import parse
+from pypuppetdb.QueryBuilder import AndOperator, ExtractOperator, FunctionOperator
 from pypuppetdb.errors import EmptyResponseError
 from requests.exceptions import ConnectionError, HTTPError
 
@@ -19,23 +26,77 @@ def url_for_field(field, value):
     return url_for(request.endpoint, **args)
 
 
+class UrlTemplate(object):
+    """The URL of a route resolved once with url_for(), in which the values
+    of the given fields are then filled for each row of a table, f.e.:
+
+        node_url = UrlTemplate('node', 'node_name', env=env)
+        node_url(node_name=certname)
+
+    instead of matching the route and building the URL with url_for() for
+    every row. The values are quoted like url_for() does, in the path or in
+    the query string.
+    """
+
+    # the characters kept as they are by Werkzeug
+    PATH_SAFE = "!$&'()*+,/:;=@"
+    QUERY_SAFE = "!$'()*,/:;?@"
+
+    def __init__(self, endpoint: str, *fields: str, **values):
+        markers = {f'__url_template_{field}__': field for field in fields}
+        values.update((field, marker) for marker, field in markers.items())
+        url = url_for(endpoint, **values)
+        query_start = url.find('?')
+
+        self.static = []
+        self.fields = []
+        position = 0
+        for match in re.finditer('|'.join(map(re.escape, markers)), url):
+            self.static.append(url[position:match.start()])
+            if 0 <= query_start < match.start():
+                quote_value = partial(quote_plus, safe=self.QUERY_SAFE)
+            else:
+                quote_value = partial(quote, safe=self.PATH_SAFE)
+            self.fields.append((markers[match.group()], quote_value))
+            position = match.end()
+        self.static.append(url[position:])
+
+    def __call__(self, **values) -> str:
+        url = self.static[0]
+        for (field, quote_value), static in zip(self.fields, self.static[1:]):
+            url += quote_value(str(values[field])) + static
+        return url
+
+
 def jsonprint(value):
     return json.dumps(value, indent=2, separators=(",", ": "))
 
 
+MINIMUM_DB_VERSION = "5.2.0"
+
+
+def db_version_error(puppetdb) -> Optional[str]:
+    """
+    Gets the version of puppetdb and returns an error message if it is not
+    an accepted one. The errors to connect to PuppetDB are raised.
+    """
+    current_version = puppetdb.current_version()
+    log.info(f"PuppetDB version: {current_version}")
+
+    current_semver = current_version.split("-")[0]
+    if parse(current_semver) < parse(MINIMUM_DB_VERSION):
+        return f"The minimum supported version of PuppetDB is {MINIMUM_DB_VERSION}"
+    return None
+
+
 def check_db_version(puppetdb):
     """
     Gets the version of puppetdb and exits if it is not an accepted one.
     """
     try:
-        current_version = puppetdb.current_version()
-        log.info(f"PuppetDB version: {current_version}")
-
-        current_semver = current_version.split("-")[0]
-        minimum_semver = "5.2.0"
-
-        if parse(current_semver) < parse(minimum_semver):
-            log.error(f"The minimum supported version of PuppetDB is {minimum_semver}")
+        error = db_version_error(puppetdb)
+        if error:
+            log.error(error)
             sys.exit(1)
 
     except HTTPError as e:
@@ -57,6 +118,13 @@ def check_secret_key(secret_key_value):
         sys.exit(1)
 
 
+def check_replica_path(enabled, path):
+    if enabled and not path:
+        log.critical('Please set REPLICA_PATH to the path of the SQLite file of the replica,'
+                     ' readable by Puppetboard only, or set REPLICA_ENABLED to False.')
+        sys.exit(1)
+
+
 def parse_python(value: str):
     """
     :param value: any string, number, bool, list or a dict
@@ -141,6 +209,72 @@ def yield_or_stop(generator):
             return
 
 
+def prefetch(iterable) -> Iterator:
+    """Start iterating over a generator, f.e. one of pypuppetdb which sends
+    its request to PuppetDB on the first iteration, and return an iterator
+    over all its items.
+
+    Use it with get_or_abort() to handle the errors of the request before
+    streaming a response made from the generator."""
+    iterator = iter(iterable)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return chain([first], iterator)
+
+
+def datatables_paging(fields: list, tiebreak: Optional[str] = None) -> dict:
+    """The `order_by`, `offset` and `limit` arguments of the PuppetDB query
+    of the page that DataTables requests in server-side mode, for a table
+    with the given fields as columns.
+
+    The tiebreak field is ordered after the column, so that the order of
+    the rows with the same value, and so of the pages, is stable."""
+    order_column = int(request.args.get('order[0][column]', 0))
+    if not 0 <= order_column < len(fields):
+        order_column = 0
+    order_dir = 'desc' if request.args.get('order[0][dir]') == 'desc' else 'asc'
+    order_by = [{'field': fields[order_column], 'order': order_dir}]
+    if tiebreak is not None and fields[order_column] != tiebreak:
+        order_by.append({'field': tiebreak, 'order': 'asc'})
+
+    paging_args = {
+        'order_by': json.dumps(order_by),
+        'offset': int(request.args.get('start', 0)),
+    }
+    length = int(request.args['length'])
+    # -1 is "All" for DataTables
+    if length > 0:
+        paging_args['limit'] = length
+    return paging_args
+
+
+def count_query(*operators) -> ExtractOperator:
+    """An extract query of the number of rows that match all the given
+    operators."""
+    query = ExtractOperator()
+    query.add_field(FunctionOperator('count'))
+    if operators:
+        where = AndOperator()
+        for operator in operators:
+            where.add(operator)
+        query.add_query(where)
+    return query
+
+
+def look_back(timestamp: str, seconds: int) -> str:
+    """The timestamp given seconds before the given one of PuppetDB, in the
+    same format, f.e. to query the rows stored since a watermark while
+    PuppetDB may still store older ones, as it processes its commands
+    asynchronously."""
+    value = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc) - timedelta(seconds=seconds)
+    return value.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
 def quote_columns_data(data: str) -> str:
     """When projecting Queries using dot notation (f.e. inventory [ facts.osfamily ])
     we need to quote the dot in such column name for the DataTables library or it will
@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 
 from flask import (
     render_template, abort, request
@@ -6,8 +7,9 @@ from flask import (
 from pypuppetdb.QueryBuilder import (AndOperator,
                                      EqualsOperator, NullOperator, RegexOperator)
 
-from puppetboard.core import get_app, get_puppetdb, environments, CATALOGS_COLUMNS
-from puppetboard.utils import (get_or_abort, check_env)
+from puppetboard.core import get_app, get_puppetdb, environments, query_all, CATALOGS_COLUMNS
+from puppetboard.response_cache import cached_response
+from puppetboard.utils import (UrlTemplate, get_or_abort, check_env)
 
 app = get_app()
 puppetdb = get_puppetdb()
@@ -51,6 +53,7 @@ def catalogs(env, compare):
 @app.route('/catalogs/compare/<compare>/json',
            defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
 @app.route('/<env>/catalogs/compare/<compare>/json')
+@cached_response
 def catalogs_ajax(env, compare):
     """Server data to catalogs as JSON to Jquery datatables
     """
@@ -104,7 +107,11 @@ def catalogs_ajax(env, compare):
         columns=CATALOGS_COLUMNS,
         catalogs=catalog_list,
         envs=envs,
-        current_env=env)
+        current_env=env,
+        node_url=UrlTemplate('node', 'node_name', env=env),
+        catalog_url=UrlTemplate('catalog_node', 'node_name', env=env),
+        compare_url=UrlTemplate('catalog_compare', 'compare', 'against', env=env),
+        catalogs_url=UrlTemplate('catalogs', 'compare', env=env))
 
 
 @app.route('/catalog/<node_name>',
@@ -145,10 +152,10 @@ def catalog_compare(env, compare, against):
     check_env(env, envs)
 
     if app.config['ENABLE_CATALOG']:
-        compare_cat = get_or_abort(puppetdb.catalog,
-                                   node=compare)
-        against_cat = get_or_abort(puppetdb.catalog,
-                                   node=against)
+        compare_cat, against_cat = get_or_abort(
+            query_all,
+            partial(puppetdb.catalog, node=compare),
+            partial(puppetdb.catalog, node=against))
 
         return render_template('catalog_compare.html',
                                compare=compare_cat,
@@ -7,7 +7,8 @@ from pypuppetdb.QueryBuilder import (AndOperator, InOperator, FromOperator,
                                      EqualsOperator, NullOperator, ExtractOperator)
 
 from puppetboard.core import get_app, get_cache, get_puppetdb, environments
-from puppetboard.utils import yield_or_stop, check_env
+from puppetboard.response_cache import cached_response
+from puppetboard.utils import UrlTemplate, yield_or_stop, check_env
 
 # list of events status
 events_status_columns = ('skipped', 'failure', 'success', 'noop')
@@ -50,6 +51,7 @@ def classes(env):
 
 @app.route('/classes/json', defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
 @app.route('/<env>/classes/json')
+@cached_response
 def classes_ajax(env):
     """Backend endpoint for classes table"""
 
@@ -145,7 +147,8 @@ def classes_ajax(env):
         total_filtered=total,
         classes_data=classes,
         columns=[col[0] for col in columns],
-        current_env=env)
+        current_env=env,
+        class_url=UrlTemplate('class_resource', 'class_name', env=env))
 
 
 def get_events(report_hash, env):
@@ -264,7 +267,9 @@ def class_resource_ajax(env, class_name):
         draw=draw,
         total=total,
         total_filtered=total,
-        nodes_data=reports)
+        nodes_data=reports,
+        node_url=UrlTemplate('node', 'node_name', env=env),
+        report_url=UrlTemplate('report', 'node_name', 'report_id', env=env))
 
 
 def get_status_from_events(events_status={}):
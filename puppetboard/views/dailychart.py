@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from functools import partial
 
 from flask import (
     request, jsonify
@@ -9,7 +10,7 @@ from pypuppetdb.QueryBuilder import (ExtractOperator, AndOperator,
 from pypuppetdb.QueryBuilder import (LessOperator)
 from pypuppetdb.utils import UTC
 
-from puppetboard.core import get_app, get_puppetdb
+from puppetboard.core import get_app, get_puppetdb, query_all
 from puppetboard.utils import (get_or_abort)
 
 app = get_app()
@@ -97,7 +98,8 @@ def get_daily_reports_chart(db, env, days_number, certname=None):
     certname will be added.  If certname is not passed, all reports in
     the database will be considered.
     """
-    result = []
+    days = []
+    calls = []
     for start, end in _iter_dates(days_number, reverse=True):
         query = _build_query(
             env=env,
@@ -105,7 +107,9 @@ def get_daily_reports_chart(db, env, days_number, certname=None):
             end=end.strftime(DATETIME_FORMAT),
             certname=certname,
         )
-        day = start.strftime(DATE_FORMAT)
-        output = db._query('reports', query=query)
-        result.append(_format_report_data(day, output))
-    return result
+        days.append(start.strftime(DATE_FORMAT))
+        calls.append(partial(db._query, 'reports', query=query))
+
+    # the queries for each day are independent, so run them in parallel
+    outputs = query_all(*calls)
+    return [_format_report_data(day, output) for day, output in zip(days, outputs)]
@@ -1,43 +1,44 @@
+import hashlib
+import math
+from functools import partial
 from json import dumps
 from urllib.parse import quote_plus
 
 from flask import (
-    request, render_template, url_for, jsonify
+    request, render_template, jsonify
 )
-from pypuppetdb.QueryBuilder import (AndOperator,
-                                     EqualsOperator)
+from pypuppetdb.QueryBuilder import (AndOperator, EqualsOperator, ExtractOperator,
+                                     FunctionOperator, OrOperator, RegexOperator)
+from pypuppetdb.utils import json_to_datetime
 
-from puppetboard.core import get_app, get_puppetdb, environments
-from puppetboard.utils import (check_env, get_or_abort, parse_python, get_all_fact_paths,
-                                split_fact_path, dot_lookup, flatten_fact)
+from puppetboard.core import (get_app, get_cache, get_puppetdb, environments,
+                              query_page, stream_json_table)
+from puppetboard.fact_index import fact_children, get_fact_index
+from puppetboard.response_cache import cached_response
+from puppetboard.utils import (UrlTemplate, check_env, count_query, datatables_paging,
+                               get_or_abort, parse_python, prefetch, split_fact_path)
 
 app = get_app()
+cache = get_cache()
 puppetdb = get_puppetdb()
 
 
 @app.route('/fact/<path:fact>/json',
-           defaults={'env': app.config['DEFAULT_ENVIRONMENT'],
-                     'node': None, 'value': None})
-@app.route('/<env>/fact/<path:fact>/json', defaults={'node': None, 'value': None})
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT'], 'value': None})
+@app.route('/<env>/fact/<path:fact>/json', defaults={'value': None})
 @app.route('/fact/<path:fact>/<value>/json',
-           defaults={'env': app.config['DEFAULT_ENVIRONMENT'], 'node': None})
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
 @app.route('/fact/<path:fact>/<path:value>/json',
-           defaults={'env': app.config['DEFAULT_ENVIRONMENT'], 'node': None})
-@app.route('/<env>/fact/<path:fact>/<value>/json', defaults={'node': None})
-@app.route('/<env>/fact/<path:fact>/<path:value>/json', defaults={'node': None})
-@app.route('/node/<node>/facts/json',
-           defaults={'env': app.config['DEFAULT_ENVIRONMENT'],
-                     'fact': None, 'value': None})
-@app.route('/<env>/node/<node>/facts/json',
-           defaults={'fact': None, 'value': None})
-def fact_ajax(env, node, fact, value):
-    """Fetches the specific facts matching (node/fact/value) from PuppetDB and
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
+@app.route('/<env>/fact/<path:fact>/<value>/json')
+@app.route('/<env>/fact/<path:fact>/<path:value>/json')
+@cached_response
+def fact_ajax(env, fact, value):
+    """Fetches the specific facts matching (fact/value) from PuppetDB and
     return a JSON table. Supports structured facts with dot notation (e.g., os.release.full).
 
     :param env: Searches for facts in this environment
     :type env: :obj:`string`
-    :param node: Find all facts for this node
-    :type node: :obj:`string`
     :param fact: Find all facts with this name (supports dot notation for structured facts)
     :type fact: :obj:`string`
     :param value: Filter facts whose value is equal to this
@@ -51,24 +52,27 @@ def fact_ajax(env, node, fact, value):
     # Determine if this is a structured fact query
     base_fact = None
     sub_path = None
-    if fact is not None and '.' in fact:
+    if '.' in fact:
         base_fact, sub_path = split_fact_path(fact)
     else:
         base_fact = fact
 
     render_graph = False
-    if fact is not None and fact in app.config['GRAPH_FACTS'] and value is None and node is None:
+    if fact in app.config['GRAPH_FACTS'] and value is None:
         render_graph = True
 
-    query = AndOperator()
-    if node is not None:
-        query.add(EqualsOperator("certname", node))
+    # DataTables sends the paging arguments only when the table is in
+    # server-side mode, which is only used for the simple facts
+    server_side = sub_path is None and 'length' in request.args
+    columns = fact_columns(value)
 
+    # the filters of all the rows, before the search of DataTables
+    filters = []
     if env != '*':
-        query.add(EqualsOperator("environment", env))
+        filters.append(EqualsOperator("environment", env))
 
-    # For structured facts, we can't filter by value at the PuppetDB level
-    # We'll need to filter in-memory after retrieving the facts
+    # For structured facts, the value is filtered with the fact-contents
+    # endpoint, see get_structured_facts()
     structured_value_filter = None
     if value is not None and sub_path is not None:
         # This is a structured fact with a value filter
@@ -76,94 +80,333 @@ def fact_ajax(env, node, fact, value):
     elif value is not None:
         # Simple fact with value filter
         value_parsed = parse_python(value)
-        query.add(EqualsOperator('value', value_parsed))
+        filters.append(EqualsOperator('value', value_parsed))
+
+    query = AndOperator()
+    for operator in filters:
+        query.add(operator)
+
+    search_query = None
+    search_arg = request.args.get('search[value]')
+    if server_side and search_arg:
+        search_query = OrOperator()
+        for column in columns:
+            search_query.add(RegexOperator(column, search_arg))
+        query.add(search_query)
 
     # if we have not added any operations to the query,
     # then make it explicitly empty
     if len(query.operations) == 0:
         query = None
 
-    # Query PuppetDB for the base fact
-    facts = [f for f in get_or_abort(
-        puppetdb.facts,
-        name=base_fact,
-        query=query)]
-
-    # Filter and transform facts based on sub_path
-    filtered_facts = []
-    for fact_obj in facts:
-        if sub_path is not None:
-            # Extract the nested value using dot_lookup
-            if isinstance(fact_obj.value, dict):
-                nested_value = dot_lookup(fact_obj.value, sub_path)
-                if nested_value is not None and nested_value != "":
-                    # Apply value filter if specified
-                    # Handle type mismatches (e.g., "20.04" string vs 20.04 float)
-                    matches_filter = (
-                        structured_value_filter is None or
-                        nested_value == structured_value_filter or
-                        str(nested_value) == str(structured_value_filter)
-                    )
-                    if matches_filter:
-                        # Create a pseudo-fact object with the nested value
-                        class NestedFact:
-                            def __init__(self, node, name, value):
-                                self.node = node
-                                self.name = name
-                                self.value = value
-
-                        filtered_facts.append(NestedFact(fact_obj.node, fact, nested_value))
-        else:
-            # Simple fact, use as-is
-            filtered_facts.append(fact_obj)
-
-    total = len(filtered_facts)
-
-    counts = {}
-    json = {
-        'draw': draw,
-        'recordsTotal': total,
-        'recordsFiltered': total,
-        'data': []}
-
-    for fact_h in filtered_facts:
-        line = []
-        if fact is None:
-            line.append(fact_h.name)
-        if node is None:
-            line.append('<a href="{0}">{1}</a>'.format(
-                url_for('node', env=env, node_name=fact_h.node),
-                fact_h.node))
-        if value is None:
-            if isinstance(fact_h.value, str):
-                # https://github.com/voxpupuli/puppetboard/issues/706
-                # Force quotes around string values
-                # This lets plain int values that are stored as strings in the db
-                # be findable when searched via the facts page
-                value_for_url = '"' + quote_plus(fact_h.value) + '"'
-            else:
-                value_for_url = fact_h.value
-
-            # Show normal value with link (fast!)
-            line.append('["{0}", {1}]'.format(
-                url_for(
-                    'fact', env=env, fact=fact_h.name, value=value_for_url),
-                dumps(fact_h.value)))
-
-        json['data'].append(line)
-
-        if render_graph:
-            if fact_h.value not in counts:
-                counts[fact_h.value] = 0
-            counts[fact_h.value] += 1
+    # counted while streaming the rows if not paged by PuppetDB
+    total = filtered = None
+    if server_side:
+        # all the rows of the fact, then the ones that match the search
+        counted = [EqualsOperator('name', base_fact), *filters]
+        total_call = None
+        if search_query is not None:
+            total_call = partial(puppetdb._query, 'facts', query=count_query(*counted))
+            counted.append(search_query)
+        filtered_facts, filtered, total = get_or_abort(
+            query_page,
+            partial(puppetdb.facts, name=base_fact, query=query,
+                    **datatables_paging(columns)),
+            partial(puppetdb._query, 'facts', query=count_query(*counted)),
+            total_call)
+    elif sub_path is None:
+        # the rows are streamed as they come from the generator, but the
+        # request to PuppetDB is sent before the response starts
+        filtered_facts = get_or_abort(prefetch, puppetdb.facts(
+            name=base_fact,
+            query=query))
+    else:
+        filtered_facts = get_structured_facts(query, fact, structured_value_filter)
+
+    node_url = UrlTemplate('node', 'node_name', env=env)
+    fact_url = UrlTemplate('fact', 'fact', 'value', env=env)
+
+    def rows():
+        for fact_h in filtered_facts:
+            line = ['<a href="{0}">{1}</a>'.format(
+                node_url(node_name=fact_h.node), fact_h.node)]
+            if value is None:
+                line.append(fact_value_link(fact_url, fact_h.name, fact_h.value))
+            yield line
 
+    extra = {}
     if render_graph:
-        json['chart'] = [
-            {"label": "{0}".format(k).replace('\n', ' '),
-             "value": counts[k]}
-            for k in sorted(counts, key=lambda k: counts[k], reverse=True)]
+        extra['chart'] = fact_value_counts(env, fact)
+
+    return stream_json_table(draw, rows(), total=total, filtered=filtered, **extra)
+
+
+class NestedFact:
+    """A pseudo-fact object with the value of a path of a structured fact."""
+
+    def __init__(self, node, name, value):
+        self.node = node
+        self.name = name
+        self.value = value
+
+
+def get_structured_facts(query, fact, value_filter) -> list:
+    """Fetch the values of a dotted path of a structured fact (f.e.
+    os.release.full) with the fact-contents endpoint, so that PuppetDB
+    filters them by path and value and only the matching nodes come back.
+
+    fact-contents only has the leaves of the structured facts, and their
+    array indexes as integers, so for the paths with an index, the paths to
+    a hash or an array and the hash or array values, the whole base facts
+    are fetched instead and the values are matched here.
+    """
+    path = fact.split('.')
+    if not isinstance(value_filter, (dict, list)) and not any(part.isdigit() for part in path):
+        contents_query = AndOperator()
+        if query is not None:
+            contents_query.add(query)
+        contents_query.add(EqualsOperator('path', path))
+        if value_filter is not None:
+            # match "20.04" as well as 20.04, like the values in the URLs are parsed
+            values_query = OrOperator()
+            values_query.add(EqualsOperator('value', value_filter))
+            if not isinstance(value_filter, str):
+                values_query.add(EqualsOperator('value', str(value_filter)))
+            contents_query.add(values_query)
+
+        contents = get_or_abort(puppetdb.fact_contents, query=contents_query) or []
+        if contents:
+            return [NestedFact(content['certname'], fact, content['value'])
+                    for content in contents]
+
+    facts = []
+    for fact_obj in get_or_abort(puppetdb.facts, name=path[0], query=query):
+        nested_value = nested_lookup(fact_obj.value, path[1:])
+        if nested_value is None or nested_value == "":
+            continue
+        # match "20.04" as well as 20.04, like the values in the URLs are parsed
+        if (value_filter is None or nested_value == value_filter
+                or str(nested_value) == str(value_filter)):
+            facts.append(NestedFact(fact_obj.node, fact, nested_value))
+    return facts
+
+
+def nested_lookup(value, path: list):
+    """The value at a path of a structured fact, with the array indexes as
+    numbers, or None if the fact does not have it."""
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def fact_columns(value) -> list:
+    """The fields of the facts shown in the columns of the table of
+    fact_ajax(), in the same order."""
+    columns = ['certname']
+    if value is None:
+        columns.append('value')
+    return columns
+
+
+def fact_value_link(fact_url: UrlTemplate, name, value) -> str:
+    """The value of a fact with the link to the nodes having the same one,
+    as a JSON list of the link and the value."""
+    if isinstance(value, str):
+        # https://github.com/voxpupuli/puppetboard/issues/706
+        # Force quotes around string values
+        # This lets plain int values that are stored as strings in the db
+        # be findable when searched via the facts page
+        value_for_url = '"' + quote_plus(value) + '"'
+    else:
+        value_for_url = value
+
+    # Show normal value with link (fast!)
+    return '["{0}", {1}]'.format(fact_url(fact=name, value=value_for_url), dumps(value))
+
+
+@app.route('/node/<node_name>/facts/json',
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
+@app.route('/<env>/node/<node_name>/facts/json')
+def node_facts_ajax(env, node_name):
+    """Returns the facts of a node as a JSON table, from its factset.
+
+    The rows are cached per node and facts timestamp, which the node page
+    passes as the `timestamp` argument, so that an unchanged node is shown
+    again without querying PuppetDB.
+
+    :param env: Searches for the facts in this environment
+    :type env: :obj:`string`
+    :param node_name: The certname of the node
+    :type node_name: :obj:`string`
+    """
+    draw = int(request.args.get('draw', 0))
+
+    envs = environments()
+    check_env(env, envs)
+
+    timestamp = request.args.get('timestamp')
+    rows = None
+    if timestamp is not None:
+        rows = cache.get(node_facts_key(env, node_name, timestamp))
+    if rows is None:
+        rows = node_fact_rows(env, node_name)
+
+    return stream_json_table(draw, iter(rows))
+
+
+def node_facts_key(env: str, node_name: str, timestamp: str) -> str:
+    # hashed, as the node name comes from the URL and the timestamp has a
+    # space, which are not valid in the keys of memcached
+    data = dumps([env, node_name, timestamp])
+    return 'node_facts_' + hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def fact_values_key(env: str, fact: str) -> str:
+    # hashed, as the fact comes from the URL, see node_facts_key()
+    data = dumps([env, fact])
+    return 'fact_values_' + hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def node_fact_rows(env, node_name) -> list:
+    """Fetch the facts of a node in one call to the factsets endpoint and
+    build the rows of its facts table, cached for CACHE_DEFAULT_TIMEOUT
+    seconds under its facts timestamp (see node_facts_ajax())."""
+    query = AndOperator()
+    query.add(EqualsOperator('certname', node_name))
+    if env != '*':
+        query.add(EqualsOperator('environment', env))
+
+    factsets = get_or_abort(puppetdb.factsets, query=query)
+    if not factsets:
+        return []
+    factset = factsets[0]
 
-    return jsonify(json)
+    fact_url = UrlTemplate('fact', 'fact', 'value', env=env)
+    rows = [[fact['name'], fact_value_link(fact_url, fact['name'], fact['value'])]
+            for fact in sorted(factset['facts']['data'], key=lambda fact: fact['name'])]
+
+    # the same string as the timestamp of the node given to url_for()
+    timestamp = json_to_datetime(factset['timestamp'])
+    cache.set(node_facts_key(env, node_name, str(timestamp)), rows)
+    return rows
+
+
+def count_fact_values(env, fact) -> list:
+    """Count the nodes per value of a fact with an aggregate query (the
+    fact-contents endpoint for the dotted paths of structured facts), so
+    that PuppetDB returns one row per value instead of one per node. The
+    counts are sorted, the most common value first.
+
+    The counts are cached for GRAPH_FACTS_CACHE_TTL seconds, per environment
+    and fact.
+    """
+    key = fact_values_key(env, fact)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    query = AndOperator()
+    if '.' in fact:
+        endpoint = 'fact-contents'
+        query.add(EqualsOperator('path', fact.split('.')))
+    else:
+        endpoint = 'facts'
+        query.add(EqualsOperator('name', fact))
+    if env != '*':
+        query.add(EqualsOperator('environment', env))
+    extract = ExtractOperator()
+    extract.add_field([FunctionOperator('count'), 'value'])
+    extract.add_query(query)
+    extract.add_group_by('value')
+
+    counts = get_or_abort(puppetdb._query, endpoint, query=extract) or []
+    counts = sorted(counts, key=lambda count: count['count'], reverse=True)
+
+    cache.set(key, counts, timeout=app.config['GRAPH_FACTS_CACHE_TTL'])
+    return counts
+
+
+def fact_value_counts(env, fact) -> list:
+    """The data of the chart of a fact: the GRAPH_FACTS_TOP most common
+    values, the other ones are counted together as "other"."""
+    counts = count_fact_values(env, fact)
+    top = app.config['GRAPH_FACTS_TOP']
+
+    chart = [
+        {"label": "{0}".format(count['value']).replace('\n', ' '),
+         "value": count['count']}
+        for count in counts[:top]]
+    if len(counts) > top:
+        chart.append({"label": "other",
+                      "value": sum(count['count'] for count in counts[top:])})
+    return chart
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def value_histogram(counts: list, bins: int) -> list:
+    """Reduce the counts of the values of a numeric fact to the counts of
+    `bins` buckets of the same width between the lowest and the highest
+    value. The buckets of the integer facts have integer bounds. The upper
+    bound of each bucket is excluded, except for the last one."""
+    low = min(count['value'] for count in counts)
+    high = max(count['value'] for count in counts)
+    if all(isinstance(count['value'], int) for count in counts):
+        width = max(1, math.ceil((high - low + 1) / bins))
+        bins = math.ceil((high - low + 1) / width)
+    else:
+        width = (high - low) / bins or 1
+
+    histogram = [{'min': low + i * width, 'max': low + (i + 1) * width, 'count': 0}
+                 for i in range(bins)]
+    for count in counts:
+        index = min(int((count['value'] - low) // width), bins - 1)
+        histogram[index]['count'] += count['count']
+    return histogram
+
+
+@app.route('/fact/<path:fact>/distribution',
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
+@app.route('/<env>/fact/<path:fact>/distribution')
+def fact_distribution(env, fact):
+    """Returns the distribution of the values of a fact (supports dot
+    notation for structured facts) as JSON: the number of nodes and of
+    different values, the most common values and, for the numeric facts,
+    a histogram.
+
+    The values are counted by PuppetDB, see count_fact_values().
+
+    :param env: Searches for facts in this environment
+    :type env: :obj:`string`
+    :param fact: The name of the fact
+    :type fact: :obj:`string`
+    """
+    envs = environments()
+    check_env(env, envs)
+
+    top = max(0, request.args.get('top', app.config['GRAPH_FACTS_TOP'], type=int))
+    bins = min(max(1, request.args.get('bins', 10, type=int)), 1000)
+
+    counts = count_fact_values(env, fact)
+    numeric = bool(counts) and all(is_number(count['value']) for count in counts)
+
+    return jsonify({
+        'fact': fact,
+        'environment': env,
+        'nodes': sum(count['count'] for count in counts),
+        'cardinality': len(counts),
+        'top': [{'value': count['value'], 'count': count['count']}
+                for count in counts[:top]],
+        'other': sum(count['count'] for count in counts[top:]),
+        'histogram': value_histogram(counts, bins) if numeric else None,
+    })
 
 
 @app.route('/fact/<path:fact>/children/json',
@@ -179,76 +422,10 @@ def fact_children_ajax(env, fact):
     envs = environments()
     check_env(env, envs)
 
-    # Extract base fact name (PuppetDB only stores base facts, not nested paths)
-    # e.g., 'networking.interfaces.eth0' -> 'networking'
-    base_fact = fact.split('.')[0] if '.' in fact else fact
-
-    # Query for the base fact
-    query = AndOperator()
-    if env != '*':
-        query.add(EqualsOperator("environment", env))
-    query.add(EqualsOperator("name", base_fact))
-
-    if len(query.operations) == 0:
-        query = None
-
-    # Get ALL instances of this fact to aggregate keys across nodes
-    facts = list(get_or_abort(puppetdb.facts, query=query))
-    if not facts:
-        return jsonify({'children': []})
-
-    sample_fact = facts[0]
-    if not isinstance(sample_fact.value, dict):
-        return jsonify({'children': []})
-
-    # If this is a nested fact path (e.g., 'networking.interfaces'), navigate to that level
-    current_value = sample_fact.value
-    if fact != base_fact:
-        # Navigate to the nested level
-        sub_path = fact[len(base_fact) + 1:]  # Remove 'base_fact.' prefix
-        current_value = dot_lookup(sample_fact.value, sub_path)
-        if current_value is None or not isinstance(current_value, dict):
-            return jsonify({'children': []})
-
-    # For variable-key facts, collect ALL keys across all nodes at this level
-    all_keys = set()
-    for fact_obj in facts:
-        # Navigate to the same nested level for each node
-        if fact != base_fact:
-            sub_path = fact[len(base_fact) + 1:]
-            node_value = dot_lookup(fact_obj.value, sub_path)
-        else:
-            node_value = fact_obj.value
-
-        if isinstance(node_value, dict):
-            all_keys.update(node_value.keys())
-
-    # Build a merged dict with all possible keys for path discovery
-    merged_value = dict(current_value) if isinstance(current_value, dict) else {}
-    for key in all_keys:
-        if key not in merged_value:
-            merged_value[key] = None  # Add missing keys as leaf nodes
-
-    # Get all paths using the merged structure
-    fact_dict = {fact: merged_value}
-    paths = get_all_fact_paths(fact_dict)
-
-    # Build list of direct children with metadata about whether they have children
-    paths_set = set(paths)
-    children = []
-
-    for path in paths:
-        if path != fact:  # Skip parent itself
-            # Check if this is a direct child
-            depth = path.count('.') - fact.count('.')
-            if depth == 1:
-                # Check if this child has its own children
-                has_children = any(p != path and p.startswith(path + '.') for p in paths)
-                children.append({
-                    'name': path,
-                    'has_children': has_children
-                })
-
+    children = [
+        {'name': f'{fact}.{key}', 'has_children': has_children}
+        for key, has_children in fact_children(fact.split('.'))
+    ]
     return jsonify({'children': children})
 
 
@@ -264,73 +441,18 @@ def facts(env):
     """
     envs = environments()
     check_env(env, envs)
-    fact_names = get_or_abort(puppetdb.fact_names)
-    base_facts = sorted(fact_names) if fact_names else []
-
-    # Build query for environment filter
-    query = AndOperator()
-    if env != '*':
-        query.add(EqualsOperator("environment", env))
-
-    # if we have not added any operations to the query,
-    # then make it explicitly empty
-    if len(query.operations) == 0:
-        query = None
 
-    # Efficiently detect structured facts by sampling just ONE fact value per fact name
-    # This avoids the N+1 query problem by using a single bulk query
-    expanded_facts = []
-
-    fact_samples = {}
-    fact_all_keys = {}  # Track ALL keys seen across all nodes for dict facts
-
-    # Only query for fact samples if we have facts to check
-    if base_facts:
-        # Get ALL facts in one query to detect structure AND collect all keys
-        # This is MUCH faster than querying each fact individually
-        try:
-            all_facts = get_or_abort(puppetdb.facts, query=query)
-
-            if all_facts:  # Handle None or empty results
-                for fact_obj in all_facts:
-                    fact_name = fact_obj.name
-
-                    # Keep first sample value for structure detection
-                    if fact_name not in fact_samples:
-                        fact_samples[fact_name] = fact_obj.value
-
-                    # For dict facts, collect ALL keys across all nodes
-                    # This ensures we show complete list for variable-key facts
-                    if isinstance(fact_obj.value, dict):
-                        if fact_name not in fact_all_keys:
-                            fact_all_keys[fact_name] = set()
-                        fact_all_keys[fact_name].update(fact_obj.value.keys())
-        except (TypeError, AttributeError):
-            # Handle test scenarios where facts query may not be properly mocked
-            pass
-
-    # Now expand structured facts - group by parent
-    for base_fact in base_facts:
-        sample_value = fact_samples.get(base_fact)
-
-        if sample_value is not None and isinstance(sample_value, dict):
-            # This is a structured fact - add as collapsible parent with lazy-loaded children
-            expanded_facts.append({
-                'name': base_fact,
-                'is_structured': False,
-                'is_parent': True,  # Has collapsible children (lazy-loaded)
-                'depth': 0,
-                'children': []  # Empty - will be lazy-loaded via AJAX
-            })
-        else:
-            # Simple fact
-            expanded_facts.append({
-                'name': base_fact,
-                'is_structured': False,
-                'is_parent': False,
-                'depth': 0,
-                'children': []
-            })
+    # the structured facts are collapsible parents, with lazy-loaded children
+    expanded_facts = [
+        {
+            'name': name,
+            'is_structured': False,
+            'is_parent': entry['type'] == 'map',
+            'depth': 0,
+            'children': [],
+        }
+        for name, entry in sorted(get_fact_index(env).items())
+    ]
 
     # we consider a column label to count for ~5 lines
     column_label_height = 5
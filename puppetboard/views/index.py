@@ -1,7 +1,9 @@
+from functools import partial
+
 from flask import render_template
 from pypuppetdb.QueryBuilder import AndOperator, EqualsOperator, FunctionOperator, ExtractOperator
 
-from puppetboard.core import get_app, get_puppetdb, environments
+from puppetboard.core import get_app, get_puppetdb, environments, fresh_replica, query_all
 from puppetboard.utils import get_or_abort, check_env
 
 app = get_app()
@@ -31,19 +33,8 @@ def index(env):
         query = app.config['OVERVIEW_FILTER']
 
         prefix = 'puppetlabs.puppetdb.population'
-        num_nodes = get_or_abort(puppetdb.metric, f"{prefix}:name=num-nodes")
-        num_resources = get_or_abort(puppetdb.metric, f"{prefix}:name=num-resources")
-
-        metrics['num_nodes'] = num_nodes['Value']
-        metrics['num_resources'] = num_resources['Value']
-        try:
-            # Compute our own average because avg_resources_node['Value']
-            # returns a string of the format "num_resources/num_nodes"
-            # example: "1234/9" instead of doing the division itself.
-            metrics['avg_resources_node'] = "{0:10.0f}".format(
-                (num_resources['Value'] / num_nodes['Value']))
-        except ZeroDivisionError:
-            metrics['avg_resources_node'] = 0
+        num_nodes_call = partial(puppetdb.metric, f"{prefix}:name=num-nodes")
+        num_resources_call = partial(puppetdb.metric, f"{prefix}:name=num-resources")
     else:
         query = AndOperator()
         query.add(EqualsOperator('catalog_environment', env))
@@ -59,14 +50,36 @@ def index(env):
         num_resources_query.add_field(FunctionOperator('count'))
         num_resources_query.add_query(EqualsOperator("environment", env))
 
-        num_nodes = get_or_abort(
-            puppetdb._query,
-            'nodes',
-            query=num_nodes_query)
-        num_resources = get_or_abort(
-            puppetdb._query,
-            'resources',
-            query=num_resources_query)
+        num_nodes_call = partial(puppetdb._query, 'nodes', query=num_nodes_query)
+        num_resources_call = partial(puppetdb._query, 'resources', query=num_resources_query)
+
+    nodes_call = partial(puppetdb.nodes, query=query)
+    replica = fresh_replica()
+    if replica is not None and app.config['OVERVIEW_FILTER'] is None:
+        nodes_call = partial(replica.nodes, puppetdb, env)
+
+    # the counts and the nodes list are independent, so fetch them in parallel
+    num_nodes, num_resources, nodes = get_or_abort(
+        query_all,
+        num_nodes_call,
+        num_resources_call,
+        partial(nodes_call,
+                unreported=app.config['UNRESPONSIVE_HOURS'],
+                with_status=True,
+                with_event_numbers=app.config['WITH_EVENT_NUMBERS']))
+
+    if env == '*':
+        metrics['num_nodes'] = num_nodes['Value']
+        metrics['num_resources'] = num_resources['Value']
+        try:
+            # Compute our own average because avg_resources_node['Value']
+            # returns a string of the format "num_resources/num_nodes"
+            # example: "1234/9" instead of doing the division itself.
+            metrics['avg_resources_node'] = "{0:10.0f}".format(
+                (num_resources['Value'] / num_nodes['Value']))
+        except ZeroDivisionError:
+            metrics['avg_resources_node'] = 0
+    else:
         metrics['num_nodes'] = num_nodes[0]['count']
         metrics['num_resources'] = num_resources[0]['count']
         try:
@@ -75,12 +88,6 @@ def index(env):
         except ZeroDivisionError:
             metrics['avg_resources_node'] = 0
 
-    nodes = get_or_abort(puppetdb.nodes,
-                         query=query,
-                         unreported=app.config['UNRESPONSIVE_HOURS'],
-                         with_status=True,
-                         with_event_numbers=app.config['WITH_EVENT_NUMBERS'])
-
     nodes_overview = []
     stats = {
         'changed': 0,
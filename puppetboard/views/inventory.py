@@ -1,16 +1,49 @@
-from collections import defaultdict
+import csv
+import io
+import json
+import logging
+import threading
+import time
+from functools import partial
+from itertools import groupby
+
 from flask import (
-    render_template, request, render_template_string
+    Response, render_template, request, stream_with_context
 )
-from pypuppetdb.QueryBuilder import (AndOperator,
-                                     EqualsOperator, OrOperator)
+from pypuppetdb.QueryBuilder import (AndOperator, EqualsOperator, ExtractOperator,
+                                     GreaterOperator, OrOperator, RegexOperator)
 
-from puppetboard.core import get_app, get_puppetdb, environments
-from puppetboard.utils import (check_env, dot_lookup)
+from puppetboard.core import (get_app, get_puppetdb, environments, fresh_replica,
+                              query_all, query_page, stream_json_table)
+from puppetboard.response_cache import cached_response
+from puppetboard.utils import (UrlTemplate, check_env, count_query, datatables_paging,
+                               dot_lookup, get_or_abort, look_back)
 
 app = get_app()
 puppetdb = get_puppetdb()
 
+log = logging.getLogger(__name__)
+
+# the compiled INVENTORY_FACT_TEMPLATES, by source, see inventory_template()
+INVENTORY_TEMPLATES: dict = {}
+
+# per-worker rendered rows of the inventory, by environment, see cached_inventory_rows()
+INVENTORY_ROWS: dict = {}
+INVENTORY_ROWS_LOCK = threading.Lock()
+
+
+def inventory_template(source: str):
+    """Compile a template of INVENTORY_FACT_TEMPLATES once, and again
+    only if its source changes in the config."""
+    template = INVENTORY_TEMPLATES.get(source)
+    if template is None:
+        template = INVENTORY_TEMPLATES[source] = app.jinja_env.from_string(source)
+    return template
+
+
+for fact_template in app.config['INVENTORY_FACT_TEMPLATES'].values():
+    inventory_template(fact_template)
+
 
 def inventory_facts():
     # a list of facts descriptions to go in table header
@@ -47,56 +80,343 @@ def inventory(env):
         'inventory.html',
         envs=envs,
         current_env=env,
-        fact_headers=headers)
+        fact_headers=headers,
+        server_side=inventory_server_side())
+
+
+def inventory_server_side() -> bool:
+    """Whether the inventory table is paged, searched and ordered by
+    PuppetDB, see inventory_page(). When the replica is fresh or the rows
+    are cached, the whole inventory is loaded from them instead and paged
+    by DataTables in the browser."""
+    return not app.config['INVENTORY_CACHE_TTL'] and fresh_replica() is None
+
+
+def inventory_field(name: str) -> str:
+    """The field of the inventory endpoint of PuppetDB with the value of an
+    INVENTORY_FACTS column, to search and order it."""
+    if name in ['fqdn', 'hostname', 'trusted']:
+        # shown as the certname, see inventory_ajax()
+        return 'certname'
+    if name.startswith('trusted.'):
+        return name
+    return f'facts.{name}'
+
+
+def inventory_projection(fact_names) -> dict:
+    """The fields of the inventory endpoint to extract for the INVENTORY_FACTS
+    columns, by fact name.
+
+    The dotted fact names are projected by PuppetDB, f.e. `facts.networking.ip`,
+    so that only the shown values are sent instead of the whole structured
+    facts. The certname is always extracted, the fqdn and hostname columns
+    of the table show it but the exports have the values of these facts."""
+    def field(name):
+        if name == 'trusted':
+            return 'trusted'
+        if name in ['fqdn', 'hostname']:
+            return f'facts.{name}'
+        return inventory_field(name)
+
+    return {name: field(name) for name in fact_names}
+
+
+def inventory_query(fact_names, where=None, extra_fields=()) -> ExtractOperator:
+    query = ExtractOperator()
+    query.add_field(list(dict.fromkeys(['certname', *extra_fields,
+                                        *inventory_projection(fact_names).values()])))
+    if where is not None:
+        query.add_query(where)
+    return query
+
+
+def inventory_rows(rows, fact_names):
+    """The certname and the values of the columns by fact name of the
+    inventory rows extracted by inventory_query(), "" if the node does not
+    have the fact, like dot_lookup() gives it."""
+    projection = inventory_projection(fact_names)
+
+    def value(row, field):
+        value = row.get(field)
+        return value if value is not None else ""
+
+    return ((row['certname'], {name: value(row, field) for name, field in projection.items()})
+            for row in rows)
+
+
+def inventory_nodes(env, fact_names, page_size=None):
+    """All the nodes shown in the inventory, as pairs of the certname and
+    the values of the columns by fact name, sorted by certname.
+
+    With a page_size, the nodes are fetched by pages as they are consumed,
+    so that only one page is held in memory, see inventory_pages()."""
+    replica = fresh_replica()
+    if replica is not None:
+        # the replica is local, the sub-paths are looked up in the base facts
+        fact_name_bases = {name.split(".")[0] for name in fact_names}
+        facts = replica.facts(env, fact_name_bases)
+        nodes = ((node, {fact.name: fact.value for fact in node_facts})
+                 for node, node_facts in groupby(facts, key=lambda fact: fact.node))
+        return ((node, {name: dot_lookup(facts_by_name, name) for name in fact_names})
+                for node, facts_by_name in nodes)
+
+    where = EqualsOperator('environment', env) if env != '*' else None
+    query = inventory_query(fact_names, where)
+    order_by = '[{"field": "certname", "order": "asc"}]'
+    if page_size is None:
+        rows = get_or_abort(puppetdb._query, 'inventory', query=query, order_by=order_by)
+        return inventory_rows(rows or [], fact_names)
+
+    # the errors of the first page are handled before the response starts
+    first_page = get_or_abort(puppetdb._query, 'inventory', query=query, order_by=order_by,
+                              limit=page_size)
+    return inventory_rows(inventory_pages(fact_names, where, page_size, first_page or []),
+                          fact_names)
+
+
+def inventory_pages(fact_names, where, page_size, first_page):
+    """The rows of the inventory, fetched page by page from PuppetDB until a
+    page is not full.
+
+    Each page starts after the last certname of the previous one instead of
+    at an offset, so that the nodes added or removed meanwhile do not shift
+    the next pages, skipping or repeating rows."""
+    page = first_page
+    while True:
+        yield from page
+        if len(page) < page_size:
+            return
+        after = AndOperator()
+        if where is not None:
+            after.add(where)
+        after.add(GreaterOperator('certname', page[-1]['certname']))
+        page = puppetdb._query('inventory', query=inventory_query(fact_names, after),
+                               order_by='[{"field": "certname", "order": "asc"}]',
+                               limit=page_size) or []
+
+
+def inventory_page(env, fact_names):
+    """The nodes of the page of the inventory requested by DataTables, in
+    server-side mode, with the values of their columns, the number of nodes
+    that match the search and the number of all the nodes.
+
+    The search and the order of the columns are done by PuppetDB, with a
+    query on the inventory endpoint, so only the nodes of the page are
+    fetched."""
+    fields = [inventory_field(name) for name in fact_names]
+
+    # all the nodes, then the ones that match the search
+    counted = [EqualsOperator('environment', env)] if env != '*' else []
+    total_call = None
+    search_arg = request.args.get('search[value]')
+    if search_arg:
+        total_call = partial(puppetdb._query, 'inventory', query=count_query(*counted))
+        search_query = OrOperator()
+        for field in dict.fromkeys(['certname'] + fields):
+            search_query.add(RegexOperator(field, search_arg))
+        counted.append(search_query)
+
+    where = None
+    if counted:
+        where = AndOperator()
+        for operator in counted:
+            where.add(operator)
+
+    rows, filtered, total = get_or_abort(
+        query_page,
+        partial(puppetdb._query, 'inventory', query=inventory_query(fact_names, where),
+                **datatables_paging(fields, tiebreak='certname')),
+        partial(puppetdb._query, 'inventory', query=count_query(*counted)),
+        total_call)
+    return inventory_rows(rows or [], fact_names), filtered, total
+
+
+def cached_inventory_rows(env, fact_names, render_row) -> list:
+    """All the rendered rows of the inventory, sorted by certname, kept by
+    each worker with the facts timestamp of their node for
+    INVENTORY_CACHE_TTL seconds.
+
+    Only the nodes whose facts timestamp moved past the latest one seen by
+    the previous load, minus INVENTORY_CACHE_OVERLAP seconds for the facts
+    stored late by PuppetDB, are fetched, and only the ones with a new
+    timestamp are rendered again. The rows of the nodes that are not in the
+    inventory anymore (deactivated, expired or moved to another environment)
+    are dropped.
+
+    The rows are not put in the shared cache, where the ones of a big fleet
+    would not fit in a single value (f.e. the 1 MB of memcached).
+    """
+    # the rows are rendered for these columns only
+    columns = json.dumps([fact_names, app.config['INVENTORY_FACT_TEMPLATES']], sort_keys=True)
+    with INVENTORY_ROWS_LOCK:
+        entry = INVENTORY_ROWS.get(env)
+    if (entry is None or entry['columns'] != columns
+            or time.monotonic() - entry['loaded_at'] >= app.config['INVENTORY_CACHE_TTL']):
+        entry = {'columns': columns, 'loaded_at': time.monotonic(), 'watermark': None, 'rows': {}}
+
+    where = EqualsOperator('environment', env) if env != '*' else None
+    changed_where = where
+    if entry['watermark'] is not None:
+        changed_where = AndOperator()
+        if where is not None:
+            changed_where.add(where)
+        changed_where.add(GreaterOperator('timestamp', look_back(
+            entry['watermark'], app.config['INVENTORY_CACHE_OVERLAP'])))
+
+    calls = [partial(puppetdb._query, 'inventory', query=inventory_query(
+        fact_names, changed_where, extra_fields=['timestamp']))]
+    if entry['rows']:
+        certnames = ExtractOperator()
+        certnames.add_field('certname')
+        if where is not None:
+            certnames.add_query(where)
+        calls.append(partial(puppetdb._query, 'inventory', query=certnames))
+    results = get_or_abort(query_all, *calls)
+
+    changed = results[0] or []
+    # by certname, the facts timestamp and the rendered row
+    rows = dict(entry['rows'])
+    if len(results) > 1:
+        active = {row['certname'] for row in results[1] or []}
+        rows = {certname: row for certname, row in rows.items() if certname in active}
+    rendered = 0
+    for inventory_row, (node, values) in zip(changed, inventory_rows(changed, fact_names)):
+        timestamp = inventory_row.get('timestamp')
+        if node in rows and timestamp is not None and rows[node][0] == timestamp:
+            continue
+        rows[node] = (timestamp, render_row(node, values))
+        rendered += 1
+
+    timestamps = [row['timestamp'] for row in changed if row.get('timestamp') is not None]
+    if entry['watermark'] is not None:
+        timestamps.append(entry['watermark'])
+    with INVENTORY_ROWS_LOCK:
+        INVENTORY_ROWS[env] = dict(entry, watermark=max(timestamps, default=None), rows=rows)
+    log.debug('Inventory rows of %s: %d fetched, %d rendered, %d in all',
+              env, len(changed), rendered, len(rows))
+
+    return [rows[certname][1] for certname in sorted(rows)]
 
 
 @app.route('/inventory/json', defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
 @app.route('/<env>/inventory/json')
+@cached_response
 def inventory_ajax(env):
-    """Backend endpoint for inventory table"""
+    """Backend endpoint for inventory table.
+
+    DataTables sends the paging arguments in server-side mode, see
+    inventory_server_side(), then only the requested page is fetched, see
+    inventory_page(). Without them, the
+    whole inventory is returned, from the cached rows of the nodes whose
+    facts did not change, see cached_inventory_rows()."""
     draw = int(request.args.get('draw', 0))
 
     envs = environments()
     check_env(env, envs)
     headers, fact_names = inventory_facts()
-    fact_templates = app.config['INVENTORY_FACT_TEMPLATES']
-
-    query = AndOperator()
-    fact_query = OrOperator()
-    fact_name_bases = {name.split(".")[0] for name in fact_names}
-    fact_query.add([EqualsOperator("name", name) for name in fact_name_bases])
-    query.add(fact_query)
+    fact_templates = {name: inventory_template(source)
+                      for name, source in app.config['INVENTORY_FACT_TEMPLATES'].items()}
 
-    if env != '*':
-        query.add(EqualsOperator("environment", env))
+    node_url = UrlTemplate('node', 'node_name', env=env)
+    template_context = {'current_env': env, 'node_url': node_url}
+    app.update_template_context(template_context)
 
-    facts = puppetdb.facts(query=query)
+    # the rendered cells by fact and value, as many nodes share the same ones
+    cells: dict = {}
 
-    facts_by_node = defaultdict(dict)
-    for fact in facts:
-        facts_by_node[fact.node][fact.name] = fact.value
+    def render_cell(name, value):
+        key = (name, json.dumps(value, sort_keys=True, default=str))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = fact_templates[name].render(template_context, value=value)
+        return cell
 
-    fact_data = defaultdict(dict)
-    for node, facts in facts_by_node.items():
+    def render_row(node, values):
+        row = []
         for name in fact_names:
-            # If the fact name is in dot notation, we need to resolve it
-            fact_value = dot_lookup(facts, name) if "." in name else facts.get(name, "")
+            if name in ['fqdn', 'hostname']:
+                row.append('<a href="{0}">{1}</a>'.format(
+                    node_url(node_name=node), node))
+                continue
 
+            fact_value = values[name]
             if name in fact_templates:
-                fact_template = fact_templates[name]
-                fact_value = render_template_string(
-                    fact_template,
-                    current_env=env,
-                    value=fact_value,
-                )
-            fact_data[node][name] = fact_value
+                fact_value = render_cell(name, fact_value)
+            row.append(fact_value or "")
+        return row
 
-    total = len(fact_data)
+    total = filtered = None
+    if 'length' in request.args:
+        nodes, filtered, total = inventory_page(env, fact_names)
+        rows = (render_row(node, values) for node, values in nodes)
+    elif app.config['INVENTORY_CACHE_TTL'] and fresh_replica() is None:
+        rows = cached_inventory_rows(env, fact_names, render_row)
+    else:
+        rows = (render_row(node, values) for node, values in inventory_nodes(env, fact_names))
 
-    return render_template(
-        'inventory.json.tpl',
-        draw=draw,
-        total=total,
-        total_filtered=total,
-        fact_data=fact_data,
-        columns=fact_names)
+    return stream_json_table(draw, rows, total=total, filtered=filtered)
+
+
+def export_value(value):
+    # the structured facts are exported as JSON
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def export_csv(nodes, fact_names, chunk_size=16384):
+    """The CSV lines of the nodes, in chunks of about chunk_size characters."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['certname'] + fact_names)
+    for node, values in nodes:
+        writer.writerow([node] + [export_value(values[name]) for name in fact_names])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(nodes, fact_names, chunk_size=16384):
+    """A JSON object per line and node, in chunks of about chunk_size
+    characters."""
+    chunk = []
+    size = 0
+    for node, values in nodes:
+        line = json.dumps({'certname': node, **{name: values[name] for name in fact_names}})
+        chunk.append(line + '\n')
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+}
+
+
+@app.route('/inventory/export.<any(csv, ndjson):export_format>',
+           defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
+@app.route('/<env>/inventory/export.<any(csv, ndjson):export_format>')
+def inventory_export(env, export_format):
+    """Export the values of the INVENTORY_FACTS of all the nodes, as CSV or
+    as newline delimited JSON, f.e. for a CMDB.
+
+    The rows are streamed while they are fetched from PuppetDB by pages of
+    INVENTORY_EXPORT_PAGE_SIZE nodes, so the memory used does not grow
+    with the number of nodes.
+    """
+    envs = environments()
+    check_env(env, envs)
+    _, fact_names = inventory_facts()
+
+    nodes = inventory_nodes(env, fact_names, page_size=app.config['INVENTORY_EXPORT_PAGE_SIZE'])
+    export, mimetype = EXPORT_FORMATS[export_format]
+    return Response(stream_with_context(export(nodes, fact_names)), mimetype=mimetype,
+                    headers={'Content-Disposition':
+                             f'attachment; filename=inventory.{export_format}'})
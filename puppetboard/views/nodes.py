@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from functools import partial
 
 from flask import (
     Response, stream_with_context, request, render_template
@@ -7,7 +8,8 @@ from pypuppetdb.QueryBuilder import (AndOperator,
                                      EqualsOperator, NullOperator, OrOperator,
                                      LessEqualOperator)
 
-from puppetboard.core import get_app, get_puppetdb, environments, stream_template, REPORTS_COLUMNS
+from puppetboard.core import (get_app, get_puppetdb, environments, fresh_replica,
+                              stream_template, REPORTS_COLUMNS)
 from puppetboard.utils import (yield_or_stop, check_env, get_or_abort)
 
 app = get_app()
@@ -55,8 +57,13 @@ def nodes(env):
     if len(query.operations) == 0:
         query = None
 
-    nodelist = puppetdb.nodes(
-        query=query,
+    # the nodes of the replica are filtered by status below only
+    nodes_call = partial(puppetdb.nodes, query=query)
+    replica = fresh_replica()
+    if replica is not None:
+        nodes_call = partial(replica.nodes, puppetdb, env)
+
+    nodelist = nodes_call(
         unreported=app.config['UNRESPONSIVE_HOURS'],
         with_status=True,
         with_event_numbers=app.config['WITH_EVENT_NUMBERS'])
@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import time
+
+from apscheduler.events import (EVENT_JOB_ERROR, EVENT_JOB_EXECUTED,
+                                EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED)
+from flask import Response, abort, g, request
+
+from puppetboard.core import get_app
+from puppetboard.signals import cache_accessed, puppetdb_called
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+app = get_app()
+
+log = logging.getLogger(__name__)
+
+# f.e. /pdb/query/v4/nodes, /metrics/v2/read or /status/v1/services,
+# without the certnames, fact names, mbeans... found after that
+API_ENDPOINT_RE = re.compile(r'^/[^/]+/(?:[^/]+/)?v\d+/[^/]+')
+
+if prometheus_client is not None:
+    REQUEST_DURATION = prometheus_client.Histogram(
+        'puppetboard_request_duration_seconds',
+        'Time spent by Puppetboard to build its responses',
+        ['endpoint', 'method', 'status'],
+    )
+    PUPPETDB_REQUEST_DURATION = prometheus_client.Histogram(
+        'puppetboard_puppetdb_request_duration_seconds',
+        'Duration of the requests sent to PuppetDB',
+        ['endpoint', 'failed'],
+    )
+    CACHE_REQUESTS = prometheus_client.Counter(
+        'puppetboard_cache_requests',
+        'Lookups in the Puppetboard cache',
+        ['result'],
+    )
+    JOB_DURATION = prometheus_client.Histogram(
+        'puppetboard_scheduler_job_duration_seconds',
+        'Duration of the scheduled jobs',
+        ['job', 'failed'],
+        buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, float('inf')),
+    )
+elif app.config['PROMETHEUS_METRICS']:
+    log.error('PROMETHEUS_METRICS is enabled but the prometheus_client package '
+              'is not installed, no metrics will be collected.')
+
+# start time of the running scheduled jobs, by job id and scheduled run
+# time, as the runs of a job can overlap
+JOB_STARTS: dict = {}
+
+
+def enabled() -> bool:
+    return prometheus_client is not None and app.config['PROMETHEUS_METRICS']
+
+
+def api_endpoint(path: str) -> str:
+    match = API_ENDPOINT_RE.match(path)
+    return match.group(0) if match else path
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    if enabled() and 'request_started_at' in g:
+        REQUEST_DURATION.labels(
+            endpoint=request.endpoint or 'none',
+            method=request.method,
+            status=response.status_code,
+        ).observe(time.perf_counter() - g.request_started_at)
+    return response
+
+
+@puppetdb_called.connect
+def observe_puppetdb_call(sender, endpoint, duration, failed, **kwargs):
+    if enabled():
+        PUPPETDB_REQUEST_DURATION.labels(
+            endpoint=api_endpoint(endpoint),
+            failed=failed,
+        ).observe(duration)
+
+
+@cache_accessed.connect
+def observe_cache_access(sender, hit, **kwargs):
+    if enabled():
+        CACHE_REQUESTS.labels(result='hit' if hit else 'miss').inc()
+
+
+def observe_job(event):
+    if event.code == EVENT_JOB_SUBMITTED:
+        started_at = time.monotonic()
+        for run_time in event.scheduled_run_times:
+            JOB_STARTS[(event.job_id, run_time)] = started_at
+        return
+
+    started_at = JOB_STARTS.pop((event.job_id, event.scheduled_run_time), None)
+    if event.code == EVENT_JOB_MISSED:
+        return
+    if enabled() and started_at is not None:
+        JOB_DURATION.labels(
+            job=event.job_id,
+            failed=event.exception is not None,
+        ).observe(time.monotonic() - started_at)
+
+
+def observe_scheduler(scheduler):
+    """Record the duration of the jobs run by the given scheduler."""
+    scheduler.add_listener(observe_job, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED
+                           | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+
+@app.route(app.config['PROMETHEUS_METRICS_PATH'])
+def prometheus_metrics():
+    """Expose the metrics in the Prometheus text format.
+
+    With several worker processes (f.e. gunicorn), set the
+    PROMETHEUS_MULTIPROC_DIR environment variable so that the metrics of all
+    the workers are collected from there.
+    """
+    if not enabled():
+        abort(404)
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return Response(prometheus_client.generate_latest(registry),
+                    content_type=prometheus_client.CONTENT_TYPE_LATEST)
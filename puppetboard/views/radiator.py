@@ -1,10 +1,12 @@
+from functools import partial
+
 from flask import (
     render_template, request, jsonify
 )
 from pypuppetdb.QueryBuilder import (ExtractOperator, AndOperator,
                                      EqualsOperator, FunctionOperator)
 
-from puppetboard.core import get_app, get_puppetdb, environments
+from puppetboard.core import get_app, get_puppetdb, environments, fresh_replica, query_all
 from puppetboard.utils import get_or_abort, check_env
 
 app = get_app()
@@ -23,11 +25,10 @@ def radiator(env):
     # TODO: deduplicate. this already implemented in index().
     if env == '*':
         query = None
-        metrics = get_or_abort(
+        metric_call = partial(
             puppetdb.metric,
             'puppetlabs.puppetdb.population:name=num-nodes',
         )
-        num_nodes = metrics['Value']
     else:
         query = AndOperator()
         metric_query = ExtractOperator()
@@ -36,17 +37,25 @@ def radiator(env):
         metric_query.add_field(FunctionOperator('count'))
         metric_query.add_query(query)
 
-        metrics = get_or_abort(
-            puppetdb._query,
-            'nodes',
-            query=metric_query)
-        num_nodes = metrics[0]['count']
+        metric_call = partial(puppetdb._query, 'nodes', query=metric_query)
 
-    nodes = puppetdb.nodes(
-        query=query,
-        unreported=app.config['UNRESPONSIVE_HOURS'],
-        with_status=True
-    )
+    nodes_call = partial(puppetdb.nodes, query=query)
+    replica = fresh_replica()
+    if replica is not None:
+        nodes_call = partial(replica.nodes, puppetdb, env)
+
+    # the count and the nodes list are independent, so fetch them in parallel
+    metrics, nodes = get_or_abort(
+        query_all,
+        metric_call,
+        partial(nodes_call,
+                unreported=app.config['UNRESPONSIVE_HOURS'],
+                with_status=True))
+
+    if env == '*':
+        num_nodes = metrics['Value']
+    else:
+        num_nodes = metrics[0]['count']
 
     stats = {
         'changed_percent': 0,
@@ -1,6 +1,6 @@
 import json
 import re
-from itertools import tee
+from functools import partial
 
 import commonmark
 from flask import (
@@ -11,8 +11,9 @@ from pypuppetdb.QueryBuilder import (AndOperator,
                                      LessEqualOperator, RegexOperator, GreaterEqualOperator)
 
 from puppetboard.core import get_app, get_puppetdb, environments, REPORTS_COLUMNS, to_html, \
-    get_raw_error, get_friendly_error
-from puppetboard.utils import (check_env, get_or_abort)
+    get_raw_error, get_friendly_error, query_page
+from puppetboard.response_cache import cached_response
+from puppetboard.utils import (UrlTemplate, check_env, count_query, get_or_abort)
 
 app = get_app()
 puppetdb = get_puppetdb()
@@ -25,6 +26,7 @@ puppetdb = get_puppetdb()
 @app.route('/reports/<node_name>/json',
            defaults={'env': app.config['DEFAULT_ENVIRONMENT']})
 @app.route('/<env>/reports/<node_name>/json')
+@cached_response
 def reports_ajax(env, node_name):
     """Query and Return JSON data to reports Jquery datatable
 
@@ -105,34 +107,25 @@ def reports_ajax(env, node_name):
         reports_query.add(status_query)
 
     if status_args[0] != 'none':
-        reports = get_or_abort(
-            puppetdb.reports,
-            query=reports_query,
-            order_by=order_args,
-            include_total=True,
-            **paging_args)
-        reports, reports_events = tee(reports)
-        total = None
+        reports, total, _ = get_or_abort(
+            query_page,
+            partial(puppetdb.reports, query=reports_query, order_by=order_args,
+                    **paging_args),
+            partial(puppetdb._query, 'reports',
+                    query=count_query(*([reports_query] if reports_query else []))))
     else:
         reports = []
-        reports_events = []
         total = 0
 
     # Convert metrics to relational dict
     metrics = {}
-    for report in reports_events:
-        if total is None:
-            total = puppetdb.total
-
+    for report in reports:
         metrics[report.hash_] = {}
         for m in report.metrics:
             if m['category'] not in metrics[report.hash_]:
                 metrics[report.hash_][m['category']] = {}
             metrics[report.hash_][m['category']][m['name']] = m['value']
 
-    if total is None:
-        total = 0
-
     return render_template(
         'reports.json.tpl',
         draw=draw,
@@ -142,6 +135,8 @@ def reports_ajax(env, node_name):
         metrics=metrics,
         envs=envs,
         current_env=env,
+        node_url=UrlTemplate('node', 'node_name', env=env),
+        report_url=UrlTemplate('report', 'node_name', 'report_id', env=env),
         columns=REPORTS_COLUMNS[:max_col])
 
 
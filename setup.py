@@ -54,7 +54,9 @@ setup(
     python_requires=">=3.9.0",
     install_requires=requirements,
     tests_require=requirements_test,
-    extras_require={'test': requirements_test},
+    extras_require={'test': requirements_test,
+                    'prometheus': ['prometheus-client'],
+                    'brotli': ['brotli']},
     data_files=[('requirements_for_tests', ['requirements-test.txt']),
                 ('requirements_for_docker', ['requirements-docker.txt'])],
     keywords="puppet puppetdb puppetboard",
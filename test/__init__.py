@@ -1,21 +1,39 @@
+import threading
+
+
 class MockDbQuery(object):
     def __init__(self, responses):
         self.responses = responses
+        # views may send independent queries in parallel threads
+        self.lock = threading.Lock()
 
     def get(self, method, **kws):
         resp = None
-        if method in self.responses:
-            resp = self.responses[method].pop(0)
+        with self.lock:
+            if method in self.responses:
+                resp = self.responses[method].pop(self._find(method, kws))
 
-            if 'validate' in resp:
-                checks = resp['validate']['checks']
-                resp = resp['validate']['data']
-                for check in checks:
-                    assert check in kws
-                    expected_value = checks[check]
-                    assert expected_value == kws[check]
+        if resp is not None and 'validate' in resp:
+            checks = resp['validate']['checks']
+            resp = resp['validate']['data']
+            for check in checks:
+                assert check in kws
+                expected_value = checks[check]
+                assert expected_value == kws[check]
         return resp
 
+    def _find(self, method, kws):
+        """Return the index of the first queued response whose checks
+        match the call, so that parallel queries to the same endpoint
+        can be answered in any order. Defaults to the first response."""
+        for index, resp in enumerate(self.responses[method]):
+            if resp is None or 'validate' not in resp:
+                continue
+            checks = resp['validate']['checks']
+            if all(check in kws and kws[check] == checks[check] for check in checks):
+                return index
+        return 0
+
 
 class MockHTTPResponse(object):
     def __init__(self, status_code, text):
@@ -0,0 +1,159 @@
+"""Fixtures of the benchmarks: a fake PuppetDB serving a synthetic fleet,
+and a `benchmark` fixture to measure a view.
+
+The size of the fleet is small by default, so that the benchmarks also run
+as smoke tests with the rest of the test suite. Use the BENCHMARK_*
+environment variables to make it realistic, f.e.:
+
+    BENCHMARK_NODES=2000 BENCHMARK_RESOURCES=10000 BENCHMARK_MOUNTPOINTS=1000 \\
+        BENCHMARK_OUTPUT=results.json python -m pytest test/benchmarks -p no:randomly
+
+Each scenario runs BENCHMARK_ROUNDS times (after one warm-up round), the
+results are printed at the end of the session and written as JSON to
+BENCHMARK_OUTPUT if set, to compare them between two versions.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from puppetboard import app
+from puppetboard.signals import puppetdb_called
+
+FLEET_PARAMETERS = {
+    'nodes': 50,
+    'environments': 3,
+    'interfaces': 8,
+    'mountpoints': 20,
+    'reports': 3,
+    'events': 20,
+    'logs': 50,
+    'resources': 500,
+}
+
+RESULTS = []
+
+
+def fleet_parameters() -> dict:
+    return {name: int(os.getenv(f'BENCHMARK_{name.upper()}', default))
+            for name, default in FLEET_PARAMETERS.items()}
+
+
+@pytest.fixture(scope='session')
+def fake_puppetdb_port():
+    command = [sys.executable, '-m', 'test.benchmarks.fake_puppetdb', '--port', '0']
+    for name, value in fleet_parameters().items():
+        command += [f'--{name}', str(value)]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True,
+                               cwd=Path(__file__).parents[2])
+    try:
+        port = int(process.stdout.readline())
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture
+def fake_puppetdb(mocker, fake_puppetdb_port):
+    """Point the PuppetDB client to the fake PuppetDB, with all the views
+    enabled."""
+    mocker.patch.object(app.puppetdb, 'protocol', 'http')
+    mocker.patch.object(app.puppetdb, 'host', '127.0.0.1')
+    mocker.patch.object(app.puppetdb, 'port', fake_puppetdb_port)
+    mocker.patch.dict(app.app.config, {
+        'ENABLE_CATALOG': True,
+        'ENABLE_CLASS': True,
+    })
+    return app.puppetdb
+
+
+class PuppetDBCalls(object):
+    """Counts the calls to PuppetDB, including the ones made by other
+    threads, while it is connected."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, sender, duration, **kwargs):
+        self.count += 1
+        self.duration += duration
+
+
+def measure(client, url):
+    calls = PuppetDBCalls()
+    with puppetdb_called.connected_to(calls):
+        start = time.perf_counter()
+        rv = client.get(url)
+        # consume the streamed responses
+        body = rv.get_data()
+        latency = time.perf_counter() - start
+    assert rv.status_code == 200, f'{url}: {rv.status_code}'
+    return latency, calls, len(body)
+
+
+@pytest.fixture
+def benchmark(client, fake_puppetdb, request):
+    rounds = int(os.getenv('BENCHMARK_ROUNDS', '3'))
+
+    def run(url):
+        # warm-up, f.e. for the fake PuppetDB response cache
+        measure(client, url)
+
+        latencies = []
+        for _ in range(rounds):
+            latency, calls, size = measure(client, url)
+            latencies.append(latency)
+
+        # measured separately as tracing the allocations slows everything
+        tracemalloc.start()
+        try:
+            measure(client, url)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'scenario': request.node.callspec.id if hasattr(request.node, 'callspec')
+            else request.node.name,
+            'url': url,
+            'median_ms': statistics.median(latencies) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'peak_memory_kb': peak_memory / 1024,
+            'puppetdb_calls': calls.count,
+            'puppetdb_ms': calls.duration * 1000,
+            'response_kb': size / 1024,
+        }
+        RESULTS.append(result)
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line(f'fleet: {fleet_parameters()}')
+    terminalreporter.write_line(
+        f'{"scenario":<28} {"median ms":>10} {"max ms":>10} {"peak KiB":>10} '
+        f'{"PDB calls":>10} {"PDB ms":>10} {"body KiB":>10}')
+    for result in sorted(RESULTS, key=lambda result: result['scenario']):
+        terminalreporter.write_line(
+            f'{result["scenario"]:<28} {result["median_ms"]:>10.1f} {result["max_ms"]:>10.1f} '
+            f'{result["peak_memory_kb"]:>10.0f} {result["puppetdb_calls"]:>10} '
+            f'{result["puppetdb_ms"]:>10.1f} {result["response_kb"]:>10.1f}')
+
+    output = os.getenv('BENCHMARK_OUTPUT')
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'fleet': fleet_parameters(), 'results': RESULTS}, f, indent=2)
@@ -0,0 +1,402 @@
+"""A stand-in for the PuppetDB HTTP API, serving a synthetic fleet.
+
+It implements the parts of the query API that Puppetboard uses: the AST
+query language (comparisons, regexps, `and`/`or`/`not`, `null?`, `in` with
+`extract`/`from` subqueries, `count()` with `group_by`), paging, ordering,
+`include_total`, the metrics v2 API and the version endpoint.
+
+Run it standalone to point a real Puppetboard at a big fleet:
+
+    python -m test.benchmarks.fake_puppetdb --port 8080 --nodes 5000
+
+The benchmarks run it in a separate process (see conftest.py), so that its
+memory and CPU usage are not mixed with the ones of Puppetboard.
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from test.benchmarks.fleet import Fleet
+
+TIMESTAMP_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+
+
+class QueryError(Exception):
+    pass
+
+
+def to_datetime(value):
+    value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def comparable(left, right):
+    if (isinstance(left, str) and isinstance(right, str)
+            and TIMESTAMP_RE.match(left) and TIMESTAMP_RE.match(right)):
+        return to_datetime(left), to_datetime(right)
+    return left, right
+
+
+def lookup(row, field):
+    """The value of a field, with dotted paths into the `facts` and
+    `trusted` maps of the inventory endpoint."""
+    if field in row:
+        return row[field]
+    if '.' in field:
+        value = row
+        for part in field.split('.'):
+            if isinstance(value, dict) and part in value:
+                value = value[part]
+            elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+                value = value[int(part)]
+            else:
+                return None
+        return value
+    return None
+
+
+class FakePuppetDB(object):
+
+    def __init__(self, fleet: Fleet):
+        self.fleet = fleet
+
+    def rows(self, entity):
+        fleet = self.fleet
+        entity = entity.replace('_', '-')
+        if entity == 'nodes':
+            return iter(fleet.nodes)
+        if entity == 'facts':
+            return fleet.fact_rows()
+        if entity == 'fact-contents':
+            return fleet.fact_content_rows()
+        if entity == 'fact-paths':
+            return iter(fleet.fact_paths())
+        if entity == 'factsets':
+            return fleet.factset_rows()
+        if entity == 'inventory':
+            return fleet.inventory_rows()
+        if entity == 'reports':
+            return iter(fleet.reports)
+        if entity == 'events':
+            return iter(fleet.events)
+        if entity == 'environments':
+            return iter({'name': name} for name in fleet.environments)
+        if entity == 'catalogs':
+            return (fleet.catalog(node['certname']) for node in fleet.nodes)
+        if entity == 'resources':
+            return fleet.resource_rows()
+        raise QueryError(f'Unknown entity: {entity}')
+
+    # query language
+
+    def matches(self, query, row) -> bool:
+        if not query:
+            return True
+        operator = query[0]
+        if operator == 'and':
+            return all(self.matches(sub, row) for sub in query[1:])
+        if operator == 'or':
+            return any(self.matches(sub, row) for sub in query[1:])
+        if operator == 'not':
+            return not self.matches(query[1], row)
+        if operator == 'null?':
+            return (lookup(row, query[1]) is None) == query[2]
+        if operator == 'in':
+            return self.matches_in(query, row)
+        if operator == '~>':
+            return self.matches_path(query[2], lookup(row, query[1]))
+        if operator in ('=', '~', '>', '<', '>=', '<='):
+            value = lookup(row, query[1])
+            expected = query[2]
+            if operator == '=':
+                if isinstance(value, list) and isinstance(expected, list):
+                    return [str(part) for part in value] == [str(part) for part in expected]
+                return value == expected
+            if operator == '~':
+                return value is not None and re.search(expected, str(value)) is not None
+            if value is None:
+                return False
+            value, expected = comparable(value, expected)
+            try:
+                return {'>': value > expected, '<': value < expected,
+                        '>=': value >= expected, '<=': value <= expected}[operator]
+            except TypeError:
+                return False
+        raise QueryError(f'Unsupported operator: {operator}')
+
+    @staticmethod
+    def matches_path(patterns, path) -> bool:
+        if not isinstance(path, list) or len(path) != len(patterns):
+            return False
+        return all(re.fullmatch(pattern, str(part))
+                   for pattern, part in zip(patterns, path))
+
+    def matches_in(self, query, row) -> bool:
+        fields = query[1] if isinstance(query[1], list) else [query[1]]
+        key = tuple(lookup(row, field) for field in fields)
+        return key in self.subquery_values(json.dumps(query[2]))
+
+    def subquery_values(self, subquery: str) -> set:
+        cache = self.__dict__.setdefault('_subqueries', {})
+        if subquery not in cache:
+            query = json.loads(subquery)
+            if query[0] == 'array':
+                values = {(value,) for value in query[1]}
+            elif query[0] == 'from':
+                values = {tuple(row.values()) for row in self.select(query[1], query[2])}
+            else:
+                raise QueryError(f'Unsupported subquery: {query[0]}')
+            cache[subquery] = values
+        return cache[subquery]
+
+    def select(self, entity, query=None, order_by=None):
+        """Return the rows of the entity that match the query, projected
+        and aggregated if it is an `extract` or redirected by `from`."""
+        if query and query[0] == 'from':
+            return self.select(query[1], query[2] if len(query) > 2 else None, order_by)
+
+        if not query or query[0] != 'extract':
+            rows = [row for row in self.rows(entity) if self.matches(query, row)]
+            return self.order(rows, order_by)
+
+        fields = query[1] if isinstance(query[1], list) else [query[1]]
+        where = None
+        group_by = []
+        for part in query[2:]:
+            if part and part[0] == 'group_by':
+                group_by = part[1:]
+            else:
+                where = part
+        rows = [row for row in self.rows(entity) if self.matches(where, row)]
+
+        functions = [field for field in fields if isinstance(field, list)]
+        if not functions:
+            return self.order([{field: lookup(row, field) for field in fields}
+                               for row in rows], order_by)
+
+        groups = OrderedDict()
+        for row in rows:
+            key = tuple(json.dumps(lookup(row, field), sort_keys=True)
+                        for field in group_by)
+            groups.setdefault(key, []).append(row)
+        if not group_by and not groups:
+            groups[()] = []
+
+        result = []
+        for key, group in groups.items():
+            item = {}
+            for field in fields:
+                if isinstance(field, list):
+                    if field[1] != 'count':
+                        raise QueryError(f'Unsupported function: {field[1]}')
+                    item['count'] = len(group)
+                else:
+                    item[field] = lookup(group[0], field)
+            result.append(item)
+        return self.order(result, order_by)
+
+    @staticmethod
+    def order(rows, order_by):
+        for clause in reversed(order_by or []):
+            field = clause['field']
+            rows.sort(key=lambda row: (lookup(row, field) is None, lookup(row, field)),
+                      reverse=clause.get('order', 'asc').lower() == 'desc')
+        return rows
+
+    # API
+
+    def query(self, entity, path, params):
+        """Return (status, headers, body) for a request to the query API."""
+        query = json.loads(params['query']) if params.get('query') else None
+        order_by = json.loads(params['order_by']) if params.get('order_by') else None
+
+        if entity == 'fact-names':
+            return 200, {}, sorted({row['name'] for row in self.fleet.fact_rows()})
+
+        if entity == 'event-counts':
+            return 200, {}, self.event_counts(query, params.get('summarize_by'))
+
+        single = False
+        if path:
+            query = self.path_query(entity, path, query)
+            single = entity in ('nodes', 'catalogs') and len(path) == 1
+
+        rows = self.select(entity, query, order_by)
+
+        if single:
+            if not rows:
+                return 404, {}, {'error': f'No information is known about {path[0]}'}
+            return 200, {}, rows[0]
+
+        headers = {}
+        if params.get('include_total') == 'true':
+            headers['X-Records'] = str(len(rows))
+        offset = int(params.get('offset') or 0)
+        limit = int(params['limit']) if params.get('limit') else None
+        stop = offset + limit if limit is not None else None
+        return 200, headers, list(islice(rows, offset, stop))
+
+    @staticmethod
+    def path_query(entity, path, query):
+        if entity in ('nodes', 'catalogs', 'factsets', 'inventory'):
+            clauses = [['=', 'certname', path[0]]]
+        elif entity == 'facts':
+            clauses = [['=', 'name', path[0]]]
+            if len(path) > 1:
+                clauses.append(['=', 'value', '/'.join(path[1:])])
+        elif entity == 'resources':
+            clauses = [['=', 'type', path[0]]]
+            if len(path) > 1:
+                clauses.append(['=', 'title', '/'.join(path[1:])])
+        elif entity == 'environments':
+            clauses = [['=', 'name', path[0]]]
+        else:
+            raise QueryError(f'Unsupported path for {entity}')
+        if query:
+            clauses.append(query)
+        return ['and'] + clauses
+
+    def event_counts(self, query, summarize_by):
+        if summarize_by != 'certname':
+            raise QueryError(f'Unsupported summarize_by: {summarize_by}')
+        counts = OrderedDict()
+        for event in self.select('events', query):
+            count = counts.setdefault(event['certname'], {
+                'subject_type': 'certname',
+                'subject': {'title': event['certname']},
+                'failures': 0, 'successes': 0, 'noops': 0, 'skips': 0,
+            })
+            key = {'failure': 'failures', 'success': 'successes',
+                   'noop': 'noops', 'skipped': 'skips'}[event['status']]
+            count[key] += 1
+        return list(counts.values())
+
+    def metric(self, name):
+        if name is None:
+            return {'value': {
+                'puppetlabs.puppetdb.population': {
+                    'name=num-nodes': {}, 'name=num-resources': {},
+                },
+                'java.lang': {'type=Memory': {}},
+            }}
+        if 'num-nodes' in name:
+            return {'value': {'Value': len(self.fleet.nodes)}}
+        if 'num-resources' in name:
+            return {'value': {'Value': len(self.fleet.nodes) * self.fleet.num_resources}}
+        return {'value': {'HeapMemoryUsage': {'used': 2 ** 30, 'max': 2 ** 32}}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: 'FakePuppetDBServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        self.server.count_request()
+
+        cached = self.server.cached(self.path)
+        if cached is not None:
+            return self.reply(*cached)
+
+        database = self.server.database
+        try:
+            if parts[:3] == ['pdb', 'meta', 'v1']:
+                response = 200, {}, {'version': '8.4.0'} if parts[3] == 'version' \
+                    else {'server_time': datetime.now(timezone.utc).isoformat()}
+            elif parts[:3] == ['pdb', 'query', 'v4'] and len(parts) > 3:
+                response = database.query(parts[3], parts[4:], params)
+            elif parts[:2] == ['metrics', 'v2']:
+                response = 200, {}, database.metric(parts[3] if parts[2] == 'read' else None)
+            elif parts[:2] == ['status', 'v1']:
+                response = 200, {}, {'puppetdb-status': {'state': 'running'}}
+            else:
+                response = 404, {}, {'error': f'Unknown endpoint {url.path}'}
+        except (QueryError, ValueError, IndexError, KeyError) as e:
+            response = 400, {}, {'error': f'{type(e).__name__}: {e}'}
+
+        response = (response[0], response[1], json.dumps(response[2]).encode('utf-8'))
+        if response[0] == 200:
+            self.server.store(self.path, response)
+        self.reply(*response)
+
+    def reply(self, status, headers, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePuppetDBServer(ThreadingHTTPServer):
+    """The responses are deterministic, so the most recent ones are kept,
+    so that the time spent in the fake server is negligible after the
+    warm-up rounds of the benchmarks."""
+
+    daemon_threads = True
+    cache_size = 256
+
+    def __init__(self, address, fleet: Fleet):
+        super().__init__(address, Handler)
+        self.database = FakePuppetDB(fleet)
+        self.responses: OrderedDict = OrderedDict()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def cached(self, path):
+        with self.lock:
+            if path in self.responses:
+                self.responses.move_to_end(path)
+                return self.responses[path]
+        return None
+
+    def store(self, path, response):
+        with self.lock:
+            self.responses[path] = response
+            while len(self.responses) > self.cache_size:
+                self.responses.popitem(last=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0,
+                        help='0 to pick a free port, printed on stdout')
+    for name, default in (('nodes', 50), ('environments', 3), ('interfaces', 8),
+                          ('mountpoints', 20), ('reports', 3), ('events', 20),
+                          ('logs', 50), ('resources', 500), ('seed', 42)):
+        parser.add_argument(f'--{name}', type=int, default=default)
+    args = parser.parse_args(argv)
+
+    fleet = Fleet(nodes=args.nodes, environments=args.environments,
+                  interfaces=args.interfaces, mountpoints=args.mountpoints,
+                  reports=args.reports, events=args.events, logs=args.logs,
+                  resources=args.resources, seed=args.seed)
+    server = FakePuppetDBServer((args.host, args.port), fleet)
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
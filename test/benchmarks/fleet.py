@@ -0,0 +1,444 @@
+"""Generation of a synthetic fleet of Puppet nodes, in the formats returned
+by the PuppetDB query API.
+
+Everything is derived from a seeded random generator, so that the same
+parameters always give the same fleet.
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+STATUSES = ['unchanged'] * 5 + ['changed'] * 3 + ['failed', 'noop']
+
+CLASSES = ['Profile::Base', 'Profile::Monitoring', 'Profile::Logging',
+           'Profile::Web', 'Profile::Database', 'Profile::Backup',
+           'Ntp', 'Ntp::Config', 'Ntp::Service', 'Ssh', 'Ssh::Server',
+           'Ssh::Client', 'Apache', 'Apache::Mod::Ssl', 'Postgresql::Server',
+           'Mysql::Server', 'Firewall', 'Sudo', 'Users', 'Motd']
+
+RESOURCE_TYPES = ['File', 'Package', 'Service', 'Exec', 'User', 'Group',
+                  'Cron', 'Augeas', 'Firewall', 'Concat::Fragment']
+
+OPERATING_SYSTEMS = [
+    ('RedHat', 'RedHat', '9.3', '9'),
+    ('RedHat', 'Rocky', '8.9', '8'),
+    ('Debian', 'Debian', '12.5', '12'),
+    ('Debian', 'Ubuntu', '22.04', '22.04'),
+]
+
+PUPPET_VERSIONS = ['7.28.0', '8.4.0', '8.6.0']
+
+
+def timestamp(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def digest(*parts) -> str:
+    return hashlib.sha1('/'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class Fleet(object):
+    """A fleet of nodes with their facts, reports (with their logs, events
+    and metrics) and catalogs.
+
+    :param nodes: Number of nodes
+    :param environments: Number of environments, the first one being
+        'production'
+    :param interfaces: Number of network interfaces of each node, in the
+        `networking` fact
+    :param mountpoints: Number of mount points of each node, in the
+        `mountpoints` fact
+    :param reports: Number of reports stored for each node
+    :param events: Number of events in each report
+    :param logs: Number of log lines in each report
+    :param resources: Number of resources in each catalog
+    :param seed: Seed of the random generator
+    """
+
+    def __init__(self, nodes=50, environments=3, interfaces=8, mountpoints=20,
+                 reports=3, events=20, logs=50, resources=500, seed=42):
+        self.num_resources = resources
+        self.num_events = events
+        self.num_logs = logs
+        self.random = random.Random(seed)
+        self.now = datetime.now(timezone.utc)
+
+        self.environments = ['production'] + [f'env{i}' for i in range(1, environments)]
+        self.nodes = []
+        self.facts = {}
+        self.reports = []
+        self.events = []
+
+        for index in range(nodes):
+            certname = f'node{index:05d}.example.com'
+            environment = self.environments[index % len(self.environments)]
+            node_facts = self._generate_facts(certname, index, interfaces, mountpoints)
+            self.facts[certname] = (environment, node_facts)
+            self._generate_node(certname, index, environment, reports)
+
+    def _generate_facts(self, certname, index, interfaces, mountpoints):
+        hostname, domain = certname.split('.', 1)
+        family, name, release, major = self.random.choice(OPERATING_SYSTEMS)
+        ip = f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+
+        networking_interfaces = {}
+        for number in range(interfaces):
+            address = f'172.{16 + number % 16}.{index // 256 % 256}.{index % 256}'
+            networking_interfaces[f'eth{number}'] = {
+                'ip': address,
+                'mac': ':'.join(f'{self.random.randrange(256):02x}' for _ in range(6)),
+                'mtu': 1500,
+                'netmask': '255.255.0.0',
+                'network': f'172.{16 + number % 16}.0.0',
+                'bindings': [{
+                    'address': address,
+                    'netmask': '255.255.0.0',
+                    'network': f'172.{16 + number % 16}.0.0',
+                }],
+            }
+
+        mounts = {}
+        for number in range(mountpoints):
+            size = self.random.randrange(1, 1000) * 2 ** 30
+            used = self.random.randrange(size)
+            mounts[f'/srv/data{number}'] = {
+                'device': f'/dev/mapper/vg0-data{number}',
+                'filesystem': 'xfs',
+                'size': f'{size / 2 ** 30:.2f} GiB',
+                'size_bytes': size,
+                'used_bytes': used,
+                'available_bytes': size - used,
+                'capacity': f'{used / size * 100:.2f}%',
+                'options': ['rw', 'relatime', 'attr2', 'inode64'],
+            }
+
+        puppetversion = self.random.choice(PUPPET_VERSIONS)
+        return {
+            'architecture': 'x86_64',
+            'clientversion': puppetversion,
+            'puppetversion': puppetversion,
+            'domain': domain,
+            'fqdn': certname,
+            'hostname': hostname,
+            'ipaddress': ip,
+            'netmask': '255.255.0.0',
+            'kernel': 'Linux',
+            'kernelrelease': f'{self.random.choice(["5.14", "6.1", "6.5"])}.0-{index % 30}',
+            'osfamily': family,
+            'operatingsystem': name,
+            'lsbdistid': name,
+            'lsbdistcodename': f'{name.lower()}{major}',
+            'lsbdistrelease': release,
+            'lsbmajdistrelease': major,
+            'processorcount': self.random.choice([1, 2, 4, 8, 16]),
+            'memorysize_mb': self.random.choice([2048, 4096, 8192, 16384]) * 1.0,
+            'is_virtual': self.random.random() < 0.8,
+            'uptime_seconds': self.random.randrange(86400 * 365),
+            'os': {
+                'architecture': 'x86_64',
+                'family': family,
+                'name': name,
+                'release': {'full': release, 'major': major},
+                'selinux': {'enabled': family == 'RedHat'},
+            },
+            'networking': {
+                'domain': domain,
+                'fqdn': certname,
+                'hostname': hostname,
+                'ip': ip,
+                'mac': networking_interfaces.get('eth0', {}).get('mac'),
+                'primary': 'eth0',
+                'interfaces': networking_interfaces,
+            },
+            'mountpoints': mounts,
+            'trusted': {
+                'authenticated': 'remote',
+                'certname': certname,
+                'domain': domain,
+                'hostname': hostname,
+                'extensions': {'pp_role': self.random.choice(['web', 'db', 'app'])},
+            },
+        }
+
+    def _generate_node(self, certname, index, environment, num_reports):
+        # some nodes have not reported for days
+        if self.random.random() < 0.05:
+            last_run = self.now - timedelta(days=self.random.randrange(1, 30))
+        else:
+            last_run = self.now - timedelta(minutes=self.random.randrange(30))
+
+        latest = None
+        for number in range(num_reports):
+            end = last_run - timedelta(minutes=30 * number)
+            status = self.random.choice(STATUSES)
+            report = self._generate_report(certname, environment, end, status,
+                                           number == 0)
+            self.reports.append(report)
+            if latest is None:
+                latest = report
+
+        self.nodes.append({
+            'certname': certname,
+            'deactivated': None,
+            'expired': None,
+            'report_environment': environment,
+            'catalog_environment': environment,
+            'facts_environment': environment,
+            'report_timestamp': timestamp(last_run) if latest else None,
+            'catalog_timestamp': timestamp(last_run - timedelta(seconds=40)),
+            'facts_timestamp': timestamp(last_run - timedelta(seconds=50)),
+            'latest_report_hash': latest['hash'] if latest else None,
+            'latest_report_status': latest['status'] if latest else None,
+            'latest_report_noop': latest['noop'] if latest else None,
+            'latest_report_noop_pending': latest['noop_pending'] if latest else None,
+            'latest_report_corrective_change': None,
+            'latest_report_job_id': None,
+            'cached_catalog_status': 'not_used',
+        })
+
+    def _generate_report(self, certname, environment, end, status, latest):
+        report_hash = digest('report', certname, end)
+        start = end - timedelta(seconds=self.random.randrange(10, 120))
+        noop = status == 'noop'
+
+        events = []
+        if status != 'unchanged':
+            event_status = {'changed': 'success', 'failed': 'failure',
+                            'noop': 'noop'}[status]
+            for number in range(self.num_events):
+                resource_type = RESOURCE_TYPES[number % len(RESOURCE_TYPES)]
+                containing_class = CLASSES[number % len(CLASSES)]
+                title = f'/etc/{containing_class.lower().replace("::", "/")}/{number}'
+                events.append({
+                    'certname': certname,
+                    'environment': environment,
+                    'report': report_hash,
+                    'latest_report?': latest,
+                    'status': event_status if number % 4 == 0 else 'success',
+                    'timestamp': timestamp(start + timedelta(seconds=number)),
+                    'run_start_time': timestamp(start),
+                    'run_end_time': timestamp(end),
+                    'report_receive_time': timestamp(end),
+                    'configuration_version': str(int(end.timestamp())),
+                    'resource_type': resource_type,
+                    'resource_title': title,
+                    'property': 'ensure',
+                    'name': None,
+                    'new_value': 'present',
+                    'old_value': 'absent',
+                    'message': f'defined \'ensure\' as \'present\' ({number})',
+                    'file': f'/etc/puppetlabs/code/environments/{environment}/site/profile/manifests/init.pp',
+                    'line': number + 1,
+                    'containment_path': ['Stage[main]', containing_class,
+                                         f'{resource_type}[{title}]'],
+                    'containing_class': containing_class,
+                    'corrective_change': False,
+                })
+        self.events.extend(events)
+
+        logs = []
+        for number in range(self.num_logs):
+            level = 'notice'
+            source = f'/Stage[main]/Profile::Base/File[/etc/motd{number}]/ensure'
+            message = 'defined content as \'{sha256}0f3c\''
+            if status == 'failed' and number == self.num_logs - 1:
+                level = 'err'
+                source = 'Puppet'
+                message = ('Could not retrieve catalog from remote server: Error 500 '
+                           'on SERVER: Server Error: Evaluation Error: Unknown variable: '
+                           f'\'::role\'. (file: /etc/puppetlabs/code/environments/{environment}'
+                           '/manifests/site.pp, line: 3, column: 10) on node ' + certname)
+            logs.append({
+                'file': None,
+                'line': None,
+                'level': level,
+                'message': message,
+                'source': source,
+                'tags': ['notice', 'file', 'class', 'profile::base'],
+                'time': timestamp(start + timedelta(seconds=number % 60)),
+            })
+
+        successes = sum(1 for event in events if event['status'] == 'success')
+        failures = sum(1 for event in events if event['status'] == 'failure')
+        return {
+            'certname': certname,
+            'hash': report_hash,
+            'environment': environment,
+            'status': status,
+            'noop': noop,
+            'noop_pending': noop,
+            'latest_report?': latest,
+            'start_time': timestamp(start),
+            'end_time': timestamp(end),
+            'receive_time': timestamp(end + timedelta(seconds=2)),
+            'producer_timestamp': timestamp(end),
+            'configuration_version': str(int(end.timestamp())),
+            'report_format': 12,
+            'puppet_version': self.facts[certname][1]['puppetversion'],
+            'transaction_uuid': digest('transaction', report_hash),
+            'catalog_uuid': digest('catalog', report_hash),
+            'code_id': None,
+            'job_id': None,
+            'cached_catalog_status': 'not_used',
+            'corrective_change': False,
+            'type': 'agent',
+            'producer': 'puppet.example.com',
+            'metrics': {'data': [
+                {'category': 'resources', 'name': 'total', 'value': self.num_resources},
+                {'category': 'resources', 'name': 'changed', 'value': successes},
+                {'category': 'resources', 'name': 'failed', 'value': failures},
+                {'category': 'time', 'name': 'total', 'value': (end - start).total_seconds()},
+                {'category': 'changes', 'name': 'total', 'value': successes},
+                {'category': 'events', 'name': 'success', 'value': successes},
+                {'category': 'events', 'name': 'failure', 'value': failures},
+                {'category': 'events', 'name': 'total', 'value': len(events)},
+            ], 'href': f'/pdb/query/v4/reports/{report_hash}/metrics'},
+            'logs': {'data': logs, 'href': f'/pdb/query/v4/reports/{report_hash}/logs'},
+            'resource_events': {'href': f'/pdb/query/v4/reports/{report_hash}/events'},
+        }
+
+    def fact_rows(self):
+        """Rows of the facts endpoint."""
+        for certname, (environment, facts) in self.facts.items():
+            for name, value in facts.items():
+                yield {'certname': certname, 'environment': environment,
+                       'name': name, 'value': value}
+
+    def factset_rows(self):
+        nodes = {node['certname']: node for node in self.nodes}
+        for certname, (environment, facts) in self.facts.items():
+            yield {
+                'certname': certname,
+                'environment': environment,
+                'timestamp': nodes[certname]['facts_timestamp'],
+                'producer_timestamp': nodes[certname]['facts_timestamp'],
+                'producer': 'puppet.example.com',
+                'hash': digest('factset', certname),
+                'facts': {
+                    'data': [{'name': name, 'value': value}
+                             for name, value in facts.items()],
+                    'href': f'/pdb/query/v4/factsets/{certname}/facts',
+                },
+            }
+
+    def inventory_rows(self):
+        nodes = {node['certname']: node for node in self.nodes}
+        for certname, (environment, facts) in self.facts.items():
+            yield {
+                'certname': certname,
+                'environment': environment,
+                'timestamp': nodes[certname]['facts_timestamp'],
+                'facts': facts,
+                'trusted': facts['trusted'],
+            }
+
+    def fact_content_rows(self):
+        """Rows of the fact-contents endpoint: one per leaf value."""
+        for certname, (environment, facts) in self.facts.items():
+            for name, value in facts.items():
+                for path, leaf in walk(value, [name]):
+                    yield {'certname': certname, 'environment': environment,
+                           'name': name, 'path': path, 'value': leaf}
+
+    @lru_cache(maxsize=None)
+    def fact_paths(self) -> list:
+        """Rows of the fact-paths endpoint."""
+        paths = {}
+        for _, facts in self.facts.values():
+            for name, value in facts.items():
+                for path, node_value in walk(value, [name], leaves_only=False):
+                    paths[tuple(path)] = fact_type(node_value)
+        return [{'path': list(path), 'type': type_} for path, type_ in sorted(
+            paths.items(), key=lambda item: [str(part) for part in item[0]])]
+
+    @lru_cache(maxsize=64)
+    def catalog(self, certname: str) -> dict:
+        node = next(node for node in self.nodes if node['certname'] == certname)
+        environment = node['catalog_environment']
+        generator = random.Random(certname)
+        classes = generator.sample(CLASSES, min(len(CLASSES), 8))
+
+        resources = [self._resource(certname, environment, 'Class', name, ['class'])
+                     for name in ['Settings', 'main'] + classes]
+        edges = []
+        for number in range(max(self.num_resources - len(resources), 0)):
+            containing_class = classes[number % len(classes)]
+            resource_type = RESOURCE_TYPES[number % len(RESOURCE_TYPES)]
+            title = f'/etc/{containing_class.lower().replace("::", "/")}/{number}'
+            resources.append(self._resource(certname, environment, resource_type, title,
+                                            [resource_type.lower(), containing_class.lower()]))
+            edges.append({
+                'certname': certname,
+                'relationship': 'contains',
+                'source_type': 'Class',
+                'source_title': containing_class,
+                'target_type': resource_type,
+                'target_title': title,
+            })
+
+        return {
+            'certname': certname,
+            'environment': environment,
+            'version': str(int(self.now.timestamp())),
+            'transaction_uuid': digest('transaction', certname),
+            'catalog_uuid': digest('catalog', certname),
+            'code_id': None,
+            'job_id': None,
+            'hash': digest('catalog-hash', certname),
+            'producer': 'puppet.example.com',
+            'producer_timestamp': node['catalog_timestamp'],
+            'resources': {'data': resources, 'href': f'/pdb/query/v4/catalogs/{certname}/resources'},
+            'edges': {'data': edges, 'href': f'/pdb/query/v4/catalogs/{certname}/edges'},
+        }
+
+    @staticmethod
+    def _resource(certname, environment, type_, title, tags):
+        return {
+            'certname': certname,
+            'environment': environment,
+            'resource': digest('resource', certname, type_, title),
+            'type': type_,
+            'title': title,
+            'tags': tags,
+            'exported': False,
+            'file': '/etc/puppetlabs/code/environments/production/site/profile/manifests/init.pp',
+            'line': 10,
+            'parameters': {'ensure': 'present', 'owner': 'root', 'mode': '0644'},
+        }
+
+    def resource_rows(self):
+        for node in self.nodes:
+            yield from self.catalog(node['certname'])['resources']['data']
+
+
+def walk(value, path, leaves_only=True):
+    """Yield the (path, value) of the nested values of a fact."""
+    if isinstance(value, dict) and value:
+        if not leaves_only:
+            yield path, value
+        for key, child in value.items():
+            yield from walk(child, path + [key], leaves_only)
+    elif isinstance(value, list) and value:
+        if not leaves_only:
+            yield path, value
+        for index, child in enumerate(value):
+            yield from walk(child, path + [index], leaves_only)
+    else:
+        yield path, value
+
+
+def fact_type(value) -> str:
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, dict):
+        return 'map'
+    if isinstance(value, list):
+        return 'array'
+    if value is None:
+        return 'null'
+    return 'string'
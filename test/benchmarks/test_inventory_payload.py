@@ -0,0 +1,60 @@
+"""Compare the size and the parse time of the PuppetDB responses with the
+facts of the inventory: the whole base facts (f.e. all of `networking` for
+`networking.ip`) and the sub-paths projected by the inventory endpoint.
+
+The parse time is reported as the latency, the request time as the time
+spent in PuppetDB and the size of the response body as the body size."""
+import json
+import os
+import statistics
+import time
+
+import pytest
+import requests
+from pypuppetdb.QueryBuilder import EqualsOperator, OrOperator
+
+from puppetboard.views.inventory import inventory_facts, inventory_query
+from test.benchmarks.conftest import RESULTS
+
+
+def base_facts_query(fact_names):
+    query = OrOperator()
+    query.add([EqualsOperator('name', name)
+               for name in sorted({name.split('.')[0] for name in fact_names})])
+    return 'facts', query
+
+
+def projected_query(fact_names):
+    return 'inventory', inventory_query(fact_names)
+
+
+@pytest.mark.parametrize('build_query', [base_facts_query, projected_query],
+                         ids=['inventory_base_facts', 'inventory_projection'])
+def test_inventory_payload(request, fake_puppetdb_port, build_query):
+    _, fact_names = inventory_facts()
+    endpoint, query = build_query(fact_names)
+    url = f'http://127.0.0.1:{fake_puppetdb_port}/pdb/query/v4/{endpoint}'
+    rounds = int(os.getenv('BENCHMARK_ROUNDS', '3'))
+
+    latencies = []
+    parse_times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = requests.get(url, params={'query': str(query)}, timeout=60)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        start = time.perf_counter()
+        rows = json.loads(response.content)
+        parse_times.append(time.perf_counter() - start)
+
+    assert rows
+    RESULTS.append({
+        'scenario': request.node.callspec.id,
+        'url': f'{endpoint}: {len(rows)} rows',
+        'median_ms': statistics.median(parse_times) * 1000,
+        'max_ms': max(parse_times) * 1000,
+        'peak_memory_kb': 0.0,
+        'puppetdb_calls': 1,
+        'puppetdb_ms': statistics.median(latencies) * 1000,
+        'response_kb': len(response.content) / 1024,
+    })
@@ -0,0 +1,49 @@
+"""Compare the time to build the links of the rows of a table with
+url_for() and with a UrlTemplate, for BENCHMARK_NODES * 20 rows."""
+import os
+import statistics
+import time
+
+import pytest
+from flask import url_for
+
+from puppetboard import app
+from puppetboard.utils import UrlTemplate
+from test.benchmarks.conftest import RESULTS, fleet_parameters
+
+
+def with_url_for(certnames):
+    return [url_for('node', env='production', node_name=certname)
+            for certname in certnames]
+
+
+def with_url_template(certnames):
+    node_url = UrlTemplate('node', 'node_name', env='production')
+    return [node_url(node_name=certname) for certname in certnames]
+
+
+@pytest.mark.parametrize('build_links', [with_url_for, with_url_template],
+                         ids=['links_url_for', 'links_url_template'])
+def test_links(request, build_links):
+    certnames = [f'node-{i}.example.com' for i in range(fleet_parameters()['nodes'] * 20)]
+    rounds = int(os.getenv('BENCHMARK_ROUNDS', '3'))
+
+    with app.app.test_request_context():
+        expected = with_url_for(certnames)
+        latencies = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            links = build_links(certnames)
+            latencies.append(time.perf_counter() - start)
+
+    assert links == expected
+    RESULTS.append({
+        'scenario': request.node.callspec.id,
+        'url': f'{len(certnames)} links',
+        'median_ms': statistics.median(latencies) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'peak_memory_kb': 0.0,
+        'puppetdb_calls': 0,
+        'puppetdb_ms': 0.0,
+        'response_kb': 0.0,
+    })
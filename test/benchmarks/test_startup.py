@@ -0,0 +1,72 @@
+"""Time to load the application, f.e. by a gunicorn --preload master, when
+PuppetDB accepts the connections but does not answer.
+
+The target can be changed with BENCHMARK_STARTUP_TARGET (in seconds), to
+keep the cold starts of the containers fast enough for autoscaling."""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from test.benchmarks.conftest import RESULTS
+
+LOAD_APP = '''
+import json, resource, time
+start = time.perf_counter()
+import puppetboard.app
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+@pytest.fixture
+def unresponsive_puppetdb():
+    # the connections wait in the backlog, so the requests hang until they time out
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def load_app(settings: Path) -> dict:
+    env = {**os.environ, 'PUPPETBOARD_SETTINGS': str(settings)}
+    process = subprocess.run([sys.executable, '-c', LOAD_APP], env=env,
+                             capture_output=True, text=True, timeout=60,
+                             cwd=Path(__file__).parents[2], check=True)
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def test_startup(tmp_path, unresponsive_puppetdb):
+    settings = tmp_path / 'settings.py'
+    settings.write_text(f'SECRET_KEY = "benchmark"\n'
+                        f'PUPPETDB_HOST = "127.0.0.1"\n'
+                        f'PUPPETDB_PORT = {unresponsive_puppetdb}\n'
+                        f'PUPPETDB_VERSION_CHECK = "background"\n')
+    rounds = int(os.getenv('BENCHMARK_ROUNDS', '3'))
+    target = float(os.getenv('BENCHMARK_STARTUP_TARGET', '5'))
+
+    loads = [load_app(settings) for _ in range(rounds)]
+    seconds = [load['seconds'] for load in loads]
+
+    RESULTS.append({
+        'scenario': 'startup',
+        'url': 'import puppetboard.app',
+        'median_ms': statistics.median(seconds) * 1000,
+        'max_ms': max(seconds) * 1000,
+        # the resident memory of the process, not only the Python allocations
+        'peak_memory_kb': max(load['max_rss_kb'] for load in loads),
+        'puppetdb_calls': 0,
+        'puppetdb_ms': 0.0,
+        'response_kb': 0.0,
+    })
+    assert max(seconds) < target
@@ -0,0 +1,78 @@
+import pytest
+
+from puppetboard import app
+from test.benchmarks.conftest import fleet_parameters
+
+NODE = 'node00000.example.com'
+OTHER_NODE = 'node00003.example.com'
+
+SCENARIOS = {
+    'index': '/',
+    'index_all_envs': '/%2A/',
+    'radiator': '/radiator',
+    'nodes': '/nodes',
+    'node': f'/node/{NODE}',
+    'node_facts': f'/node/{NODE}/facts/json',
+    'facts': '/facts',
+    'fact': '/fact/osfamily',
+    'fact_ajax': '/fact/osfamily/json',
+    'fact_ajax_page': '/fact/ipaddress/json?draw=1&start=0&length=100'
+                      '&order[0][column]=1&order[0][dir]=asc&search[value]=10',
+    'fact_value_ajax': '/fact/osfamily/RedHat/json',
+    'fact_structured_ajax': '/fact/networking.ip/json',
+    'fact_structured_value_ajax': '/fact/os.selinux.enabled/True/json',
+    'fact_children': '/fact/networking.interfaces/children/json',
+    'fact_distribution': '/fact/memorysize_mb/distribution',
+    'inventory': '/inventory',
+    'inventory_ajax': '/inventory/json',
+    'inventory_ajax_page': '/inventory/json?draw=1&start=0&length=100'
+                           '&order[0][column]=1&order[0][dir]=asc&search[value]=10',
+    'inventory_export_csv': '/inventory/export.csv',
+    'inventory_export_ndjson': '/inventory/export.ndjson',
+    'reports': '/reports',
+    'reports_ajax': '/reports/json?draw=1&start=0&length=100',
+    'node_reports_ajax': f'/reports/{NODE}/json?draw=1&start=0&length=100',
+    'failures': '/failures',
+    'catalogs': '/catalogs',
+    'catalogs_ajax': '/catalogs/json?draw=1&start=0&length=100',
+    'catalog': f'/catalog/{NODE}',
+    'catalog_compare': f'/catalogs/compare/{NODE}...{OTHER_NODE}',
+    'classes': '/classes',
+    'classes_ajax': '/classes/json?draw=1',
+    'class_resource_ajax': '/class_resource/Ntp/json?draw=1',
+    'metrics': '/metrics',
+    'metric': '/metric/puppetlabs.puppetdb.population:name=num-nodes',
+    'daily_reports_chart': '/daily_reports_chart.json',
+}
+
+
+@pytest.mark.parametrize('url', SCENARIOS.values(), ids=SCENARIOS.keys())
+def test_view(benchmark, url):
+    result = benchmark(url)
+    assert result['puppetdb_calls'] > 0
+
+
+def test_report(benchmark, fake_puppetdb):
+    report = fake_puppetdb._query('reports', query=f'["=", "certname", "{NODE}"]',
+                                  limit=1)[0]
+    benchmark(f'/report/{NODE}/{report["hash"]}')
+
+
+def test_catalogs_use_the_fake_puppetdb(fake_puppetdb):
+    catalog = fake_puppetdb.catalog(NODE)
+    assert catalog.node == NODE
+    assert len(list(catalog.get_resources())) == fleet_parameters()['resources']
+
+
+def test_inventory_ajax_templates(benchmark, mocker):
+    # every column rendered through a template of INVENTORY_FACT_TEMPLATES
+    mocker.patch.dict(app.app.config, {
+        'INVENTORY_FACTS': [('Hostname', 'trusted'), ('OS', 'os'),
+                            ('Kernel', 'kernelrelease')],
+        'INVENTORY_FACT_TEMPLATES': {
+            **app.app.config['INVENTORY_FACT_TEMPLATES'],
+            'kernelrelease': '<code>{{ value }}</code>',
+        },
+    })
+    result = benchmark('/inventory/json')
+    assert result['response_kb'] > 0
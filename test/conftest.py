@@ -4,6 +4,9 @@ import pytest
 from pypuppetdb.types import Node
 
 from puppetboard import app
+from puppetboard import fact_index
+from puppetboard.core import get_cache
+from puppetboard.views import inventory
 
 
 @pytest.fixture(autouse=True)
@@ -12,6 +15,31 @@ def mock_puppetdb_version(mocker):
                                return_value='5.9.999')
 
 
+@pytest.fixture(autouse=True)
+def no_environments_cache(mocker):
+    # the environments list is cached per worker, do not leak it between tests
+    return mocker.patch.dict(app.app.config, {'ENVIRONMENTS_CACHE_TTL': 0})
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # the cache is shared by the whole session, f.e. the fact index
+    yield
+    get_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def no_fact_trie(mocker):
+    # the fact paths trie is kept per worker
+    return mocker.patch.dict(fact_index.FACT_TRIE, clear=True)
+
+
+@pytest.fixture(autouse=True)
+def no_inventory_rows(mocker):
+    # the rendered rows of the inventory are kept per worker
+    return mocker.patch.dict(inventory.INVENTORY_ROWS, clear=True)
+
+
 @pytest.fixture
 def mock_puppetdb_environments(mocker):
     environments = [
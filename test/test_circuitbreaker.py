@@ -0,0 +1,133 @@
+import pytest
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ReadTimeout
+
+from puppetboard import app
+from puppetboard.circuitbreaker import (CircuitBreaker, CircuitOpenError,
+                                        PuppetDBAdapter)
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.patch('puppetboard.circuitbreaker.time.monotonic')
+    clock.return_value = 1000.0
+    return clock
+
+
+def record(breaker, failed, count=1, duration=0.1):
+    for _ in range(count):
+        breaker.before_call()
+        breaker.after_call(failed, duration)
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = CircuitBreaker(min_calls=5)
+    record(breaker, True, count=4)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_opens_on_error_rate(clock):
+    breaker = CircuitBreaker(min_calls=4, threshold=0.5)
+    record(breaker, False, count=2)
+    record(breaker, True, count=2)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = CircuitBreaker(min_calls=2, threshold=0.5, slow_call=1)
+    record(breaker, False, count=2, duration=5)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = CircuitBreaker(window=60, min_calls=4, threshold=0.5)
+    record(breaker, True, count=3)
+    clock.return_value += 61
+    record(breaker, False, count=3)
+    record(breaker, True)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_closes(clock):
+    breaker = CircuitBreaker(min_calls=1, reset_timeout=30)
+    record(breaker, True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.return_value += 31
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # only a single probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.after_call(False, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_half_open_probe_reopens(clock):
+    breaker = CircuitBreaker(min_calls=1, reset_timeout=30)
+    record(breaker, True)
+
+    clock.return_value += 31
+    record(breaker, True)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def make_response(status_code):
+    response = Response()
+    response.status_code = status_code
+    return response
+
+
+def test_adapter_counts_server_errors(mocker, clock):
+    mocker.patch.object(HTTPAdapter, 'send',
+                        return_value=make_response(503))
+    breaker = CircuitBreaker(min_calls=2)
+    adapter = PuppetDBAdapter(breaker=breaker)
+
+    assert adapter.send(PreparedRequest()).status_code == 503
+    assert adapter.send(PreparedRequest()).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        adapter.send(PreparedRequest())
+    assert HTTPAdapter.send.call_count == 2
+
+
+def test_adapter_counts_exceptions(mocker, clock):
+    mocker.patch.object(HTTPAdapter, 'send', side_effect=ReadTimeout)
+    breaker = CircuitBreaker(min_calls=1)
+    adapter = PuppetDBAdapter(breaker=breaker)
+
+    with pytest.raises(ReadTimeout):
+        adapter.send(PreparedRequest())
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_adapter_without_breaker(mocker):
+    mocker.patch.object(HTTPAdapter, 'send',
+                        return_value=make_response(500))
+    adapter = PuppetDBAdapter()
+
+    for _ in range(20):
+        assert adapter.send(PreparedRequest()).status_code == 500
+
+
+def test_circuit_open_is_a_connection_error():
+    assert issubclass(CircuitOpenError, ConnectionError)
+
+
+def test_puppetdb_session_uses_adapter():
+    adapter = app.puppetdb.session.get_adapter('http://puppetdb:8080')
+    assert isinstance(adapter, PuppetDBAdapter)
+    assert adapter.max_retries.total == app.app.config['PUPPETDB_RETRIES']
+    assert adapter.max_retries.read == 0
@@ -0,0 +1,110 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Response
+
+from puppetboard import app, compression
+from puppetboard.compression import (compress_response, compress_stream,
+                                     get_compressor)
+
+
+@pytest.fixture(autouse=True)
+def no_brotli(mocker):
+    # brotli is optional, test with gzip only
+    return mocker.patch.object(compression, 'brotli', None)
+
+
+def compress(response, accept_encoding='gzip, deflate'):
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    with app.app.test_request_context(headers=headers):
+        return compress_response(response)
+
+
+def test_compress():
+    body = '<tr><td>node</td></tr>' * 100
+    response = compress(Response(body, mimetype='text/html'))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert int(response.headers['Content-Length']) < len(body)
+    assert gzip.decompress(response.get_data()) == body.encode()
+
+
+def test_no_accept_encoding():
+    response = compress(Response('a' * 1000, mimetype='text/html'),
+                        accept_encoding=None)
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_small_bodies_are_not_compressed():
+    response = compress(Response('{"draw": 1}', mimetype='application/json'))
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_binary_content_is_not_compressed():
+    response = compress(Response(b'\x89PNG' * 1000, mimetype='image/png'))
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compression_disabled(mocker):
+    mocker.patch.dict(app.app.config, {'COMPRESSION_ENABLED': False})
+    response = compress(Response('a' * 1000, mimetype='text/html'))
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_etag_becomes_weak():
+    response = Response('a' * 1000, mimetype='application/json')
+    response.add_etag()
+    etag, _ = response.get_etag()
+
+    response = compress(response)
+
+    assert response.get_etag() == (etag, True)
+
+
+def test_compress_stream():
+    chunks = ['<html>', '', '<body>' * 100, '</body></html>']
+    compressed = list(compress_stream(iter(chunks), get_compressor('gzip', 6), flush_size=1))
+
+    # one compressed chunk per non empty chunk, plus the gzip trailer
+    assert len(compressed) == 4
+    # each chunk can be decompressed as soon as it is received
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(compressed[0]) == b'<html>'
+    assert gzip.decompress(b''.join(compressed)) == ''.join(chunks).encode()
+
+
+def test_compress_stream_buffers_small_chunks(mocker):
+    mocker.patch('puppetboard.compression.time.monotonic', return_value=0)
+    chunks = [f'<tr><td>node-{i}</td><td>changed</td></tr>\n' for i in range(5000)]
+    body = ''.join(chunks).encode()
+    compressed = list(compress_stream(iter(chunks), get_compressor('gzip', 6),
+                                      flush_size=16384))
+
+    # flushed every 16 KiB only
+    assert len(compressed) <= len(body) // 16384 + 2
+    assert gzip.decompress(b''.join(compressed)) == body
+    # about the size of the body compressed at once
+    assert len(b''.join(compressed)) < len(gzip.compress(body)) * 1.2
+
+
+def test_compress_stream_flushes_slow_chunks(mocker):
+    mocker.patch('puppetboard.compression.time.monotonic', side_effect=[0, 1, 1, 2, 2])
+    compressed = list(compress_stream(iter(['<html>', '<body>']), get_compressor('gzip', 6)))
+
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(compressed[0]) == b'<html>'
+
+
+def test_streamed_view_is_compressed(client, mock_puppetdb_environments,
+                                     mock_puppetdb_default_nodes):
+    rv = client.get('/nodes', headers={'Accept-Encoding': 'gzip'})
+
+    assert rv.status_code == 200
+    assert rv.is_streamed
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in rv.headers
+    assert b'node-failed' in gzip.decompress(rv.data)
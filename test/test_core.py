@@ -1,8 +1,15 @@
+import json
+import threading
+import time
+from functools import partial
 from textwrap import dedent
 
 import pytest
+from requests.exceptions import ConnectionError, HTTPError
+from werkzeug.exceptions import InternalServerError
 
-from puppetboard.core import get_friendly_error
+from puppetboard import app, core
+from puppetboard.core import get_friendly_error, query_all
 
 
 @pytest.mark.parametrize("raw_message,friendly_message", [
@@ -39,3 +46,203 @@ def test_get_friendly_error(raw_message, friendly_message):
     raw_message = dedent(raw_message)
     friendly_message = dedent(friendly_message).strip()
     assert get_friendly_error("Puppet", raw_message, "foo.bar.com") == friendly_message
+
+
+def test_query_all_keeps_order_and_consumes_generators():
+    def slow(value):
+        time.sleep(0.05)
+        return value
+
+    def gen():
+        yield from ['a', 'b']
+
+    with app.app.test_request_context():
+        result = query_all(partial(slow, 1), gen, partial(slow, 3))
+
+    assert result == [1, ['a', 'b'], 3]
+
+
+def test_query_all_runs_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+
+    with app.app.test_request_context():
+        # would deadlock (and time out) if the calls ran one after another
+        result = query_all(barrier.wait, barrier.wait, barrier.wait)
+
+    assert sorted(result) == [0, 1, 2]
+
+
+def test_query_all_reraises_errors():
+    def fail():
+        raise HTTPError('boom')
+
+    with app.app.test_request_context():
+        with pytest.raises(HTTPError):
+            query_all(partial(time.sleep, 0), fail)
+
+
+def test_query_all_deadline(mocker):
+    mocker.patch.dict(app.app.config, {'PUPPETDB_QUERY_DEADLINE': 0.01})
+
+    with app.app.test_request_context():
+        with pytest.raises(TimeoutError):
+            query_all(partial(time.sleep, 0.5))
+
+
+@pytest.fixture
+def environments_cache(mocker):
+    mocker.patch.dict(app.app.config, {'ENVIRONMENTS_CACHE_TTL': 60})
+    return mocker.patch.dict(core.ENVIRONMENTS,
+                             {'names': None, 'fetched_at': 0.0, 'refreshing': False})
+
+
+def wait_for_refresh():
+    for _ in range(100):
+        if not core.ENVIRONMENTS['refreshing']:
+            return
+        time.sleep(0.01)
+
+
+def test_environment_names_are_cached(environments_cache, mock_puppetdb_environments):
+    with app.app.test_request_context():
+        assert core.environment_names() == ['production', 'staging']
+        assert core.environment_names() == ['production', 'staging']
+
+    assert mock_puppetdb_environments.call_count == 1
+
+
+def test_environment_names_refreshed_in_background(environments_cache, mocker):
+    mock = mocker.patch.object(app.puppetdb, 'environments',
+                               return_value=[{'name': 'production'}, {'name': 'new'}])
+    core.ENVIRONMENTS.update(names=['production'], fetched_at=time.monotonic() - 3600)
+
+    with app.app.test_request_context():
+        # the stale list is served while the fresh one is fetched
+        assert core.environment_names() == ['production']
+        wait_for_refresh()
+        assert core.environment_names() == ['new', 'production']
+
+    assert mock.call_count == 1
+
+
+def test_environment_names_keep_stale_list_on_errors(environments_cache, mocker):
+    mocker.patch.object(app.puppetdb, 'environments', side_effect=ConnectionError('down'))
+    core.ENVIRONMENTS.update(names=['production'], fetched_at=time.monotonic() - 3600)
+
+    with app.app.test_request_context():
+        assert core.environment_names() == ['production']
+        wait_for_refresh()
+        assert core.environment_names() == ['production']
+
+
+def test_environments_memoized_per_request(mock_puppetdb_environments):
+    with app.app.test_request_context():
+        envs = core.environments()
+        assert core.environments() is envs
+        assert list(envs) == ['All Environments', 'production', 'staging']
+
+    assert mock_puppetdb_environments.call_count == 1
+
+
+@pytest.fixture
+def db_version(mocker):
+    return mocker.patch.dict(core.DB_VERSION,
+                             {'checked': False, 'error': None, 'checking_pid': None})
+
+
+def test_db_version_checked_once(db_version, mocker):
+    mock = mocker.patch.object(app.puppetdb, 'current_version', return_value='8.1.0')
+
+    assert core.check_db_version_once() is None
+    assert core.check_db_version_once() is None
+
+    assert mock.call_count == 1
+
+
+def test_db_version_unreachable_checked_again(db_version, mocker):
+    mock = mocker.patch.object(app.puppetdb, 'current_version',
+                               side_effect=[ConnectionError('down'), '4.4.0'])
+
+    assert core.check_db_version_once() is None
+    assert 'minimum supported version' in core.check_db_version_once()
+    assert mock.call_count == 2
+
+
+def test_db_version_checked_in_background(db_version, mocker):
+    mocker.patch.object(app.puppetdb, 'current_version', return_value='4.4.0')
+
+    core.start_db_version_check()
+    for _ in range(100):
+        if core.DB_VERSION['checked']:
+            break
+        time.sleep(0.01)
+
+    assert core.DB_VERSION['error'] is not None
+    assert core.DB_VERSION['checking_pid'] is None
+
+
+@pytest.mark.parametrize('mode', ['first_request', 'background'])
+def test_unsupported_db_version_fails_requests(db_version, mocker, mode):
+    mocker.patch.dict(app.app.config, {'PUPPETDB_VERSION_CHECK': mode})
+    core.DB_VERSION.update(checked=True, error='The minimum supported version...')
+
+    with app.app.test_request_context('/nodes'):
+        with pytest.raises(InternalServerError):
+            core.require_supported_db_version()
+
+    with app.app.test_request_context('/status'):
+        core.require_supported_db_version()
+
+
+def test_first_request_waits_for_the_db_version(db_version, mocker):
+    mocker.patch.dict(app.app.config, {'PUPPETDB_VERSION_CHECK': 'first_request'})
+    mock = mocker.patch.object(app.puppetdb, 'current_version', return_value='8.1.0')
+
+    with app.app.test_request_context('/nodes'):
+        core.require_supported_db_version()
+
+    assert mock.call_count == 1
+    assert core.DB_VERSION['checked']
+
+
+def test_stream_json_table():
+    rows = ([i, f'node-{i}'] for i in range(100))
+
+    with app.app.test_request_context():
+        response = core.stream_json_table(3, rows, chunk_size=100,
+                                          chart=[{'label': 'a', 'value': 1}])
+        chunks = list(response.response)
+
+    assert response.is_streamed
+    assert len(chunks) > 10
+    table = json.loads(''.join(chunks))
+    assert table['draw'] == 3
+    assert table['recordsTotal'] == table['recordsFiltered'] == 100
+    assert table['data'][99] == [99, 'node-99']
+    assert table['chart'] == [{'label': 'a', 'value': 1}]
+
+
+def test_stream_json_table_with_total():
+    with app.app.test_request_context():
+        response = core.stream_json_table(1, iter([]), total=500)
+        table = json.loads(response.get_data())
+
+    assert table == {'draw': 1, 'data': [], 'recordsTotal': 500, 'recordsFiltered': 500}
+
+
+def test_stream_json_table_with_filtered_total():
+    with app.app.test_request_context():
+        response = core.stream_json_table(1, iter([]), total=500, filtered=3)
+        table = json.loads(response.get_data())
+
+    assert table['recordsTotal'] == 500
+    assert table['recordsFiltered'] == 3
+
+
+def test_query_page():
+    with app.app.test_request_context():
+        assert core.query_page(lambda: ['row'], lambda: [{'count': 3}]) == (['row'], 3, 3)
+        assert core.query_page(lambda: ['row'], lambda: [{'count': 3}],
+                               lambda: [{'count': 500}]) == (['row'], 3, 500)
+        # no count row when nothing matches
+        assert core.query_page(lambda: [], lambda: []) == ([], 0, 0)
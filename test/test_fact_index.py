@@ -0,0 +1,100 @@
+import json
+
+from puppetboard import app, fact_index
+from puppetboard.fact_index import build_fact_index, fact_children
+from test import MockDbQuery
+
+
+def test_build_fact_index(mocker):
+    query_data = {
+        'fact-paths': [[
+            {'path': ['os', 'release'], 'type': 'map'},
+            {'path': ['os'], 'type': 'map'},
+            {'path': ['os', 'family'], 'type': 'string'},
+            {'path': ['uptime_seconds'], 'type': 'integer'},
+            {'path': ['partitions'], 'type': 'map'},
+        ]],
+        'facts': [[{'name': 'os'}, {'name': 'uptime_seconds'}]],
+    }
+    dbquery = MockDbQuery(query_data)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    with app.app.test_request_context():
+        index = build_fact_index('production')
+
+    assert index == {
+        'os': {'type': 'map', 'children': ['family', 'release']},
+        'uptime_seconds': {'type': 'integer', 'children': []},
+    }
+    # only the first two levels of the paths are fetched
+    paths_query = mock.call_args_list[0].kwargs['query']
+    assert json.loads(str(paths_query)) == [
+        'or', ['~>', 'path', ['.*']], ['~>', 'path', ['.*', '.*']]]
+
+
+def test_build_fact_index_of_all_environments(mocker):
+    query_data = {
+        'fact-paths': [[
+            {'path': ['os'], 'type': 'map'},
+            {'path': ['partitions'], 'type': 'map'},
+        ]],
+    }
+    dbquery = MockDbQuery(query_data)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    with app.app.test_request_context():
+        index = build_fact_index('*')
+
+    assert list(index) == ['os', 'partitions']
+    assert mock.call_count == 1
+
+
+def test_fact_children_are_cached(mocker):
+    rows = [
+        {'path': ['networking', 'interfaces'], 'type': 'map'},
+        {'path': ['networking', 'interfaces', 'eth0'], 'type': 'map'},
+        {'path': ['networking', 'ip'], 'type': 'string'},
+        {'path': ['networking', 'mounts', '/boot'], 'type': 'map'},
+        {'path': ['networking', 'mounts'], 'type': 'map'},
+    ]
+    mock = mocker.patch.object(app.puppetdb, 'fact_paths', return_value=rows)
+
+    with app.app.test_request_context():
+        children = fact_children(['networking'])
+        assert fact_children(['networking']) == children
+
+    assert children == [('interfaces', True), ('ip', False), ('mounts', False)]
+    assert mock.call_count == 1
+    assert json.loads(str(mock.call_args.kwargs['query'])) == [
+        'or',
+        ['~>', 'path', ['^networking$', '.*']],
+        ['~>', 'path', ['^networking$', '.*', '.*']]]
+
+
+def test_fact_children_refresh_keeps_the_lower_levels(mocker):
+    mocker.patch.dict(app.app.config, {'FACT_INDEX_TTL': 0})
+    mock = mocker.patch.object(app.puppetdb, 'fact_paths', side_effect=[
+        [{'path': ['os', 'release'], 'type': 'map'},
+         {'path': ['os', 'release', 'full'], 'type': 'string'}],
+        [{'path': ['os', 'release', 'full'], 'type': 'string'}],
+        [{'path': ['os', 'release'], 'type': 'map'},
+         {'path': ['os', 'release', 'full'], 'type': 'string'}],
+    ])
+
+    with app.app.test_request_context():
+        fact_children(['os'])
+        fact_children(['os', 'release'])
+        fact_children(['os'])
+
+    release = fact_index.FACT_TRIE['root']['children']['os']['children']['release']
+    assert list(release['children']) == ['full']
+    assert mock.call_count == 3
+
+
+def test_fact_children_of_unknown_facts_are_not_stored(mocker):
+    mocker.patch.object(app.puppetdb, 'fact_paths', return_value=[])
+
+    with app.app.test_request_context():
+        assert fact_children(['does', 'not', 'exist']) == []
+
+    assert 'root' not in fact_index.FACT_TRIE
@@ -0,0 +1,284 @@
+import json
+import os
+import stat
+import time
+
+import pytest
+
+from puppetboard import app, core, utils
+from puppetboard.replica import Replica
+from puppetboard.schedulers.replica import sync_replica
+
+
+def node_row(certname, timestamp='2024-01-01T10:00:00.000Z', env='production',
+             status='changed'):
+    return {
+        'certname': certname,
+        'deactivated': None,
+        'expired': None,
+        'report_timestamp': timestamp,
+        'facts_timestamp': timestamp,
+        'catalog_timestamp': timestamp,
+        'latest_report_status': status,
+        'latest_report_hash': f'hash-{certname}-{timestamp}',
+        'latest_report_noop': False,
+        'latest_report_noop_pending': False,
+        'report_environment': env,
+        'catalog_environment': env,
+        'facts_environment': env,
+        'cached_catalog_status': 'not_used',
+    }
+
+
+def factset_row(node, facts):
+    return {
+        'certname': node['certname'],
+        'environment': node['facts_environment'],
+        'timestamp': node['facts_timestamp'],
+        'facts': {'data': [{'name': name, 'value': value} for name, value in facts.items()]},
+    }
+
+
+def report_row(node, successes=1):
+    return {
+        'certname': node['certname'],
+        'hash': node['latest_report_hash'],
+        'environment': node['report_environment'],
+        'status': node['latest_report_status'],
+        'noop': False,
+        'end_time': node['report_timestamp'],
+        'metrics': {'data': [
+            {'category': 'events', 'name': 'success', 'value': successes},
+            {'category': 'events', 'name': 'failure', 'value': 0},
+            {'category': 'resources', 'name': 'skipped', 'value': 2},
+        ]},
+    }
+
+
+def certnames_in(query):
+    # the values of the ["in", "certname", ["array", [...]]] queries
+    if query[:2] == ['in', 'certname']:
+        yield from query[2][1]
+    for operand in query:
+        if isinstance(operand, list):
+            yield from certnames_in(operand)
+
+
+class FakePuppetDB(object):
+    """Answers the queries of the sync from a list of nodes, with their
+    facts and latest reports, and records them."""
+
+    def __init__(self, nodes, facts):
+        self.nodes = nodes
+        self.facts = facts
+        self.queries = []
+
+    def _query(self, endpoint, query=None, **kwargs):
+        self.queries.append((endpoint, json.loads(str(query)) if query is not None else None))
+        certnames = {node['certname'] for node in self.nodes}
+        if endpoint == 'nodes' and str(query).startswith('["extract"'):
+            return [{'certname': certname} for certname in sorted(certnames)]
+        if endpoint == 'nodes':
+            if query is None:
+                return self.nodes
+            # ["or", [">", field, watermark], ...]
+            return [node for node in self.nodes
+                    if any(node[op[1]] is not None and node[op[1]] > op[2]
+                           for op in json.loads(str(query))[1:])]
+        wanted = set(certnames_in(json.loads(str(query))))
+        if endpoint == 'factsets':
+            return [factset_row(node, self.facts[node['certname']])
+                    for node in self.nodes if node['certname'] in wanted]
+        if endpoint == 'reports':
+            return [report_row(node) for node in self.nodes if node['certname'] in wanted]
+        raise AssertionError(endpoint)
+
+    def queried(self, endpoint):
+        return [query for queried, query in self.queries if queried == endpoint]
+
+
+@pytest.fixture
+def replica(tmp_path):
+    return Replica(str(tmp_path / 'replica' / 'replica.sqlite3'))
+
+
+@pytest.fixture
+def fleet():
+    nodes = [node_row('node1'), node_row('node2', env='dev', status='failed'),
+             node_row('node3')]
+    facts = {
+        'node1': {'os': {'name': 'Debian', 'family': 'Debian'}, 'kernel': 'Linux'},
+        'node2': {'os': {'name': 'RedHat', 'release': {'major': '9'}}, 'kernel': 'Linux'},
+        'node3': {'kernel': 'windows', 'processors': [1, 2]},
+    }
+    return FakePuppetDB(nodes, facts)
+
+
+def test_replica_is_private(replica):
+    assert stat.S_IMODE(os.stat(replica.path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(replica.path)).st_mode) == 0o700
+
+
+def test_replica_path_is_required():
+    utils.check_replica_path(False, None)
+    utils.check_replica_path(True, '/var/lib/puppetboard/replica.sqlite3')
+    with pytest.raises(SystemExit) as e:
+        utils.check_replica_path(True, None)
+    assert e.value.code == 1
+
+
+def test_sync(replica, fleet):
+    assert replica.synced_at() is None
+
+    result = replica.sync(fleet)
+
+    assert result == {'nodes': 3, 'factsets': 3, 'reports': 3, 'removed': 0}
+    assert fleet.queried('nodes')[0] is None
+    assert replica.synced_at() == pytest.approx(time.time(), abs=10)
+    assert replica.watermarks()['facts_timestamp'] == '2024-01-01T10:00:00.000Z'
+
+
+def test_sync_only_fetches_the_changed_nodes(replica, fleet):
+    replica.sync(fleet)
+    fleet.queries.clear()
+
+    # only the report of node2 is new
+    fleet.nodes[1]['report_timestamp'] = '2024-01-02T10:00:00.000Z'
+    fleet.nodes[1]['latest_report_hash'] = 'hash-new'
+
+    result = replica.sync(fleet, overlap=0)
+
+    assert result == {'nodes': 1, 'factsets': 0, 'reports': 1, 'removed': 0}
+    assert fleet.queried('nodes')[0] == [
+        'or',
+        ['>', 'facts_timestamp', '2024-01-01T10:00:00.000Z'],
+        ['>', 'report_timestamp', '2024-01-01T10:00:00.000Z'],
+        ['>', 'catalog_timestamp', '2024-01-01T10:00:00.000Z'],
+    ]
+    assert fleet.queried('factsets') == []
+    reports_query = fleet.queried('reports')[0]
+    assert ['in', 'certname', ['array', ['node2']]] in reports_query[2]
+    assert replica.watermarks()['report_timestamp'] == '2024-01-02T10:00:00.000Z'
+    assert replica.watermarks()['facts_timestamp'] == '2024-01-01T10:00:00.000Z'
+
+    # nothing changed
+    assert replica.sync(fleet, overlap=0)['nodes'] == 0
+
+
+def test_sync_fetches_the_nodes_stored_late(replica, fleet):
+    replica.sync(fleet)
+    fleet.nodes[0]['report_timestamp'] = '2024-01-01T11:00:00.000Z'
+    fleet.nodes[0]['latest_report_hash'] = 'hash-new'
+    replica.sync(fleet)
+    fleet.queries.clear()
+
+    # the report of node2, older than the one of node1, is stored by
+    # PuppetDB after the sync
+    fleet.nodes[1]['report_timestamp'] = '2024-01-01T10:58:00.000Z'
+    fleet.nodes[1]['latest_report_hash'] = 'hash-late'
+
+    result = replica.sync(fleet, overlap=300)
+
+    assert fleet.queried('nodes')[0][2] == ['>', 'report_timestamp', '2024-01-01T10:55:00.000Z']
+    # the nodes in the overlap are fetched again, but not their facts and reports
+    assert result == {'nodes': 3, 'factsets': 0, 'reports': 1, 'removed': 0}
+    reports_query = fleet.queried('reports')[0]
+    assert ['in', 'certname', ['array', ['node2']]] in reports_query[2]
+    node2 = [node for node in replica.nodes(None, 'dev')][0]
+    assert node2.latest_report_hash == 'hash-late'
+
+
+def test_sync_removes_the_inactive_nodes(replica, fleet):
+    replica.sync(fleet)
+    del fleet.nodes[0]
+
+    assert replica.sync(fleet)['removed'] == 1
+    assert [node.name for node in replica.nodes(None, '*')] == ['node2', 'node3']
+    assert {fact.node for fact in replica.facts('*', ['kernel'])} == {'node2', 'node3'}
+
+
+def test_nodes(replica, fleet):
+    replica.sync(fleet)
+
+    nodes = list(replica.nodes(None, 'production', with_status=True,
+                               with_event_numbers=True))
+    assert [node.name for node in nodes] == ['node1', 'node3']
+    assert nodes[0].events == {'subject': {'title': 'node1'}, 'successes': 1,
+                               'failures': 0, 'noops': 0, 'skips': 2}
+    # reported long ago
+    assert nodes[0].status == 'unreported'
+
+    nodes = list(replica.nodes(None, '*', unreported=24 * 365 * 1000, with_status=True,
+                               with_event_numbers=False))
+    assert [node.status for node in nodes] == ['changed', 'failed', 'changed']
+
+
+def test_facts(replica, fleet):
+    replica.sync(fleet)
+
+    facts = [(fact.node, fact.name, fact.value) for fact in replica.facts('production', {'os', 'kernel'})]
+    assert facts == [
+        ('node1', 'kernel', 'Linux'),
+        ('node1', 'os', {'name': 'Debian', 'family': 'Debian'}),
+        ('node3', 'kernel', 'windows'),
+    ]
+
+
+def test_fact_index(replica, fleet):
+    replica.sync(fleet)
+
+    assert replica.fact_index('*') == {
+        'kernel': {'type': 'string', 'children': []},
+        'os': {'type': 'map', 'children': ['family', 'name', 'release']},
+        'processors': {'type': 'array', 'children': []},
+    }
+    assert replica.fact_index('dev')['os'] == {'type': 'map', 'children': ['name', 'release']}
+
+
+def test_fresh_replica(mocker, replica, fleet):
+    mocker.patch.object(core, 'REPLICA', replica)
+    mocker.patch.dict(app.app.config, {'REPLICA_MAX_AGE': 600})
+    assert core.fresh_replica() is None
+
+    replica.sync(fleet)
+    assert core.fresh_replica() is replica
+
+    mocker.patch('puppetboard.core.time.time', return_value=time.time() + 601)
+    assert core.fresh_replica() is None
+
+
+def test_fresh_replica_disabled():
+    assert core.fresh_replica() is None
+
+
+def test_sync_replica_job(mocker, replica):
+    mocker.patch.object(core, 'REPLICA', replica)
+    sync = mocker.patch.object(replica, 'sync')
+
+    sync_replica()
+
+    sync.assert_called_once_with(app.puppetdb, overlap=300)
+
+
+def test_views_read_the_replica(client, mocker, replica, fleet,
+                                mock_puppetdb_environments):
+    replica.sync(fleet)
+    mocker.patch.object(core, 'REPLICA', replica)
+    nodes = mocker.patch.object(app.puppetdb, 'nodes')
+    facts = mocker.patch.object(app.puppetdb, 'facts')
+    mocker.patch.object(app.puppetdb, '_query', return_value=[{'count': 2}])
+
+    assert client.get('/radiator').status_code == 200
+    assert client.get('/').status_code == 200
+    rv = client.get('/nodes')
+    assert rv.status_code == 200
+    assert 'node1' in rv.get_data(as_text=True)
+
+    mocker.patch.dict(app.app.config, {'INVENTORY_FACTS': [('Hostname', 'fqdn'),
+                                                           ('Kernel', 'kernel')]})
+    rv = client.get('/inventory/json')
+    assert rv.status_code == 200
+    assert [row[1] for row in rv.json['data']] == ['Linux', 'windows']
+
+    assert not nodes.called
+    assert not facts.called
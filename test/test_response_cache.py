@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from puppetboard import app
+from puppetboard.core import get_cache
+from test import MockDbQuery
+
+
+@pytest.fixture
+def response_cache(mocker):
+    mocker.patch.dict(app.app.config, {'RESPONSE_CACHE': True})
+    with app.app.app_context():
+        get_cache().clear()
+    yield
+    with app.app.app_context():
+        get_cache().clear()
+
+
+@pytest.fixture
+def mock_facts(mocker, mock_puppetdb_environments):
+    facts = [{'certname': f'node-{i}', 'name': 'kernel',
+              'value': 'Linux', 'environment': 'production'}
+             for i in range(3)]
+    # enough responses for the views that should not be cached
+    dbquery = MockDbQuery({'facts': [list(facts) for _ in range(3)]})
+    return mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+
+def test_response_is_cached(client, response_cache, mock_facts):
+    first = client.get('/fact/kernel/json?draw=1')
+    second = client.get('/fact/kernel/json?draw=2&_=1234')
+
+    assert first.status_code == second.status_code == 200
+    assert mock_facts.call_count == 1
+    assert json.loads(first.data)['draw'] == 1
+    assert json.loads(second.data)['draw'] == 2
+    assert json.loads(first.data)['data'] == json.loads(second.data)['data']
+    # the same table, whatever the draw counter
+    assert first.headers['ETag'] == second.headers['ETag']
+
+
+def test_response_is_cached_per_arguments(client, response_cache, mock_facts):
+    client.get('/fact/kernel/json?draw=1')
+    client.get('/fact/kernel/json?draw=1&search[value]=node-1')
+    client.get('/%2A/fact/kernel/json?draw=1')
+
+    assert mock_facts.call_count == 3
+
+
+def test_not_modified(client, response_cache, mock_facts):
+    first = client.get('/fact/kernel/json')
+    etag = first.headers['ETag']
+    second = client.get('/fact/kernel/json',
+                        headers={'If-None-Match': etag})
+
+    assert second.status_code == 304
+    assert second.data == b''
+    assert 'no-cache' in second.headers['Cache-Control']
+
+
+def test_not_modified_datatables_poll(client, response_cache, mock_facts):
+    first = client.get('/fact/kernel/json?draw=1&_=1000')
+    second = client.get('/fact/kernel/json?draw=2&_=1001',
+                        headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 304
+    assert mock_facts.call_count == 1
+
+
+def test_response_cache_disabled(client, mock_facts):
+    client.get('/fact/kernel/json?draw=1')
+    rv = client.get('/fact/kernel/json?draw=1')
+
+    assert mock_facts.call_count == 2
+    assert 'ETag' not in rv.headers
+
+
+def test_response_cache_timeout_zero(client, mocker, response_cache, mock_facts):
+    timeouts = dict(app.app.config['RESPONSE_CACHE_TIMEOUTS'], fact_ajax=0)
+    mocker.patch.dict(app.app.config, {'RESPONSE_CACHE_TIMEOUTS': timeouts})
+
+    client.get('/fact/kernel/json?draw=1')
+    client.get('/fact/kernel/json?draw=1')
+
+    assert mock_facts.call_count == 2
+
+
+def test_errors_are_not_cached(client, mocker, response_cache,
+                               mock_puppetdb_environments):
+    rv = client.get('/nothere/fact/kernel/json')
+
+    assert rv.status_code == 404
+    with app.app.app_context():
+        assert get_cache().cache._cache == {}
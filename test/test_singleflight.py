@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from puppetboard.singleflight import SingleFlight, coalesce_calls
+
+
+class FakeAPI(object):
+    """Blocks the requests until released, to have them in flight at
+    the same time."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def _make_request(self, url, request_method, payload):
+        self.calls.append((url, request_method, payload))
+        self.release.wait(5)
+        if url.endswith('/fail'):
+            raise ConnectionError('PuppetDB is down')
+        return [{'certname': 'node1', 'url': url}]
+
+
+@pytest.fixture
+def api():
+    api = FakeAPI()
+    coalesce_calls(api, SingleFlight())
+    return api
+
+
+def run_concurrently(api, *requests):
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = [executor.submit(api._make_request, *request) for request in requests]
+        # wait for the distinct requests to be running, and let the
+        # identical ones start waiting for them
+        while len(api.calls) < len(set(repr(request) for request in requests)):
+            time.sleep(0.01)
+        time.sleep(0.1)
+        api.release.set()
+        return [future.result() if future.exception() is None else future.exception()
+                for future in futures]
+
+
+def test_identical_requests_are_sent_once(api):
+    request = ('http://puppetdb/pdb/query/v4/nodes', 'GET', {'query': '["=", "a", 1]'})
+    results = run_concurrently(api, request, request, request)
+
+    assert len(api.calls) == 1
+    assert results[0] == results[1] == results[2]
+    # the waiters get their own copy of the result
+    assert results[0] is not results[1]
+    assert results[0][0] is not results[1][0]
+
+
+def test_different_requests_are_not_merged(api):
+    results = run_concurrently(
+        api,
+        ('http://puppetdb/pdb/query/v4/nodes', 'GET', {'query': '["=", "a", 1]'}),
+        ('http://puppetdb/pdb/query/v4/nodes', 'GET', {'query': '["=", "a", 2]'}),
+        ('http://puppetdb/pdb/query/v4/nodes', 'GET', {'query': '["=", "a", 1]', 'limit': 10}),
+    )
+
+    assert len(api.calls) == 3
+    assert len(results) == 3
+
+
+def test_errors_are_shared(api):
+    request = ('http://puppetdb/fail', 'GET', {})
+    results = run_concurrently(api, request, request)
+
+    assert len(api.calls) == 1
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_requests_with_total_are_not_merged(api):
+    api.release.set()
+    request = ('http://puppetdb/pdb/query/v4/nodes', 'GET', {'include_total': 'true'})
+    api._make_request(*request)
+    api._make_request(*request)
+
+    assert len(api.calls) == 2
+
+
+def test_sequential_requests_are_sent(api):
+    api.release.set()
+    request = ('http://puppetdb/pdb/query/v4/nodes', 'GET', {})
+    api._make_request(*request)
+    api._make_request(*request)
+
+    assert len(api.calls) == 2
+
+
+def test_waiters_do_not_share_the_result_of_the_leader():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def request():
+        started.set()
+        release.wait(5)
+        return [{'certname': 'node1'}]
+
+    def leader():
+        result = single_flight.do('key', request)
+        # like pypuppetdb building the nodes while the waiters copy it
+        result[0]['events'] = {'failures': 1}
+        return result
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        leader_future = executor.submit(leader)
+        started.wait(5)
+        waiters = [executor.submit(single_flight.do, 'key', request) for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+        results = [waiter.result() for waiter in waiters]
+
+    assert leader_future.result() == [{'certname': 'node1', 'events': {'failures': 1}}]
+    assert results[0] == results[1] == [{'certname': 'node1'}]
+    assert results[0] is not results[1]
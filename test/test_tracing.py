@@ -0,0 +1,101 @@
+import json
+from functools import partial
+
+import pytest
+from bs4 import BeautifulSoup
+from requests import Response
+from requests.exceptions import ConnectionError
+
+from puppetboard import app
+from puppetboard.core import query_all
+from puppetboard.tracing import puppetdb_calls
+
+
+def make_response(body):
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps(body).encode('utf-8')
+    return response
+
+
+@pytest.fixture
+def mock_session(mocker):
+    return mocker.patch.object(app.puppetdb.session, 'get')
+
+
+def test_calls_are_recorded_per_request(mock_session):
+    mock_session.return_value = make_response([{'certname': 'node1'},
+                                               {'certname': 'node2'}])
+
+    with app.app.test_request_context():
+        app.puppetdb._query('nodes', query='["=", "certname", "node1"]')
+        calls = puppetdb_calls()
+
+        assert len(calls) == 1
+        assert calls[0]['endpoint'] == '/pdb/query/v4/nodes'
+        assert calls[0]['query'] == '["=", "certname", "node1"]'
+        assert calls[0]['rows'] == 2
+        assert calls[0]['duration'] >= 0
+
+    with app.app.test_request_context():
+        assert puppetdb_calls() == []
+
+
+def test_failed_calls_are_recorded(mock_session):
+    mock_session.side_effect = ConnectionError
+
+    with app.app.test_request_context():
+        with pytest.raises(ConnectionError):
+            app.puppetdb._query('nodes')
+
+        assert puppetdb_calls()[0]['rows'] is None
+
+
+def test_parallel_calls_are_all_recorded(mock_session):
+    mock_session.return_value = make_response([])
+
+    with app.app.test_request_context():
+        query_all(*[partial(app.puppetdb._query, 'nodes', query=f'["=", "certname", "node{i}"]')
+                    for i in range(8)])
+
+        assert len(puppetdb_calls()) == 8
+
+
+def test_calls_outside_of_requests_are_ignored(mock_session):
+    mock_session.return_value = make_response({'version': '8.0.0'})
+
+    assert app.puppetdb._query('version') == {'version': '8.0.0'}
+
+
+def test_server_timing_header(client, mock_session,
+                              mock_puppetdb_environments):
+    mock_session.return_value = make_response({'value': {'domain': {'name': {}}}})
+
+    rv = client.get('/metrics')
+
+    assert rv.status_code == 200
+    assert rv.headers['Server-Timing'].startswith('puppetdb;desc="1 calls";dur=')
+
+
+def test_debug_panel(client, mocker, mock_session,
+                     mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {'DEBUG_PANEL': True})
+    mock_session.return_value = make_response({'value': {'domain': {'name': {}}}})
+
+    rv = client.get('/metrics')
+    soup = BeautifulSoup(rv.data, 'html.parser')
+
+    assert rv.status_code == 200
+    rows = soup.find('h3', string=lambda s: s and 'PuppetDB calls' in s) \
+        .find_next('tbody').find_all('tr')
+    assert len(rows) == 1
+    assert rows[0].td.text == '/metrics/v2/list'
+
+
+def test_no_debug_panel_by_default(client, mock_session,
+                                   mock_puppetdb_environments):
+    mock_session.return_value = make_response({'value': {'domain': {'name': {}}}})
+
+    rv = client.get('/metrics')
+
+    assert b'PuppetDB calls' not in rv.data
@@ -3,6 +3,7 @@ import logging
 from types import GeneratorType
 
 import pytest
+from pypuppetdb.QueryBuilder import EqualsOperator
 from pypuppetdb.errors import EmptyResponseError
 from requests import Response
 from requests.exceptions import ConnectionError, HTTPError
@@ -464,3 +465,58 @@ def test_split_fact_path_single_level():
     base, sub = utils.split_fact_path('os.name')
     assert base == 'os'
     assert sub == 'name'
+
+
+def test_prefetch():
+    started = []
+
+    def generator():
+        started.append(True)
+        yield from [1, 2, 3]
+
+    iterator = utils.prefetch(generator())
+    assert started
+    assert list(iterator) == [1, 2, 3]
+    assert list(utils.prefetch(iter([]))) == []
+
+
+@pytest.mark.parametrize('value', ['node1.example.com', 'a b', 'a/b', 'a&b?c=d#e',
+                                   'é+%', 42, True])
+def test_url_template_quotes_like_url_for(value):
+    with app.app.test_request_context():
+        node_url = utils.UrlTemplate('node', 'node_name', env='production')
+        assert node_url(node_name=value) == app.app.url_for(
+            'node', env='production', node_name=value)
+
+        report_url = utils.UrlTemplate('report', 'node_name', 'report_id', env='dev')
+        assert report_url(node_name=value, report_id='abc') == app.app.url_for(
+            'report', env='dev', node_name=value, report_id='abc')
+
+        # in the query string
+        catalogs_url = utils.UrlTemplate('catalogs', 'compare', env='production')
+        assert catalogs_url(compare=value) == app.app.url_for(
+            'catalogs', env='production', compare=value)
+
+
+def test_datatables_paging():
+    with app.app.test_request_context('/?start=20&length=10'
+                                      '&order[0][column]=1&order[0][dir]=desc'):
+        assert utils.datatables_paging(['certname', 'value'], tiebreak='certname') == {
+            'order_by': '[{"field": "value", "order": "desc"}, '
+                        '{"field": "certname", "order": "asc"}]',
+            'offset': 20,
+            'limit': 10,
+        }
+
+    # "All" rows, and an unknown column ordered as the first one
+    with app.app.test_request_context('/?length=-1&order[0][column]=5'):
+        assert utils.datatables_paging(['certname', 'value'], tiebreak='certname') == {
+            'order_by': '[{"field": "certname", "order": "asc"}]',
+            'offset': 0,
+        }
+
+
+def test_count_query():
+    assert json.loads(str(utils.count_query())) == ['extract', [['function', 'count']]]
+    assert json.loads(str(utils.count_query(EqualsOperator('name', 'os')))) == [
+        'extract', [['function', 'count']], ['and', ['=', 'name', 'os']]]
@@ -1,14 +1,22 @@
 import json
+from urllib.parse import quote
 
 from bs4 import BeautifulSoup
 
 from puppetboard import app
+from puppetboard.views import facts
 from test import MockDbQuery
 
 
+def fact_paths(*paths):
+    return [{'path': path, 'type': type_} for path, type_ in paths]
+
+
 def test_facts_view(client, mocker, mock_puppetdb_environments):
+    names = [chr(i) for i in range(ord('a'), ord('z') + 1)]
     query_data = {
-        'fact-names': [[chr(i) for i in range(ord('a'), ord('z') + 1)]]
+        'fact-paths': [fact_paths(*[([name], 'string') for name in names])],
+        'facts': [[{'name': name} for name in names]],
     }
 
     dbquery = MockDbQuery(query_data)
@@ -29,7 +37,8 @@ def test_facts_view_empty_when_no_facts(client,
                                         mocker,
                                         mock_puppetdb_environments):
     query_data = {
-        'fact-names': [[]]
+        'fact-paths': [[]],
+        'facts': [[]],
     }
 
     dbquery = MockDbQuery(query_data)
@@ -122,23 +131,27 @@ def test_fact_value_view_complex(client, mocker,
     assert len(vals) == 1
 
 
+def mock_fact_query(mocker, rows, counts):
+    """Answer the facts queries with the rows, and the aggregate queries
+    of the charts with the counts."""
+    def query(endpoint, **kwargs):
+        if str(kwargs.get('query')).startswith('["extract"'):
+            return counts
+        return rows
+    return mocker.patch.object(app.puppetdb, '_query', side_effect=query)
+
+
 def test_fact_json_with_graph(client, mocker,
                               mock_puppetdb_environments,
                               mock_puppetdb_default_nodes):
     values = ['a', 'b', 'b', 'd', True, 'a\nb']
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    for i, value in enumerate(values):
-        query_data['facts'][0].append({
-            'certname': 'node-%s' % i,
-            'name': 'architecture',
-            'value': value,
-            'environment': 'production'
-        })
-
-    dbquery = MockDbQuery(query_data)
-
-    mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+    rows = [{'certname': 'node-%s' % i, 'name': 'architecture', 'value': value,
+             'environment': 'production'}
+            for i, value in enumerate(values)]
+    counts = [{'count': 1, 'value': 'a'}, {'count': 2, 'value': 'b'},
+              {'count': 1, 'value': 'd'}, {'count': 1, 'value': True},
+              {'count': 1, 'value': 'a\nb'}]
+    mock = mock_fact_query(mocker, rows, counts)
 
     rv = client.get('/fact/architecture/json')
     assert rv.status_code == 200
@@ -154,6 +167,31 @@ def test_fact_json_with_graph(client, mocker,
     assert len(result_json['chart']) == 5
     # Test group_by
     assert result_json['chart'][0]['value'] == 2
+    assert result_json['chart'][-1]['label'] == 'a b'
+    assert json.loads(str(mock.call_args.kwargs['query'])) == [
+        'extract', [['function', 'count'], 'value'],
+        ['and', ['=', 'name', 'architecture'], ['=', 'environment', 'production']],
+        ['group_by', 'value']]
+
+
+def test_fact_json_graph_top_values(client, mocker,
+                                    mock_puppetdb_environments,
+                                    mock_puppetdb_default_nodes):
+    mocker.patch.dict(app.app.config, {'GRAPH_FACTS_TOP': 2})
+    counts = [{'count': count, 'value': f'value-{count}'} for count in range(1, 6)]
+    mock = mock_fact_query(mocker, [], counts)
+
+    rv = client.get('/fact/architecture/json')
+    assert rv.status_code == 200
+    rv.close()
+    rv = client.get('/fact/architecture/json')
+    assert json.loads(rv.data.decode('utf-8'))['chart'] == [
+        {'label': 'value-5', 'value': 5},
+        {'label': 'value-4', 'value': 4},
+        {'label': 'other', 'value': 6},
+    ]
+    # the counts are cached
+    assert mock.call_count == 3
 
 
 def test_fact_json_without_graph(client, mocker,
@@ -187,6 +225,83 @@ def test_fact_json_without_graph(client, mocker,
     assert 'chart' not in result_json
 
 
+def test_fact_json_server_side(client, mocker,
+                               mock_puppetdb_environments,
+                               mock_puppetdb_default_nodes):
+    query_data = {
+        'facts': [{
+            'validate': {
+                'data': [{'certname': 'node-%s' % i, 'name': 'architecture',
+                          'value': 'amd64', 'environment': 'production'}
+                         for i in range(10, 20)],
+                'checks': {
+                    'limit': 10,
+                    'offset': 10,
+                    'order_by': '[{"field": "value", "order": "desc"}]',
+                },
+            },
+        }],
+    }
+    query_data['facts'].append({'validate': {
+        'data': [{'count': 490, 'value': 'amd64'}, {'count': 10, 'value': 'arm64'}],
+        'checks': {},
+    }})
+    dbquery = MockDbQuery(query_data)
+
+    def get(method, **kws):
+        # the count of the matching nodes, sent in parallel with the page
+        if str(kws.get('query')).startswith('["extract", [["function", "count"]], '):
+            return [{'count': 500}]
+        return dbquery.get(method, **kws)
+
+    mocker.patch.object(app.puppetdb, '_query', side_effect=get)
+
+    rv = client.get('/fact/architecture/json?draw=2&start=10&length=10'
+                    '&order[0][column]=1&order[0][dir]=desc&search[value]=')
+    assert rv.status_code == 200
+
+    result_json = json.loads(rv.data.decode('utf-8'))
+    assert result_json['draw'] == 2
+    assert result_json['recordsTotal'] == 500
+    assert result_json['recordsFiltered'] == 500
+    assert len(result_json['data']) == 10
+    # the chart counts all the values, not only the ones of the page
+    assert result_json['chart'] == [{'label': 'amd64', 'value': 490},
+                                    {'label': 'arm64', 'value': 10}]
+
+
+def test_fact_json_server_side_search(client, mocker,
+                                      mock_puppetdb_environments,
+                                      mock_puppetdb_default_nodes):
+    def get(method, query, **kws):
+        # the counts of the nodes that match the search and of all of them
+        query = json.loads(str(query))
+        if query[1] == [['function', 'count']]:
+            return [{'count': 3 if len(query[2]) > 3 else 500}]
+        return []
+
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=get)
+
+    rv = client.get('/fact/ipaddress/json?draw=1&start=0&length=-1'
+                    '&order[0][column]=0&order[0][dir]=asc&search[value]=10.0')
+    assert rv.status_code == 200
+    result_json = json.loads(rv.data.decode('utf-8'))
+    assert result_json['recordsTotal'] == 500
+    assert result_json['recordsFiltered'] == 3
+
+    # the page and the counts, sent in parallel
+    page, *counts = sorted((call.kwargs for call in mock.call_args_list),
+                           key=lambda kwargs: ('order_by' not in kwargs, len(str(kwargs['query']))))
+    assert 'limit' not in page
+    assert page['order_by'] == '[{"field": "certname", "order": "asc"}]'
+    search = ['or', ['~', 'certname', '10.0'], ['~', 'value', '10.0']]
+    assert search in json.loads(str(page['query']))
+    where = ['and', ['=', 'name', 'ipaddress'], ['=', 'environment', 'production']]
+    assert [json.loads(str(count['query'])) for count in counts] == [
+        ['extract', [['function', 'count']], where],
+        ['extract', [['function', 'count']], where + [search]]]
+
+
 def test_fact_value_json(client, mocker,
                          mock_puppetdb_environments,
                          mock_puppetdb_default_nodes):
@@ -218,20 +333,23 @@ def test_fact_value_json(client, mocker,
     assert 'chart' not in result_json
 
 
+def node_factset(timestamp='2024-01-01T10:00:00.000Z'):
+    return {
+        'certname': 'node-failed',
+        'environment': 'production',
+        'timestamp': timestamp,
+        'facts': {
+            'data': [{'name': 'fact-%s' % i, 'value': value}
+                     for i, value in enumerate(['a', 'b', 'b', 'd'])],
+            'href': '/pdb/query/v4/factsets/node-failed/facts',
+        },
+    }
+
+
 def test_node_facts_json(client, mocker,
                          mock_puppetdb_environments,
                          mock_puppetdb_default_nodes):
-    values = ['a', 'b', 'b', 'd']
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    for i, value in enumerate(values):
-        query_data['facts'][0].append({
-            'certname': 'node-failed',
-            'name': 'fact-%s' % i,
-            'value': value,
-            'environment': 'production'
-        })
-
+    query_data = {'factsets': [[node_factset()]]}
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
 
@@ -244,10 +362,62 @@ def test_node_facts_json(client, mocker,
     assert len(result_json['data']) == 4
     for line in result_json['data']:
         assert len(line) == 2
+    assert result_json['data'][1][0] == 'fact-1'
+    link, value = json.loads(result_json['data'][1][1])
+    assert link == '/fact/fact-1/%22b%22'
+    assert value == 'b'
 
     assert 'chart' not in result_json
 
 
+def test_node_facts_json_cached_by_timestamp(client, mocker,
+                                             mock_puppetdb_environments,
+                                             mock_puppetdb_default_nodes):
+    mock = mocker.patch.object(app.puppetdb, '_query', return_value=[node_factset()])
+
+    # the timestamp of the node, as given by the node page
+    url = '/node/node-failed/facts/json?timestamp=2024-01-01%2010:00:00%2B00:00'
+    assert len(client.get(url).json['data']) == 4
+    assert len(client.get(url).json['data']) == 4
+    assert mock.call_count == 1
+    assert mock.call_args.args[0] == 'factsets'
+
+    # the facts of the node have changed
+    mock.return_value = [node_factset('2024-01-02T10:00:00.000Z')]
+    url = '/node/node-failed/facts/json?timestamp=2024-01-02%2010:00:00%2B00:00'
+    client.get(url)
+    client.get(url)
+    assert mock.call_count == 2
+
+
+def test_node_facts_key_is_valid_for_memcached():
+    key = facts.node_facts_key('production', 'node with spaces\n', '2024-01-01 10:00:00+00:00')
+
+    assert key.startswith('node_facts_')
+    assert len(key) < 250
+    assert key.isascii() and ' ' not in key and key.isprintable()
+    assert key != facts.node_facts_key('production', 'node', '2024-01-01 10:00:00+00:00')
+
+
+def test_fact_values_key_is_valid_for_memcached():
+    key = facts.fact_values_key('production', 'fact with spaces\n' + 'x' * 300)
+
+    assert key.startswith('fact_values_')
+    assert len(key) < 250
+    assert key.isascii() and ' ' not in key and key.isprintable()
+    assert key != facts.fact_values_key('production', 'fact')
+
+
+def test_node_facts_json_unknown_node(client, mocker,
+                                      mock_puppetdb_environments,
+                                      mock_puppetdb_default_nodes):
+    mocker.patch.object(app.puppetdb, '_query', return_value=[])
+
+    rv = client.get('/node/unknown/facts/json')
+    assert rv.status_code == 200
+    assert rv.json['data'] == []
+
+
 def test_structured_fact_view(client, mocker,
                                mock_puppetdb_environments,
                                mock_puppetdb_default_nodes):
@@ -267,6 +437,41 @@ def test_structured_fact_json(client, mocker,
                                mock_puppetdb_environments,
                                mock_puppetdb_default_nodes):
     """Test querying structured fact via JSON endpoint"""
+    query_data = {'fact-contents': [[
+        {
+            'certname': 'node-%s' % i,
+            'name': 'os',
+            'path': ['os', 'release', 'full'],
+            'value': '20.04',
+            'environment': 'production'
+        }
+        for i in range(3)
+    ]]}
+
+    dbquery = MockDbQuery(query_data)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    rv = client.get('/fact/os.release.full/json')
+    assert rv.status_code == 200
+
+    result_json = json.loads(rv.data.decode('utf-8'))
+
+    assert 'data' in result_json
+    assert len(result_json['data']) == 3
+    for line in result_json['data']:
+        assert len(line) == 2  # Node and Value columns
+
+    # only the values of this path are fetched
+    assert mock.call_count == 1
+    assert json.loads(str(mock.call_args.kwargs['query'])) == [
+        'and', ['and', ['=', 'environment', 'production']],
+        ['=', 'path', ['os', 'release', 'full']]]
+
+
+def test_structured_fact_json_of_a_hash(client, mocker,
+                                        mock_puppetdb_environments,
+                                        mock_puppetdb_default_nodes):
+    """Test querying a path to a hash, which is not in fact-contents"""
     os_fact_value = {
         'name': 'Ubuntu',
         'release': {
@@ -276,8 +481,7 @@ def test_structured_fact_json(client, mocker,
         'architecture': 'x86_64'
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
+    query_data = {'fact-contents': [[]], 'facts': [[]]}
     for i in range(3):
         query_data['facts'][0].append({
             'certname': 'node-%s' % i,
@@ -289,53 +493,28 @@ def test_structured_fact_json(client, mocker,
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
 
-    rv = client.get('/fact/os.release.full/json')
+    rv = client.get('/fact/os.release/json')
     assert rv.status_code == 200
 
     result_json = json.loads(rv.data.decode('utf-8'))
-
-    assert 'data' in result_json
     assert len(result_json['data']) == 3
-    for line in result_json['data']:
-        assert len(line) == 2  # Node and Value columns
+    assert json.loads(result_json['data'][0][1])[1] == {'full': '20.04', 'major': '20'}
 
 
 def test_structured_fact_with_value_filter(client, mocker,
                                             mock_puppetdb_environments,
                                             mock_puppetdb_default_nodes):
     """Test filtering structured facts by specific value"""
-    os_fact_ubuntu = {
-        'name': 'Ubuntu',
-        'release': {
-            'full': '20.04',
-            'major': '20'
-        }
-    }
-    os_fact_debian = {
-        'name': 'Debian',
-        'release': {
-            'full': '11.0',
-            'major': '11'
-        }
-    }
-
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
+    query_data = {'fact-contents': [[{
         'certname': 'node-ubuntu',
         'name': 'os',
-        'value': os_fact_ubuntu,
+        'path': ['os', 'release', 'full'],
+        'value': '20.04',
         'environment': 'production'
-    })
-    query_data['facts'][0].append({
-        'certname': 'node-debian',
-        'name': 'os',
-        'value': os_fact_debian,
-        'environment': 'production'
-    })
+    }]]}
 
     dbquery = MockDbQuery(query_data)
-    mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
 
     rv = client.get('/fact/os.release.full/20.04/json')
     assert rv.status_code == 200
@@ -346,6 +525,67 @@ def test_structured_fact_with_value_filter(client, mocker,
     # Should only return the Ubuntu node
     assert len(result_json['data']) == 1
 
+    # PuppetDB filters the values, as a number or a string
+    query = json.loads(str(mock.call_args.kwargs['query']))
+    assert ['or', ['=', 'value', 20.04], ['=', 'value', '20.04']] in query
+    assert mock.call_count == 1
+
+
+def test_structured_fact_with_a_hash_value_filter(client, mocker,
+                                                  mock_puppetdb_environments,
+                                                  mock_puppetdb_default_nodes):
+    """Test filtering a path to a hash by a hash value, matched in the base facts"""
+    releases = [{'full': '20.04', 'major': '20'}, {'full': '22.04', 'major': '22'}]
+    query_data = {'facts': [[
+        {'certname': 'node-%s' % i, 'name': 'os', 'value': {'release': release},
+         'environment': 'production'}
+        for i, release in enumerate(releases)]]}
+
+    dbquery = MockDbQuery(query_data)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    value = quote(str({'full': '22.04', 'major': '22'}))
+    rv = client.get(f'/fact/os.release/{value}/json')
+    assert rv.status_code == 200
+
+    result_json = json.loads(rv.data.decode('utf-8'))
+    assert len(result_json['data']) == 1
+    assert 'node-1' in result_json['data'][0][0]
+    # fact-contents only has the leaves
+    assert [call.args[0] for call in mock.call_args_list] == ['facts']
+
+
+def test_structured_fact_with_an_index_value_filter(client, mocker,
+                                                   mock_puppetdb_environments,
+                                                   mock_puppetdb_default_nodes):
+    """Test filtering a path with an array index, matched in the base facts"""
+    query_data = {'facts': [[
+        {'certname': 'node-%s' % i, 'name': 'processors', 'value': {'models': models},
+         'environment': 'production'}
+        for i, models in enumerate([['Xeon', 'Xeon'], ['EPYC']])]]}
+
+    dbquery = MockDbQuery(query_data)
+    mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    rv = client.get('/fact/processors.models.0/EPYC/json')
+    assert rv.status_code == 200
+
+    result_json = json.loads(rv.data.decode('utf-8'))
+    assert len(result_json['data']) == 1
+    assert 'node-1' in result_json['data'][0][0]
+
+
+def fact_paths_below(path, *values):
+    """The rows of fact-paths of the two levels below the given path, as
+    returned by PuppetDB when a fact is expanded."""
+    rows = []
+    for value in values:
+        for key, child in value.items():
+            rows.append({'path': path + [key], 'type': 'map' if isinstance(child, dict) else 'string'})
+            if isinstance(child, dict):
+                rows += [{'path': path + [key, grandchild], 'type': 'string'} for grandchild in child]
+    return rows
+
 
 def test_fact_children_ajax_top_level(client, mocker,
                                        mock_puppetdb_environments,
@@ -360,14 +600,7 @@ def test_fact_children_ajax_top_level(client, mocker,
         'architecture': 'x86_64'
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'os',
-        'value': os_fact,
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [fact_paths_below(['os'], os_fact)]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -405,14 +638,7 @@ def test_fact_children_ajax_nested(client, mocker,
         }
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'os',
-        'value': os_fact,
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [fact_paths_below(['os', 'release'], os_fact['release'])]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -450,20 +676,8 @@ def test_fact_children_ajax_variable_keys(client, mocker,
         'package-c': {'version': '3.0'}
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'chocopackages',
-        'value': node1_packages,
-        'environment': 'production'
-    })
-    query_data['facts'][0].append({
-        'certname': 'node-2',
-        'name': 'chocopackages',
-        'value': node2_packages,
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [fact_paths_below(['chocopackages'],
+                                                   node1_packages, node2_packages)]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -486,14 +700,7 @@ def test_fact_children_ajax_empty_for_simple_fact(client, mocker,
                                                   mock_puppetdb_environments,
                                                   mock_puppetdb_default_nodes):
     """Test AJAX endpoint returns empty for non-dict facts"""
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'hostname',
-        'value': 'server01',
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [[]]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -510,8 +717,7 @@ def test_fact_children_ajax_empty_for_nonexistent_fact(client, mocker,
                                                        mock_puppetdb_environments,
                                                        mock_puppetdb_default_nodes):
     """Test AJAX endpoint returns empty for facts that don't exist"""
-    query_data = {'facts': []}
-    query_data['facts'].append([])  # Empty result
+    query_data = {'fact-paths': [[]]}  # Empty result
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -537,14 +743,7 @@ def test_fact_children_ajax_skips_keys_with_dots(client, mocker,
         }
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'myco_services',
-        'value': myco_services,
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [fact_paths_below(['myco_services'], myco_services)]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -571,14 +770,7 @@ def test_fact_children_ajax_skips_keys_with_slashes(client, mocker,
         'valid_key': {'size': '50G'}
     }
 
-    query_data = {'facts': []}
-    query_data['facts'].append([])
-    query_data['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'mountpoints',
-        'value': mountpoints,
-        'environment': 'production'
-    })
+    query_data = {'fact-paths': [fact_paths_below(['mountpoints'], mountpoints)]}
 
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
@@ -598,34 +790,16 @@ def test_fact_children_ajax_skips_keys_with_slashes(client, mocker,
 def test_facts_page_shows_structured_facts_as_parents(client, mocker,
                                                       mock_puppetdb_environments):
     """Test facts page marks structured facts as parents with lazy-loaded children"""
-    fact_names = ['hostname', 'os', 'kernel']
-
-    # Mock fact names
-    fact_names_query = {'fact-names': [fact_names]}
-
-    # Mock fact values - os is structured, others are simple
-    facts_query = {'facts': []}
-    facts_query['facts'].append([])
-    facts_query['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'hostname',
-        'value': 'server01',
-        'environment': 'production'
-    })
-    facts_query['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'os',
-        'value': {'name': 'Ubuntu', 'release': {'full': '20.04'}},
-        'environment': 'production'
-    })
-    facts_query['facts'][0].append({
-        'certname': 'node-1',
-        'name': 'kernel',
-        'value': 'Linux',
-        'environment': 'production'
-    })
-
-    query_data = {**fact_names_query, **facts_query}
+    query_data = {
+        'fact-paths': [fact_paths(
+            (['hostname'], 'string'),
+            (['os'], 'map'),
+            (['kernel'], 'string'),
+            (['os', 'name'], 'string'),
+            (['os', 'release'], 'map'),
+        )],
+        'facts': [[{'name': 'hostname'}, {'name': 'os'}, {'name': 'kernel'}]],
+    }
     dbquery = MockDbQuery(query_data)
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
 
@@ -654,3 +828,98 @@ def test_facts_page_shows_structured_facts_as_parents(client, mocker,
     hostname_parent = hostname_link.parent
     hostname_toggle = hostname_parent.find('span', {'class': 'fact-toggle'})
     assert hostname_toggle is None
+
+
+def test_facts_view_only_shows_the_facts_of_the_environment(client, mocker,
+                                                            mock_puppetdb_environments):
+    query_data = {
+        'fact-paths': [fact_paths((['hostname'], 'string'), (['ec2_metadata'], 'map'))],
+        'facts': [[{'name': 'hostname'}]],
+    }
+    dbquery = MockDbQuery(query_data)
+    mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    rv = client.get('/facts')
+    assert rv.status_code == 200
+
+    soup = BeautifulSoup(rv.data, 'html.parser')
+    searchable = soup.find('div', {'class': 'searchable'})
+    assert searchable.find('a', string='hostname')
+    assert not searchable.find('a', string='ec2_metadata')
+
+
+def test_facts_view_does_not_fetch_the_fact_values(client, mocker,
+                                                   mock_puppetdb_environments):
+    query_data = {
+        'fact-paths': [fact_paths((['hostname'], 'string')),
+                       fact_paths((['hostname'], 'string'))],
+    }
+    dbquery = MockDbQuery(query_data)
+    mock = mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
+
+    # twice, the second time from the cache
+    assert client.get('/%2A/facts').status_code == 200
+    assert client.get('/%2A/facts').status_code == 200
+
+    assert [call.args[0] for call in mock.call_args_list] == ['fact-paths']
+
+
+def test_fact_distribution(client, mocker,
+                           mock_puppetdb_environments,
+                           mock_puppetdb_default_nodes):
+    counts = [{'count': 10, 'value': 4}, {'count': 30, 'value': 2},
+              {'count': 5, 'value': 16}, {'count': 1, 'value': 1}]
+    mock = mock_fact_query(mocker, [], counts)
+
+    rv = client.get('/fact/processorcount/distribution?top=2&bins=4')
+    assert rv.status_code == 200
+
+    result = rv.get_json()
+    assert result['fact'] == 'processorcount'
+    assert result['nodes'] == 46
+    assert result['cardinality'] == 4
+    assert result['top'] == [{'value': 2, 'count': 30}, {'value': 4, 'count': 10}]
+    assert result['other'] == 6
+    assert result['histogram'] == [
+        {'min': 1, 'max': 5, 'count': 41},
+        {'min': 5, 'max': 9, 'count': 0},
+        {'min': 9, 'max': 13, 'count': 0},
+        {'min': 13, 'max': 17, 'count': 5},
+    ]
+
+    # counted by PuppetDB, once
+    client.get('/fact/processorcount/distribution')
+    assert mock.call_count == 1
+    assert mock.call_args.args[0] == 'facts'
+
+
+def test_fact_distribution_of_structured_floats(client, mocker,
+                                                mock_puppetdb_environments,
+                                                mock_puppetdb_default_nodes):
+    counts = [{'count': 3, 'value': 2048.0}, {'count': 1, 'value': 4096.5}]
+    mock = mock_fact_query(mocker, [], counts)
+
+    rv = client.get('/fact/memory.system.total_mb/distribution?bins=2')
+    assert rv.status_code == 200
+
+    result = rv.get_json()
+    assert mock.call_args.args[0] == 'fact-contents'
+    assert result['histogram'] == [
+        {'min': 2048.0, 'max': 3072.25, 'count': 3},
+        {'min': 3072.25, 'max': 4096.5, 'count': 1},
+    ]
+
+
+def test_fact_distribution_without_histogram(client, mocker,
+                                             mock_puppetdb_environments,
+                                             mock_puppetdb_default_nodes):
+    counts = [{'count': 3, 'value': 'RedHat'}, {'count': 1, 'value': 4}]
+    mock_fact_query(mocker, [], counts)
+
+    rv = client.get('/fact/osfamily/distribution')
+    assert rv.status_code == 200
+
+    result = rv.get_json()
+    assert result['cardinality'] == 2
+    assert result['other'] == 0
+    assert result['histogram'] is None
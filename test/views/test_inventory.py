@@ -1,9 +1,11 @@
 import json
 
 import pytest
-from pypuppetdb.types import Fact
+from jinja2 import Template
 
 from puppetboard import app
+from puppetboard.utils import dot_lookup
+from puppetboard.views import inventory
 
 
 @pytest.fixture
@@ -13,6 +15,7 @@ def mock_puppetdb_inventory_facts(mocker):
             "node": "node-debian.test.domain",
             "environment": "production",
             "facts": {
+                "fqdn": "node-debian.test.domain",
                 "hardwaremodel": "x86_64",
                 "kernelrelease": "5.10.0-17-amd64",
                 "puppetversion": "6.27.0",
@@ -85,6 +88,7 @@ def mock_puppetdb_inventory_facts(mocker):
             "node": "node-windows.test.domain",
             "environment": "production",
             "facts": {
+                "fqdn": "node-windows.test.domain",
                 "hardwaremodel": "x86_64",
                 "kernelrelease": "10.0.19041",
                 "puppetversion": "6.27.0",
@@ -142,6 +146,7 @@ def mock_puppetdb_inventory_facts(mocker):
             "node": "node-mac.test.domain",
             "environment": "production",
             "facts": {
+                "fqdn": "node-mac.test.domain",
                 "hardwaremodel": "x86_64",
                 "kernelrelease": "21.6.0",
                 "puppetversion": "6.27.0",
@@ -233,17 +238,34 @@ def mock_puppetdb_inventory_facts(mocker):
         },
     ]
 
-    facts_list = [
-        Fact(
-            node=node['node'],
-            environment=node['environment'],
-            name=fact_name,
-            value=fact_value,
-        )
+    inventory_rows = [
+        {
+            "certname": node["node"],
+            "environment": node["environment"],
+            "facts": node["facts"],
+            "trusted": node["facts"]["trusted"],
+        }
         for node in node_facts
-        for fact_name, fact_value in node['facts'].items()
     ]
-    return mocker.patch.object(app.puppetdb, "facts", return_value=iter(facts_list))
+    return mocker.patch.object(app.puppetdb, "_query",
+                               side_effect=lambda endpoint, query=None, **kwargs:
+                               extract_inventory(inventory_rows, query, **kwargs))
+
+
+def extract_inventory(rows, query, offset=0, limit=None, **kwargs):
+    # the ["extract", [fields...], ...] queries of the inventory endpoint,
+    # ordered by certname and paged after a certname by [">", "certname", ...]
+    query = json.loads(str(query))
+    fields = query[1]
+    after = [clause[2] for clause in (query[2][1:] if len(query) > 2 and query[2][0] == "and" else [])
+             if clause[:2] == [">", "certname"]]
+    rows = [row for row in rows if not after or row["certname"] > after[0]]
+    if "order_by" in kwargs:
+        rows = sorted(rows, key=lambda row: row["certname"])
+    stop = offset + limit if limit is not None else None
+    return [{field: dot_lookup(row, field) if "." in field else row.get(field)
+             for field in fields}
+            for row in rows[offset:stop]]
 
 
 def test_inventory_json(
@@ -259,3 +281,265 @@ def test_inventory_json(
     assert len(result_json["data"]) == 3
     assert result_json["data"][0][3] == "amd64"
     assert result_json["data"][0][1] == "192.168.0.2"
+    assert result_json["recordsTotal"] == 3
+
+    endpoint, = mock_puppetdb_inventory_facts.call_args.args
+    kwargs = mock_puppetdb_inventory_facts.call_args.kwargs
+    assert endpoint == "inventory"
+    # only the shown sub-paths of the structured facts are fetched
+    assert json.loads(str(kwargs["query"])) == [
+        "extract",
+        ["certname", "timestamp", "trusted", "facts.networking.ip", "facts.os.name",
+         "facts.os.architecture", "facts.kernelrelease", "facts.puppetversion"],
+        ["=", "environment", "production"],
+    ]
+
+
+def test_inventory_json_not_cached(client, mocker, mock_puppetdb_environments,
+                                   mock_puppetdb_inventory_facts):
+    mocker.patch.dict(app.app.config, {"INVENTORY_CACHE_TTL": 0})
+
+    rv = client.get("/inventory/json")
+    assert rv.status_code == 200
+    assert len(rv.json["data"]) == 3
+
+    # the facts are grouped by node while they are streamed
+    order_by = mock_puppetdb_inventory_facts.call_args.kwargs["order_by"]
+    assert json.loads(order_by) == [{"field": "certname", "order": "asc"}]
+
+
+def test_inventory_json_cached_rows(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "fqdn"), ("Kernel", "kernel")],
+        "INVENTORY_FACT_TEMPLATES": {"kernel": "<b>{{ value }}</b>"},
+    })
+    inventory_rows = {
+        f"node-{i}": {"certname": f"node-{i}", "timestamp": f"2024-01-01T10:00:0{i}.000Z",
+                      "facts.kernel": "Linux"}
+        for i in range(1, 4)
+    }
+
+    def query(endpoint, query=None, **kwargs):
+        query = json.loads(str(query))
+        if query[1] == ["certname"]:
+            return [{"certname": certname} for certname in inventory_rows]
+        # ["and", ["=", "environment", env], [">", "timestamp", watermark]]
+        watermark = query[2][2][2] if query[2][0] == "and" else ""
+        queried_watermarks.append(watermark)
+        return [row for row in inventory_rows.values() if row["timestamp"] > watermark]
+
+    queried_watermarks = []
+    mock_query = mocker.patch.object(app.puppetdb, "_query", side_effect=query)
+    render = mocker.spy(Template, "render")
+
+    rv = client.get("/inventory/json")
+    assert [row[1] for row in rv.json["data"]] == ["<b>Linux</b>"] * 3
+    assert render.call_count == 1
+
+    # node-2 has new facts and node-3 was deactivated
+    inventory_rows["node-2"].update(timestamp="2024-01-02T10:00:00.000Z",
+                                    **{"facts.kernel": "windows"})
+    del inventory_rows["node-3"]
+
+    rv = client.get("/inventory/json")
+    assert [row[1] for row in rv.json["data"]] == ["<b>Linux</b>", "<b>windows</b>"]
+    assert "node-1" in rv.json["data"][0][0]
+    # fetched from INVENTORY_CACHE_OVERLAP seconds before the latest timestamp
+    assert queried_watermarks == ["", "2024-01-01T09:55:03.000Z"]
+    # only the row of node-2 is rendered again
+    assert render.call_count == 2
+
+    # the facts of node-1 are stored late, with an older timestamp
+    inventory_rows["node-1"].update(timestamp="2024-01-02T09:58:00.000Z",
+                                    **{"facts.kernel": "BSD"})
+    rv = client.get("/inventory/json")
+    assert [row[1] for row in rv.json["data"]] == ["<b>BSD</b>", "<b>windows</b>"]
+    assert queried_watermarks[-1] == "2024-01-02T09:55:00.000Z"
+    assert render.call_count == 3
+
+
+def test_inventory_json_cached_rows_expire(client, mocker, mock_puppetdb_environments,
+                                           mock_puppetdb_inventory_facts):
+    mocker.patch.dict(app.app.config, {"INVENTORY_CACHE_TTL": 60})
+    monotonic = mocker.patch("puppetboard.views.inventory.time.monotonic", return_value=1000)
+
+    client.get("/inventory/json")
+    client.get("/inventory/json")
+    # the changed rows, then the changed rows and the certnames
+    assert mock_puppetdb_inventory_facts.call_count == 3
+
+    monotonic.return_value = 1060
+    rv = client.get("/inventory/json")
+    assert len(rv.json["data"]) == 3
+    # reloaded whole, without the certnames
+    assert mock_puppetdb_inventory_facts.call_count == 4
+
+
+def test_inventory_json_missing_fact(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "fqdn"), ("OS", "os.name")],
+        "INVENTORY_FACT_TEMPLATES": {"os.name": "[{{ value }}]"},
+    })
+    mocker.patch.object(app.puppetdb, "_query",
+                        return_value=[{"certname": "node1", "facts.os.name": None}])
+
+    rv = client.get("/inventory/json")
+    assert rv.status_code == 200
+    assert rv.json["data"][0][1] == "[]"
+
+
+def test_inventory_json_templates_compiled_once(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "fqdn"), ("Kernel", "kernel")],
+        "INVENTORY_FACT_TEMPLATES": {"kernel": "<b>{{ value }}</b> {{ current_env }}"},
+        "INVENTORY_CACHE_TTL": 0,
+    })
+    mocker.patch.dict(inventory.INVENTORY_TEMPLATES, clear=True)
+    rows = [{"certname": f"node-{i:02}", "facts.kernel": "Linux" if i % 10 else "windows"}
+            for i in range(100)]
+    mocker.patch.object(app.puppetdb, "_query", return_value=rows)
+    from_string = mocker.spy(app.app.jinja_env, "from_string")
+    render = mocker.spy(Template, "render")
+
+    for _ in range(2):
+        rv = client.get("/inventory/json")
+        assert rv.status_code == 200
+        rows = rv.json["data"]
+        assert rows[0][1] == "<b>windows</b> production"
+        assert rows[1][1] == "<b>Linux</b> production"
+
+    assert from_string.call_count == 1
+    # once per value and response
+    assert render.call_count == 4
+
+
+def test_inventory_client_side(client, mocker, mock_puppetdb_environments):
+    # the whole inventory comes from the cached rows, paged in the browser
+    rv = client.get("/inventory")
+    assert rv.status_code == 200
+    assert "'serverSide': false" in rv.get_data(as_text=True)
+
+
+def test_inventory_server_side(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {"INVENTORY_CACHE_TTL": 0})
+
+    rv = client.get("/inventory")
+    assert rv.status_code == 200
+    assert "'serverSide': false" not in rv.get_data(as_text=True)
+
+    # unless the replica is fresh
+    mocker.patch.object(inventory, "fresh_replica", return_value=object())
+    rv = client.get("/inventory")
+    assert "'serverSide': false" in rv.get_data(as_text=True)
+
+
+def test_inventory_json_server_side(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "fqdn"), ("OS", "os.name"),
+                            ("Kernel", "kernelrelease")],
+    })
+    rows = [{"certname": f"node-{i}", "facts.os.name": "Debian", "facts.kernelrelease": "5.10"}
+            for i in range(10, 20)]
+
+    def inventory_page(endpoint, query, **kwargs):
+        # the counts of the nodes that match the search and of all of them,
+        # sent in parallel with the page
+        query = json.loads(str(query))
+        if query[1] == [["function", "count"]]:
+            return [{"count": 20 if len(query[2]) > 2 else 1000}]
+        return rows
+
+    query = mocker.patch.object(app.puppetdb, "_query", side_effect=inventory_page)
+
+    rv = client.get("/inventory/json?draw=2&start=10&length=10"
+                    "&order[0][column]=1&order[0][dir]=desc&search[value]=deb")
+    assert rv.status_code == 200
+    assert rv.json["recordsTotal"] == 1000
+    assert rv.json["recordsFiltered"] == 20
+    assert len(rv.json["data"]) == 10
+    assert rv.json["data"][0][1:] == ["Debian", "5.10"]
+    assert "node-10" in rv.json["data"][0][0]
+
+    page, *counts = sorted((call.kwargs for call in query.call_args_list),
+                           key=lambda kwargs: ("order_by" not in kwargs, len(str(kwargs["query"]))))
+    assert page["offset"] == 10
+    assert page["limit"] == 10
+    assert json.loads(page["order_by"]) == [{"field": "facts.os.name", "order": "desc"},
+                                            {"field": "certname", "order": "asc"}]
+    where = ["and",
+             ["=", "environment", "production"],
+             ["or", ["~", "certname", "deb"], ["~", "facts.os.name", "deb"],
+              ["~", "facts.kernelrelease", "deb"]]]
+    assert json.loads(str(page["query"])) == [
+        "extract", ["certname", "facts.fqdn", "facts.os.name", "facts.kernelrelease"], where]
+    # the nodes are counted without and with the search
+    assert [json.loads(str(count["query"])) for count in counts] == [
+        ["extract", [["function", "count"]], ["and", ["=", "environment", "production"]]],
+        ["extract", [["function", "count"]], where]]
+
+
+def test_inventory_export_csv(client, mocker, mock_puppetdb_environments,
+                              mock_puppetdb_inventory_facts):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "fqdn"), ("OS", "os.name"),
+                            ("Release", "os.release")],
+        "INVENTORY_EXPORT_PAGE_SIZE": 2,
+    })
+
+    rv = client.get("/inventory/export.csv")
+    assert rv.status_code == 200
+    assert rv.mimetype == "text/csv"
+    assert rv.headers["Content-Disposition"] == "attachment; filename=inventory.csv"
+    assert rv.get_data(as_text=True).splitlines() == [
+        "certname,fqdn,os.name,os.release",
+        'node-debian.test.domain,node-debian.test.domain,Debian,'
+        '"{""full"": ""11.4"", ""major"": ""11"", ""minor"": ""4""}"',
+        'node-mac.test.domain,node-mac.test.domain,Darwin,'
+        '"{""full"": ""21.6.0"", ""major"": ""21"", ""minor"": ""6""}"',
+        'node-windows.test.domain,node-windows.test.domain,windows,'
+        '"{""full"": ""10"", ""major"": ""10""}"',
+    ]
+
+    # fetched by pages of INVENTORY_EXPORT_PAGE_SIZE nodes, each starting
+    # after the last certname of the previous one
+    calls = mock_puppetdb_inventory_facts.call_args_list
+    assert [call.kwargs["limit"] for call in calls] == [2, 2]
+    assert all("offset" not in call.kwargs for call in calls)
+    assert json.loads(str(calls[1].kwargs["query"]))[2] == [
+        "and", ["=", "environment", "production"],
+        [">", "certname", "node-mac.test.domain"]]
+
+
+def test_inventory_export_fact_values(client, mocker, mock_puppetdb_environments):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("Hostname", "hostname"), ("FQDN", "fqdn")],
+    })
+    rows = [{"certname": "agent-1", "facts": {"hostname": "web1", "fqdn": "web1.example.com"}}]
+    mocker.patch.object(app.puppetdb, "_query",
+                        side_effect=lambda endpoint, query=None, **kwargs:
+                        extract_inventory(rows, query, **kwargs))
+
+    # the values of the facts named in the header, not the certname
+    rv = client.get("/inventory/export.csv")
+    assert rv.get_data(as_text=True).splitlines() == [
+        "certname,hostname,fqdn",
+        "agent-1,web1,web1.example.com",
+    ]
+
+
+def test_inventory_export_ndjson(client, mocker, mock_puppetdb_environments,
+                                 mock_puppetdb_inventory_facts):
+    mocker.patch.dict(app.app.config, {
+        "INVENTORY_FACTS": [("IP Address", "networking.ip"), ("Kernel", "kernelrelease")],
+        "INVENTORY_EXPORT_PAGE_SIZE": 3,
+    })
+
+    rv = client.get("/inventory/export.ndjson")
+    assert rv.status_code == 200
+    assert rv.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert lines[0] == {"certname": "node-debian.test.domain",
+                        "networking.ip": "192.168.0.2", "kernelrelease": "5.10.0-17-amd64"}
+    assert len(lines) == 3
+    # a full last page is followed by an empty one
+    assert mock_puppetdb_inventory_facts.call_count == 2
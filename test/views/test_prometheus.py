@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+
+from puppetboard import app
+from puppetboard.core import get_cache
+from puppetboard.views import prometheus
+from puppetboard.views.prometheus import api_endpoint
+
+requires_prometheus_client = pytest.mark.skipif(
+    prometheus.prometheus_client is None,
+    reason='prometheus_client is not installed')
+
+
+@pytest.fixture
+def prometheus_enabled(mocker):
+    return mocker.patch.dict(app.app.config, {'PROMETHEUS_METRICS': True})
+
+
+def sample(name, **labels):
+    value = prometheus.prometheus_client.REGISTRY.get_sample_value(name, labels)
+    return value or 0
+
+
+def test_api_endpoint():
+    assert api_endpoint('/pdb/query/v4/nodes') == '/pdb/query/v4/nodes'
+    assert api_endpoint('/pdb/query/v4/nodes/node1/facts') == '/pdb/query/v4/nodes'
+    assert api_endpoint('/metrics/v2/read/puppetlabs.puppetdb') == '/metrics/v2/read'
+    assert api_endpoint('/status/v1/services') == '/status/v1/services'
+
+
+def test_prometheus_disabled(client, mock_puppetdb_environments):
+    rv = client.get(app.app.config['PROMETHEUS_METRICS_PATH'])
+    assert rv.status_code == 404
+
+
+@requires_prometheus_client
+def test_prometheus_request_metrics(client, prometheus_enabled,
+                                    mock_puppetdb_environments):
+    before = sample('puppetboard_request_duration_seconds_count',
+                    endpoint='prometheus_metrics', method='GET', status='200')
+
+    client.get('/prometheus/metrics')
+    rv = client.get('/prometheus/metrics')
+
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/plain'
+    assert b'puppetboard_request_duration_seconds' in rv.data
+    after = sample('puppetboard_request_duration_seconds_count',
+                   endpoint='prometheus_metrics', method='GET', status='200')
+    assert after == before + 2
+
+
+@requires_prometheus_client
+def test_prometheus_puppetdb_metrics(prometheus_enabled):
+    labels = {'endpoint': '/pdb/query/v4/facts', 'failed': 'False'}
+    before = sample('puppetboard_puppetdb_request_duration_seconds_count', **labels)
+
+    prometheus.observe_puppetdb_call(None, endpoint='/pdb/query/v4/facts/os',
+                                     duration=0.2, failed=False)
+
+    assert sample('puppetboard_puppetdb_request_duration_seconds_count',
+                  **labels) == before + 1
+
+
+@requires_prometheus_client
+def test_prometheus_cache_metrics(prometheus_enabled):
+    hits = sample('puppetboard_cache_requests_total', result='hit')
+    misses = sample('puppetboard_cache_requests_total', result='miss')
+    cache = get_cache()
+
+    with app.app.app_context():
+        cache.set('test_prometheus_cache_metrics', 'value')
+        cache.get('test_prometheus_cache_metrics')
+        cache.get('test_prometheus_cache_metrics_missing')
+
+    assert sample('puppetboard_cache_requests_total', result='hit') == hits + 1
+    assert sample('puppetboard_cache_requests_total', result='miss') == misses + 1
+
+
+@requires_prometheus_client
+def test_prometheus_job_metrics(prometheus_enabled):
+    labels = {'job': 'test_job', 'failed': 'False'}
+    before = sample('puppetboard_scheduler_job_duration_seconds_count', **labels)
+
+    prometheus.observe_job(SimpleNamespace(code=EVENT_JOB_SUBMITTED,
+                                           job_id='test_job', scheduled_run_times=[1]))
+    prometheus.observe_job(SimpleNamespace(code=EVENT_JOB_EXECUTED,
+                                           job_id='test_job', scheduled_run_time=1,
+                                           exception=None))
+
+    assert sample('puppetboard_scheduler_job_duration_seconds_count',
+                  **labels) == before + 1
+
+
+@requires_prometheus_client
+def test_prometheus_overlapping_job_runs(prometheus_enabled, mocker):
+    labels = {'job': 'test_job', 'failed': 'False'}
+    before = sample('puppetboard_scheduler_job_duration_seconds_sum', **labels)
+    mocker.patch.object(prometheus.time, 'monotonic', side_effect=[10, 15, 20, 30])
+
+    # the second run starts before the first one ends
+    for run_time in [1, 2]:
+        prometheus.observe_job(SimpleNamespace(code=EVENT_JOB_SUBMITTED,
+                                               job_id='test_job', scheduled_run_times=[run_time]))
+    for run_time in [1, 2]:
+        prometheus.observe_job(SimpleNamespace(code=EVENT_JOB_EXECUTED,
+                                               job_id='test_job', scheduled_run_time=run_time,
+                                               exception=None))
+
+    # 20 - 10 and 30 - 15 seconds
+    assert sample('puppetboard_scheduler_job_duration_seconds_sum',
+                  **labels) == before + 25
+    assert not prometheus.JOB_STARTS
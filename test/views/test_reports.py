@@ -21,6 +21,12 @@ def test_json_report_ok(client, mocker, input_data,
                         'offset': 0
                     }
                 }
+            },
+            {
+                'validate': {
+                    'data': [{'count': 499}],
+                    'checks': {}
+                }
             }
         ]
     }
@@ -28,7 +34,6 @@ def test_json_report_ok(client, mocker, input_data,
     dbquery = MockDbQuery(query_data)
 
     mocker.patch.object(app.puppetdb, '_query', side_effect=dbquery.get)
-    app.puppetdb.last_total = 499
 
     rv = client.get('/reports/json')
 
@@ -37,6 +42,51 @@ def test_json_report_ok(client, mocker, input_data,
 
     assert 'data' in result_json
     assert len(result_json['data']) == 100
+    assert result_json['recordsTotal'] == 499
+
+
+def test_json_reports_total(client, mocker,
+                            mock_puppetdb_environments,
+                            mock_puppetdb_default_nodes):
+    report = {
+        "hash": '1234567',
+        "receive_time": '2022-05-11T04:00:00.000Z',
+        "report_format": 12,
+        "puppet_version": "1.2.3",
+        "start_time": '2022-05-11T03:59:00.000Z',
+        "end_time": '2022-05-11T04:00:00.000Z',
+        "producer_timestamp": '2022-05-11T04:00:00.000Z',
+        "producer": 'foobar',
+        "transaction_uuid": 'foobar',
+        "status": 'changed',
+        "noop": False,
+        "noop_pending": False,
+        "environment": 'production',
+        "configuration_version": '123',
+        "certname": 'node-changed',
+        "code_id": 'foobar',
+        "catalog_uuid": 'foobar',
+        "cached_catalog_status": 'not_used',
+        "resource_events": [],
+        "metrics": {"data": []},
+        "logs": {"data": []},
+    }
+
+    def get(endpoint, query=None, **kwargs):
+        # the number of the reports, sent in parallel with the page
+        if json.loads(str(query))[1] == [['function', 'count']]:
+            return [{'count': 42}]
+        return [report]
+
+    mocker.patch.object(app.puppetdb, '_query', side_effect=get)
+
+    rv = client.get('/reports/json?draw=1&start=0&length=10&search[value]=node')
+    assert rv.status_code == 200
+
+    result_json = json.loads(rv.data.decode('utf-8'))
+    assert len(result_json['data']) == 1
+    assert result_json['recordsTotal'] == 42
+    assert result_json['recordsFiltered'] == 42
 
 
 def test_reports__a_report(client, mocker,